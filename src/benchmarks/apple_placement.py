@@ -0,0 +1,90 @@
+"""
+benchmarks/apple_placement.py - Apple placement cost vs. snake length.
+
+Compares the original scan-based Apple.place() (builds a set of occupied
+cells and a list of every free cell, on every call) against SnakeCore's
+free-cell index (a single random pick), on a Large (60x40) board, across a
+range of snake lengths. Also checks that both stay uniform over the free
+cells, via a chi-square statistic over many placements on a small board.
+
+Usage: python -m benchmarks.apple_placement
+"""
+
+import random
+import time
+
+import numpy as np
+
+from game.snake_core import SnakeCore
+from game.snake_game import Apple
+
+GRID_WIDTH, GRID_HEIGHT = 60, 40
+LENGTHS = [3, 100, 500, 1000, 1500, 2000, 2300]
+REPEATS = 2000
+
+
+def _core_with_length(grid_width, grid_height, length):
+    """A SnakeCore whose snake has been walked (and grown) along a
+    boustrophedon path until it is `length` segments long."""
+    core = SnakeCore(grid_width, grid_height)
+    # Walk to the top-left corner first, then sweep rows left<->right.
+    path = []
+    x, y = core.head_xy
+    while y > 0:
+        path.append((0, -1)); y -= 1
+    # Turn before heading left so the snake never reverses into itself.
+    while x > 0:
+        path.append((-1, 0)); x -= 1
+    direction = 1
+    while len(path) < length + grid_width * grid_height:
+        for _ in range(grid_width - 1):
+            path.append((direction, 0))
+        path.append((0, 1))
+        direction = -direction
+    for dx, dy in path:
+        if core.length >= length:
+            break
+        core.move(dx, dy)
+        core.grow()
+    return core
+
+
+def _time_per_call(fn, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats
+
+
+def benchmark():
+    print(f"Apple placement on a {GRID_WIDTH}x{GRID_HEIGHT} board ({REPEATS} placements per row)")
+    print(f"{'length':>8} {'scan (us)':>12} {'index (us)':>12} {'speedup':>9}")
+    for length in LENGTHS:
+        core = _core_with_length(GRID_WIDTH, GRID_HEIGHT, length)
+        occupied = list(core.body_xy())
+        apple = Apple(30, GRID_WIDTH, GRID_HEIGHT)
+
+        scan = _time_per_call(lambda: apple.place(occupied), REPEATS)
+        index = _time_per_call(core.place_apple, REPEATS)
+        print(f"{core.length:>8} {scan * 1e6:>12.1f} {index * 1e6:>12.2f} {scan / index:>8.0f}x")
+
+
+def uniformity(samples=200_000):
+    """Chi-square statistic of place_apple()'s choices over the free cells of
+    a small board -- for a uniform pick it should be close to its degrees of
+    freedom (free cells - 1)."""
+    core = _core_with_length(6, 5, 12)
+    counts = {}
+    for _ in range(samples):
+        core.place_apple()
+        counts[core.apple] = counts.get(core.apple, 0) + 1
+    observed = np.array(list(counts.values()), dtype=float)
+    expected = samples / core.free_count
+    chi2 = float(((observed - expected) ** 2 / expected).sum())
+    print(f"\nUniformity: {len(counts)}/{core.free_count} free cells hit, chi2 = {chi2:.1f} (dof {core.free_count - 1})")
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    benchmark()
+    uniformity()
@@ -0,0 +1,88 @@
+"""
+benchmarks/numpy_inference.py - SB3 predict() vs. the exported NumPy policy.
+
+Builds a (freshly initialized) DQN and PPO for FLAT and GRID observations,
+exports each with rl.numpy_policy.export_policy(), and reports, per model:
+    - the batch-size-1 predict() latency of the SB3 model and of the
+      NumpyPolicy (what test_model() pays per move),
+    - the same for a 64-observation batch (evaluation's lockstep games),
+    - how often the two pick the same deterministic action over observations
+      from random play (should be 100%, up to float rounding on near-ties).
+
+Usage: python -m benchmarks.numpy_inference [fov_radius]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+GRID_WIDTH, GRID_HEIGHT = 30, 20
+
+
+def _observations(obs_mode, obs_encoding, fov_radius, n):
+    from rl.vec_env import SnakeVecEnv
+
+    env = SnakeVecEnv(n, 30, GRID_WIDTH, GRID_HEIGHT, fov_radius, obs_mode=obs_mode, obs_encoding=obs_encoding, seed=0)
+    env.reset()
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        obs, _, _, _ = env.step(rng.integers(0, 4, size=n))
+    return obs
+
+
+def _per_call_us(predict, obs, repeats):
+    predict(obs)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        predict(obs)
+    return (time.perf_counter() - start) / repeats * 1e6
+
+
+def _first(obs):
+    return {key: value[0] for key, value in obs.items()} if isinstance(obs, dict) else obs[0]
+
+
+def benchmark(fov_radius):
+    import torch
+    from stable_baselines3 import DQN, PPO
+
+    from rl.feature_extractors import SnakeCombinedExtractor, CompactFlatExtractor
+    from rl.numpy_policy import NumpyPolicy, export_policy
+    from rl.vec_env import SnakeVecEnv
+
+    torch.set_num_threads(1)
+    print(f"FOV radius {fov_radius}; latency per predict() call in microseconds")
+    print(f"{'model':<28} {'SB3 b=1':>9} {'NumPy b=1':>10} {'SB3 b=64':>9} {'NumPy b=64':>11} {'agreement':>10}")
+    for obs_mode, obs_encoding in [("flat", "standard"), ("flat", "packed"), ("grid", "standard"), ("grid", "packed")]:
+        if obs_mode == "grid":
+            policy, policy_kwargs = "MultiInputPolicy", {"features_extractor_class": SnakeCombinedExtractor}
+        elif obs_encoding != "standard":
+            policy, policy_kwargs = "MlpPolicy", {"features_extractor_class": CompactFlatExtractor,
+                                                  "features_extractor_kwargs": {"snake_fov_radius": fov_radius}}
+        else:
+            policy, policy_kwargs = "MlpPolicy", None
+        env = SnakeVecEnv(1, 30, GRID_WIDTH, GRID_HEIGHT, fov_radius, obs_mode=obs_mode, obs_encoding=obs_encoding)
+        batch = _observations(obs_mode, obs_encoding, fov_radius, 512)
+        for model_class in (DQN, PPO):
+            model = model_class(policy, env, policy_kwargs=policy_kwargs, device="cpu", seed=0)
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, "policy.npz")
+                export_policy(model, path)
+                numpy_policy = NumpyPolicy.load(path)
+            small = {key: value[:64] for key, value in batch.items()} if isinstance(batch, dict) else batch[:64]
+            timings = [
+                _per_call_us(lambda o: model.predict(o, deterministic=True), _first(batch), 300),
+                _per_call_us(lambda o: numpy_policy.predict(o, deterministic=True), _first(batch), 300),
+                _per_call_us(lambda o: model.predict(o, deterministic=True), small, 100),
+                _per_call_us(lambda o: numpy_policy.predict(o, deterministic=True), small, 100),
+            ]
+            agreement = np.mean(model.predict(batch, deterministic=True)[0] == numpy_policy.predict(batch, deterministic=True)[0])
+            label = f"{model_class.__name__} {obs_mode.upper()} {obs_encoding}"
+            print(f"{label:<28} {timings[0]:>9.1f} {timings[1]:>10.1f} {timings[2]:>9.1f} {timings[3]:>11.1f} {agreement:>10.1%}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,170 @@
+"""
+benchmarks/render_frame.py - pygame frame time, cached vs. primitive drawing.
+
+Times SnakeGameEnvironment._build_canvas() -- one redraw of the human-mode
+hold loop: board, snake, apple, eat ring, score HUD and the 'f' debug
+overlays -- with the sprite caches of game/render_cache.py
+(SnakeGame.use_render_cache = True, the default) and with the previous
+per-primitive drawing, for a range of snake lengths on the Large (60x40)
+board. Also reports how many pixels differ between the two frames (the
+cached gradient and pulse are quantized, see render_cache.py).
+
+Then times a whole window update, full redraw + display.flip() against
+game/dirty_rects.py's DirtyRectRenderer + display.update(rects), both while
+the snake moves every redraw (high fps) and while a step is held (the ~60
+FPS redraw loop at low fps, where only the apple animates).
+
+Runs on SDL's dummy video driver (a real display also works), with a
+display surface set so the cached sprites get convert_alpha()'d the way
+they are in human mode. The dummy driver's flip()/update() don't copy
+anything to a real window, so the window-update gap on a desktop is larger
+than shown here.
+
+Usage: python -m benchmarks.render_frame
+"""
+
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from benchmarks.apple_placement import _core_with_length
+from game import render_cache
+from game.dirty_rects import DirtyRectRenderer
+from game.environment import SnakeGameEnvironment
+from game.snake_game import SnakeGame
+
+GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS = 20, 60, 40, 3
+LENGTHS = [3, 100, 500, 1500]
+REPEATS = 300
+
+
+def _env_with_length(length):
+    env = SnakeGameEnvironment(GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS, render_mode="rgb_array")
+    env.reset(seed=0)
+    env.core = _core_with_length(GRID_WIDTH, GRID_HEIGHT, length)
+    env._game = None
+    env.update_locations()
+    env.font = pygame.font.Font(None, 45)
+    env.show_debug_overlay = True
+    return env
+
+
+def _build_with_eat_ring(env, started_ms_ago=100):
+    # Restart the eat ring every frame, so its cost is part of each one
+    game = env.snakeGame
+    game._eat_effect = (pygame.Vector2(game.apple.pos), pygame.time.get_ticks() - started_ms_ago)
+    return env._build_canvas()
+
+
+def _time_per_frame(env, cached):
+    SnakeGame.use_render_cache = cached
+    _build_with_eat_ring(env)                 # warm up (fills the caches)
+    start = time.perf_counter()
+    for i in range(REPEATS):
+        _build_with_eat_ring(env, started_ms_ago=i % 300)
+    return (time.perf_counter() - start) / REPEATS
+
+
+def _frame(env, cached, ticks=1234):
+    # Both frames at the same pygame time, so the apple pulse and eat ring
+    # are at the same point of their animation
+    SnakeGame.use_render_cache = cached
+    get_ticks = pygame.time.get_ticks
+    pygame.time.get_ticks = lambda: ticks
+    try:
+        return pygame.surfarray.array3d(_build_with_eat_ring(env))
+    finally:
+        pygame.time.get_ticks = get_ticks
+
+
+def _cycle_direction(x, y):
+    """A Hamiltonian cycle over the board (rows zig-zag over columns 1..,
+    column 0 leads back up), so the snake can keep moving at any length.
+    Needs an even GRID_HEIGHT; the snake starts on it (even row, facing right)."""
+    if x == 0:
+        return (0, -1) if y > 0 else (1, 0)
+    if y % 2 == 0:
+        return (1, 0) if x < GRID_WIDTH - 1 else (0, 1)
+    if y == GRID_HEIGHT - 1:
+        return (-1, 0)
+    return (-1, 0) if x > 1 else (0, 1)
+
+
+def _walking_env(length):
+    env = SnakeGameEnvironment(GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS, render_mode="rgb_array")
+    env.reset(seed=0)
+    env.font = pygame.font.Font(None, 45)
+    while env.core.length < length:
+        _advance(env)
+        env.core.grow()
+    return env
+
+
+def _advance(env):
+    env.core.move(*_cycle_direction(*env.core.head_xy))
+    env.snakeGame.eat_apple()
+    env.update_locations()
+
+
+def _time_window_updates(env, renderer, moving):
+    def full():
+        env.screen.blit(env._build_canvas(), (0, 0))
+        pygame.display.flip()
+
+    def dirty():
+        pygame.display.update(renderer.draw(env.snakeGame, env._overlay_sprites()))
+
+    timings = []
+    for present in (full, dirty):
+        renderer.invalidate()
+        present()
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            if moving:
+                _advance(env)
+            present()
+        timings.append((time.perf_counter() - start) / REPEATS)
+    return timings
+
+
+def dirty_rects():
+    screen = pygame.display.get_surface()
+    print(f"\nWindow update per redraw, full redraw + flip() vs. dirty rects + update(rects) ({REPEATS} redraws per row)")
+    print(f"{'length':>8} {'mode':>8} {'full (ms)':>10} {'dirty (ms)':>11} {'speedup':>9}")
+    for length in LENGTHS:
+        env = _walking_env(length)
+        env.screen = screen
+        renderer = DirtyRectRenderer(screen, GRID_SIZE, GRID_WIDTH, GRID_HEIGHT)
+        for mode, moving in (("step", True), ("hold", False)):
+            full, dirty = _time_window_updates(env, renderer, moving)
+            print(f"{env.core.length:>8} {mode:>8} {full * 1e3:>10.2f} {dirty * 1e3:>11.2f} {full / dirty:>8.1f}x")
+
+
+def benchmark():
+    pygame.init()
+    pygame.display.set_mode((GRID_SIZE * GRID_WIDTH, GRID_SIZE * GRID_HEIGHT))
+
+    print(f"_build_canvas() on a {GRID_WIDTH}x{GRID_HEIGHT} board, {GRID_SIZE}px cells, HUD + debug overlays ({REPEATS} frames per row)")
+    print(f"{'length':>8} {'primitive (ms)':>15} {'cached (ms)':>12} {'speedup':>9} {'pixels differing':>17} {'max diff':>9}")
+    for length in LENGTHS:
+        env = _env_with_length(length)
+        primitive = _time_per_frame(env, cached=False)
+        cached = _time_per_frame(env, cached=True)
+        delta = np.abs(_frame(env, False).astype(np.int16) - _frame(env, True))
+        differing = np.any(delta > 0, axis=-1).mean()
+        print(f"{env.core.length:>8} {primitive * 1e3:>15.2f} {cached * 1e3:>12.2f} {primitive / cached:>8.1f}x {differing:>16.3%} {delta.max():>9}")
+
+    SnakeGame.use_render_cache = True
+    print("\nCache entries after the run:")
+    for name, info in render_cache.cache_info().items():
+        print(f"    {name:<16} {info.currsize:>4} / {info.maxsize:<4} hits {info.hits}, misses {info.misses}")
+
+
+if __name__ == "__main__":
+    benchmark()
+    dirty_rects()
+    pygame.quit()
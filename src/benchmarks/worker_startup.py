@@ -0,0 +1,81 @@
+"""
+benchmarks/worker_startup.py - Training worker startup time and memory.
+
+Starts N worker processes the way train_model() would and reports how long
+it takes until every worker has reset its env, each worker's resident
+memory (VmRSS from /proc, Linux only), and which heavy modules each worker
+ended up importing:
+    SB3 SubprocVecEnv + SB3 Monitor   - the previous setup.
+    HeadlessSubprocVecEnv             - lean rl/workers.py worker + EpisodeMonitor.
+    SharedMemoryVecEnv                - the same lean worker code, shared-memory transport.
+
+Only lightweight modules are imported at the top of this file: the env
+factories below are pickled by reference, so every worker imports it too.
+
+Usage: python -m benchmarks.worker_startup [num_workers]
+"""
+
+import sys
+import time
+
+import gymnasium as gym
+
+from game.environment import SnakeGameEnvironment, make_snake_env
+
+HEAVY_MODULES = ("torch", "stable_baselines3", "pygame")
+GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS = 30, 30, 20, 3
+
+
+class ModuleProbe(gym.Wrapper):
+    """Lets the parent ask a worker (via env_method) what it has imported."""
+
+    def loaded_modules(self):
+        return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def _sb3_monitor_env():
+    from stable_baselines3.common.monitor import Monitor
+    return ModuleProbe(Monitor(SnakeGameEnvironment(GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS), filename=None))
+
+
+def _lean_env():
+    return ModuleProbe(make_snake_env(GRID_SIZE, GRID_WIDTH, GRID_HEIGHT, FOV_RADIUS)())
+
+
+def _rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def benchmark(num_workers):
+    from stable_baselines3.common.vec_env import SubprocVecEnv
+    from rl.subproc_vec_env import HeadlessSubprocVecEnv
+    from rl.shared_vec_env import SharedMemoryVecEnv
+
+    variants = [
+        ("SB3 SubprocVecEnv + SB3 Monitor", SubprocVecEnv, _sb3_monitor_env),
+        ("HeadlessSubprocVecEnv", HeadlessSubprocVecEnv, _lean_env),
+        ("SharedMemoryVecEnv", SharedMemoryVecEnv, _lean_env),
+    ]
+    print(f"{num_workers} workers, {GRID_WIDTH}x{GRID_HEIGHT} grid, FOV radius {FOV_RADIUS}")
+    print(f"{'backend':<34} {'startup (s)':>12} {'RSS/worker (MB)':>16}  imported in worker")
+    for label, vec_env_class, env_fn in variants:
+        start = time.perf_counter()
+        venv = vec_env_class([env_fn] * num_workers)
+        venv.reset()
+        startup = time.perf_counter() - start
+
+        rss = sum(_rss_mb(process.pid) for process in venv.processes) / num_workers
+        modules = venv.env_method("loaded_modules", indices=[0])[0]
+        venv.close()
+        print(f"{label:<34} {startup:>12.2f} {rss:>16.1f}  {', '.join(modules) or '-'}")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 4)
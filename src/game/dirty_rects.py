@@ -0,0 +1,160 @@
+"""
+dirty_rects.py - Dirty-rectangle drawing for the human-mode pygame window.
+
+Between two redraws of the game window only a few places change: the head
+and the vacated tail cell, the segments whose (quantized) gradient color
+shifted, the pulsing apple, the eat ring and the HUD. While a game step is
+held (the ~60 FPS redraw loop at low speeds) it's usually just the apple.
+Redrawing the whole board and flipping the whole window for that is most of
+the CPU cost of watching a model on the Large 60x40 preset.
+
+DirtyRectRenderer draws straight onto the display surface and remembers
+what it drew: a code per board cell (which segment sprite, and the eyes'
+facing on the head -- an int32 grid, so diffing two frames is one NumPy
+comparison) and a (key, rect) per floating sprite (apple, eat ring, HUD,
+debug overlays, in draw order). Each draw() repaints only the changed
+cells, merged into horizontal runs: background, segment sprites, then
+every floating sprite overlapping a run, clipped to it. It returns the
+runs for pygame.display.update(). The codes and keys are the
+game/render_cache.py keys, so the window shows exactly what a full cached
+redraw (SnakeGame.draw() plus the overlays) would, animations included.
+
+Classes:
+    DirtyRectRenderer - Incremental drawing of one game onto a display surface.
+"""
+
+import numpy as np
+import pygame
+
+from game import render_cache
+from game.raster import head_facing, on_board
+
+# Head facing -> eyes code (see DirtyRectRenderer._cell_codes)
+_FACINGS = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+
+
+class DirtyRectRenderer:
+    """
+    Args:
+        screen:      The display surface (pygame.display.set_mode()).
+        grid_size:   Pixel size of one grid cell.
+        grid_width:  Number of cells horizontally.
+        grid_height: Number of cells vertically.
+    """
+
+    def __init__(self, screen, grid_size, grid_width, grid_height):
+        self.screen = screen
+        self.grid_size = grid_size
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.board_rect = pygame.Rect(0, 0, grid_size * grid_width, grid_size * grid_height)
+
+        self._codes = np.zeros((grid_height, grid_width), dtype=np.int32)   # cell codes drawn last frame
+        self._sprites = set()      # (key, (x, y, w, h)) of every floating sprite drawn last frame
+        self._full = True          # next draw() repaints everything
+
+    def invalidate(self):
+        """Repaint the whole window on the next draw() -- after something else
+        drew over it (the game-over overlay) or a new game started."""
+        self._full = True
+
+    def _cell_codes(self, game):
+        """(H, W) int32: 0 for no snake, else 1 + gradient step, plus
+        GRADIENT_STEPS * (1 + facing index) on the head (its eyes). Where two
+        segments share a cell (a pending growth) the tail-most one is written
+        last and wins, as in SnakeGame.draw()."""
+        codes = np.zeros((self.grid_height, self.grid_width), dtype=np.int32)
+        body = game.core.body_xy()
+        if not len(body):
+            return codes
+        values = render_cache.gradient_steps(len(body)) + 1
+        inside = on_board(body, self.grid_width, self.grid_height)
+        codes[body[inside, 1], body[inside, 0]] = values[inside]
+        if inside[0]:
+            # Eyes go on top of whichever segment ended up in the head's cell
+            # (a different one once the snake has run into itself)
+            codes[body[0, 1], body[0, 0]] += render_cache.GRADIENT_STEPS * (1 + _FACINGS.index(head_facing(body)))
+        return codes
+
+    def draw(self, game, overlays=()) -> list:
+        """
+        Bring the screen up to date with `game` plus `overlays`.
+
+        Args:
+            game:     The SnakeGame to draw.
+            overlays: (key, surface, topleft) sprites drawn over the game, in
+                      order (e.g. snake_game.hud_sprites()). Equal keys must
+                      mean equal surfaces.
+
+        Returns:
+            The repainted rects, for pygame.display.update(); empty if
+            nothing changed.
+        """
+        codes = self._cell_codes(game)
+        placed = [
+            (key, surface, pygame.Rect(topleft, surface.get_size()))
+            for key, surface, topleft in game.animation_sprites(pygame.time.get_ticks()) + list(overlays)
+        ]
+        sprites = {(key, tuple(rect)) for key, _, rect in placed}
+
+        if self._full:
+            changed = np.ones_like(codes, dtype=bool)
+        else:
+            changed = codes != self._codes
+            # A sprite that moved, changed or (dis)appeared: both where it was
+            # and where it is now
+            gs = self.grid_size
+            for _, rect in sprites ^ self._sprites:
+                rect = pygame.Rect(rect).clip(self.board_rect)
+                if rect.width and rect.height:
+                    changed[rect.top // gs:(rect.bottom - 1) // gs + 1, rect.left // gs:(rect.right - 1) // gs + 1] = True
+
+        runs = self._repaint(changed, codes, placed)
+        self._codes = codes
+        self._sprites = sprites
+        self._full = False
+        return runs
+
+    def _repaint(self, changed, codes, placed):
+        screen, gs = self.screen, self.grid_size
+        ys, xs = np.nonzero(changed)                    # row-major: sorted by row, then column
+        if not len(ys):
+            return []
+
+        # Horizontal runs of changed cells -> one rect each
+        breaks = np.flatnonzero((np.diff(ys) != 0) | (np.diff(xs) != 1)) + 1
+        starts = np.concatenate(([0], breaks))
+        ends = np.concatenate((breaks, [len(ys)])) - 1
+        runs = [
+            pygame.Rect(x0 * gs, y * gs, (x1 - x0 + 1) * gs, gs)
+            for y, x0, x1 in zip(ys[starts].tolist(), xs[starts].tolist(), xs[ends].tolist())
+        ]
+        if len(runs) > 2 * self.grid_height:
+            # Scattered changes (a long snake's gradient shifting): past this
+            # many rects, the per-rect overhead costs more than repainting
+            # every row (grid_height runs) does
+            return self._repaint(np.ones_like(changed), codes, placed)
+
+        background = render_cache.background(gs, self.grid_width, self.grid_height)
+        screen.blits([(background, rect, rect) for rect in runs], doreturn=False)
+
+        # Segment sprites (and the head's eyes) fill exactly their cell, so
+        # they need no clipping
+        cell_codes = codes[ys, xs]
+        snake = np.flatnonzero(cell_codes)
+        blits = []
+        for code, x, y in zip(cell_codes[snake].tolist(), xs[snake].tolist(), ys[snake].tolist()):
+            facing, step = divmod(code - 1, render_cache.GRADIENT_STEPS)
+            blits.append((render_cache.segment_sprite(gs, step), (x * gs, y * gs)))
+            if facing:
+                blits.append((render_cache.eyes_sprite(gs, _FACINGS[facing - 1]), (x * gs, y * gs)))
+        screen.blits(blits, doreturn=False)
+
+        # Floating sprites reach across cells: redraw each one clipped to
+        # every run it overlaps, in draw order
+        for _, surface, sprite_rect in placed:
+            for i in sprite_rect.collidelistall(runs):
+                screen.set_clip(runs[i])
+                screen.blit(surface, sprite_rect)
+        screen.set_clip(None)
+        return runs
@@ -6,26 +6,45 @@ Uses a local FOV observation (plus the apple's direction) so models
 generalize across grid sizes.
 
 FOV cell encoding: 0=empty, 1=body, 2=apple, 3=wall.
-"""
 
-# Imported first (before `import pygame` below): game.snake_game's module-level
-# pygame startup hygiene (env vars + warnings filters, see its docstring) must
-# run before pygame is imported anywhere in this process. A SubprocVecEnv
-# worker reconstructing a pickled env only imports what it needs to resolve
-# SnakeGameEnvironment -- i.e. this module -- so if `import pygame` ran first
-# right here, that worker's AVX2/pkg_resources warnings would already have
-# fired before game.snake_game's protective code got a chance to run.
-from game.snake_game import SnakeGame, Direction, COLOR_BACKGROUND, draw_hud
+Headless by construction: importing this module (which is all a
+SubprocVecEnv worker does to rebuild a pickled env) loads only NumPy,
+gymnasium and the pygame-free game.snake_core/observations/monitor modules.
+pygame (via game.snake_game) is imported the first time something is
+actually rendered, and make_snake_env() wraps with the torch-free
+game.monitor.EpisodeMonitor instead of SB3's Monitor.
+"""
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, module="pygame")
 
-import pygame
 import gymnasium as gym
 import numpy as np
 import random
-from typing import Optional
-from stable_baselines3.common.monitor import Monitor
+from typing import NamedTuple, Optional
+
+from game.snake_core import CoreSnapshot, SnakeCore, Direction
+from game.monitor import EpisodeMonitor
+from game.observations import (
+    OBS_ENCODINGS, observation_space, fov_offsets, window_with_apple, apple_direction,
+    encode_observation,
+)
+
+
+def _import_pygame():
+    """Import pygame on first use. game.snake_game goes first: its module-level
+    pygame startup hygiene (env vars + warnings filters, see its docstring)
+    must run before pygame is imported anywhere in this process."""
+    import game.snake_game  # noqa: F401
+    import pygame
+    return pygame
+
+
+class EnvSnapshot(NamedTuple):
+    """SnakeGameEnvironment.snapshot(): the game plus the env's own step state."""
+    core: CoreSnapshot
+    dir: Direction
+    steps: int
 
 
 class SnakeGameEnvironment(gym.Env):
@@ -47,10 +66,31 @@ class SnakeGameEnvironment(gym.Env):
                            for a CNN-based policy that keeps the FOV's 2D structure.
         render_fps: Frames (= model decisions) per second in human render mode.
                     Defaults to metadata["render_fps"] if None.
+        obs_encoding: "standard" (default), "compact" (uint8 categorical cells) or
+                      "packed" (compact + 2-bit packed), see game/observations.py.
+        rgb_renderer: rgb_array backend: "pygame" (default, SnakeGame.draw()) or
+                      "numpy" (game.raster.GridRasterizer -- no pygame, reuses one
+                      frame buffer, several times faster).
+        render_cell_size: Pixels per cell for the "numpy" renderer (the render
+                      scale). Defaults to grid_size.
+        dirty_rects: Human mode only: redraw and update just the parts of the
+                     window that changed (game.dirty_rects.DirtyRectRenderer)
+                     instead of building a full canvas and flipping the whole
+                     window every redraw. Looks the same, costs far less CPU
+                     on big boards.
+        detect_cycles: End an episode as soon as the game returns to a state it
+                     was already in since the last apple (truncated, with
+                     info["death_cause"] == "cycle"; the -0.5 anti-loop penalty
+                     in training mode). A deterministic policy that repeats a
+                     state would repeat it forever -- it gets no further apple
+                     -- so this stops it right away instead of after the step
+                     cap. Uses SnakeCore's incremental Zobrist hash
+                     (enable_state_hash()) plus a set of the hashes seen since
+                     the last apple: O(1) per step.
     """
     metadata = {"render_modes": ["human", "rgb_array"], "render_fps": 50}
 
-    def __init__(self, grid_size, grid_width, grid_height, snake_fov_radius = 1, render_mode = None, training = True, obs_mode = "flat", render_fps = None):
+    def __init__(self, grid_size, grid_width, grid_height, snake_fov_radius = 1, render_mode = None, training = True, obs_mode = "flat", render_fps = None, obs_encoding = "standard", rgb_renderer = "pygame", render_cell_size = None, dirty_rects = False, detect_cycles = False):
         self.grid_size = grid_size
         self.grid_width = grid_width
         self.grid_height = grid_height
@@ -58,14 +98,26 @@ class SnakeGameEnvironment(gym.Env):
         self.training = training
         assert obs_mode in ("flat", "grid")
         self.obs_mode = obs_mode
+        assert obs_encoding in OBS_ENCODINGS
+        self.obs_encoding = obs_encoding
         self.render_fps = render_fps or self.metadata["render_fps"]
+        assert rgb_renderer in ("pygame", "numpy")
+        self.rgb_renderer = rgb_renderer
+        self.render_cell_size = render_cell_size or grid_size
+        self._rasterizer = None        # GridRasterizer, created on first "numpy" render
+        self.detect_cycles = detect_cycles
+        self._seen_states = set()      # SnakeCore.state_hash of every state since the last apple
 
-        self.snakeGame = None          # Created on reset()
+        self.core = None               # SnakeCore, created on reset()
+        self._game = None              # SnakeGame view over it, only built for rendering
 
         # Pygame objects (lazy-initialized on first render)
         self.screen = None
         self.clock = None
         self.font = None
+        self._canvas = None            # off-screen Surface reused by _build_canvas()
+        self.dirty_rects = dirty_rects
+        self._dirty = None             # DirtyRectRenderer, created with the window
 
         # Debug visualization (human render mode only), toggled with the 'f' key:
         # highlights the FOV the model currently observes and shows an arrow
@@ -75,19 +127,12 @@ class SnakeGameEnvironment(gym.Env):
         # Cached positions for building observations
         self.head_location = np.array([-1, -1])
         self.apple_location = np.array([-1, -1])
-        self.tail_locations = []
         self.dir = None
 
-        # Observation: FOV cells (excl. head, values 0-3) + apple direction (2 values, 0-2).
-        n_cells = (2*self.snake_fov_radius + 1)**2 - 1
-        if self.obs_mode == "flat":
-            self.observation_space = gym.spaces.MultiDiscrete([4] * n_cells + [3, 3])
-        else:
-            fov_side = 2*self.snake_fov_radius + 1
-            self.observation_space = gym.spaces.Dict({
-                "grid": gym.spaces.Box(low=0, high=1, shape=(4, fov_side, fov_side), dtype=np.uint8),
-                "apple_dir": gym.spaces.MultiDiscrete([3, 3]),
-            })
+        # Observation: FOV cells (excl. head, values 0-3) + apple direction (2 values, 0-2),
+        # see game/observations.py (shared with game/vector_engine.py).
+        self.observation_space = observation_space(self.obs_mode, self.snake_fov_radius, self.obs_encoding)
+        self._fov_offsets = fov_offsets(self.snake_fov_radius, self.grid_width + 2*(self.snake_fov_radius + 1))
 
         # 4 discrete actions
         self.action_space = gym.spaces.Discrete(4)
@@ -103,94 +148,59 @@ class SnakeGameEnvironment(gym.Env):
         assert render_mode is None or render_mode in self.metadata["render_modes"]
         self.render_mode = render_mode
 
-    def classify_cell(self, loc: np.ndarray) -> int:
-        """Classify a single cell in the FOV."""
-        if loc[0] < 0 or loc[0] >= self.grid_width or loc[1] < 0 or loc[1] >= self.grid_height:
-            return 3      # Wall / out of bounds
-        elif np.array_equal(loc, self.apple_location):
-            return 2      # Apple
-        elif any(np.array_equal(loc, tail_part) for tail_part in self.tail_locations):
-            return 1      # Snake body
-        else:
-            return 0      # Empty
-
     def _apple_direction(self):
         """Sign of the apple's offset from the head, mapped from {-1,0,1} to {0,1,2}
         per axis. Scale-invariant (direction only, no distance), so it doesn't
         depend on grid size, and gives the agent a signal towards the apple even
         when it is outside the FOV."""
-        hx, hy = self.head_location
-        ax, ay = self.apple_location
-        return int(np.sign(ax - hx)) + 1, int(np.sign(ay - hy)) + 1
+        return apple_direction(self.head_location, self.apple_location)
+
+    @property
+    def snakeGame(self):
+        """SnakeGame (pygame) view over the current core, built on first
+        access -- rendering and the playback UI use it, a headless training
+        env never does (so never imports pygame). None before reset()."""
+        if self.core is None:
+            return None
+        if self._game is None:
+            from game.snake_game import SnakeGame
+            self._game = SnakeGame(self.grid_size, self.grid_width, self.grid_height, core=self.core)
+        return self._game
 
     def _get_obs(self):
         """Build the observation from the current game state, in whichever
-        layout `obs_mode` selects."""
-        if self.obs_mode == "flat":
-            return self._get_obs_flat()
-        return self._get_obs_grid()
-
-    def _get_obs_flat(self):
-        """Flat vector: FOV cells (0=empty, 1=body, 2=apple, 3=wall) followed by
-        the apple direction (dx_sign, dy_sign)."""
-        locations = []
-        hx, hy = self.head_location
+        layout `obs_mode` selects.
 
-        for dy in range(-self.snake_fov_radius, self.snake_fov_radius + 1):
-            for dx in range(-self.snake_fov_radius, self.snake_fov_radius + 1):
-                if dx == 0 and dy == 0:
-                    continue  # Skip head position
-
-                loc = np.array([hx + dx, hy + dy])
-                classification = self.classify_cell(loc)
-
-                locations.append(classification)
-
-        dx_sign, dy_sign = self._apple_direction()
-        locations.append(dx_sign)
-        locations.append(dy_sign)
-
-        return np.array(locations)
-
-    def _get_obs_grid(self):
-        """2D one-hot FOV grid (4 channels: empty/body/apple/wall) plus the
-        apple direction as a separate small vector, for a CNN-based policy.
-        The head's own cell is left all-zero across every channel (it is
-        always exactly the center of the grid)."""
-        fov_side = 2*self.snake_fov_radius + 1
-        grid = np.zeros((4, fov_side, fov_side), dtype=np.uint8)
+        The game's board is padded by fov_radius + 1 cells of WALL (see
+        reset()) and its cell codes already are the FOV encoding, so the FOV
+        is one (2r+1)x(2r+1) slice of it -- no per-cell classification, and
+        the cost no longer grows with the snake's length."""
+        core = self.core
+        r = self.snake_fov_radius
         hx, hy = self.head_location
+        y0, x0 = hy + core.pad - r, hx + core.pad - r
+        side = 2*r + 1
+        window = core.board[y0:y0 + side, x0:x0 + side].reshape(-1)
+        window = window_with_apple(window, core.head, core.apple, self._fov_offsets)
 
-        for dy in range(-self.snake_fov_radius, self.snake_fov_radius + 1):
-            for dx in range(-self.snake_fov_radius, self.snake_fov_radius + 1):
-                if dx == 0 and dy == 0:
-                    continue  # Head cell stays all-zero
-
-                loc = np.array([hx + dx, hy + dy])
-                classification = self.classify_cell(loc)
-                grid[classification, dy + self.snake_fov_radius, dx + self.snake_fov_radius] = 1
+        return encode_observation(window, self._apple_direction(), r, self.obs_mode, self.obs_encoding)
 
-        dx_sign, dy_sign = self._apple_direction()
-        return {"grid": grid, "apple_dir": np.array([dx_sign, dy_sign])}
-    
     def _get_info(self) -> dict:
         """Return auxiliary info dict with current snake length."""
-        if self.snakeGame is None:
+        if self.core is None:
             return {"snake_length": 0}
 
-        return {"snake_length": len(self.snakeGame.snake_list)}
+        return {"snake_length": self.core.length}
     
     def update_locations(self):
-        """Cache head, apple, and tail positions from game state."""
-        if self.snakeGame is None:
+        """Cache head and apple positions from game state."""
+        if self.core is None:
             self.head_location = np.array([-1, -1])
             self.apple_location = np.array([-1, -1])
-            self.tail_locations = []
             return
 
-        self.head_location = self.snakeGame.head.grid_pos
-        self.apple_location = self.snakeGame.apple.grid_pos
-        self.tail_locations = self.snakeGame.get_tail_locations()
+        self.head_location = np.array(self.core.head_xy)
+        self.apple_location = np.array(self.core.apple_xy)
     
     def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None):
         """Reset to a fresh game. Returns (observation, info)."""
@@ -198,9 +208,17 @@ class SnakeGameEnvironment(gym.Env):
         if seed is not None:
             random.seed(seed)  # SnakeGame/Apple use the global `random` module
 
-        self.snakeGame = SnakeGame(self.grid_size, self.grid_width, self.grid_height)
+        # Padded so every FOV window is an in-bounds slice of the board, even
+        # around a head that just moved onto the wall (see _get_obs()).
+        self.core = SnakeCore(self.grid_width, self.grid_height, pad=self.snake_fov_radius + 1)
+        self._game = None
+        if self._dirty is not None:
+            self._dirty.invalidate()   # new game, and the game-over overlay may be on screen
         self.dir = Direction.RIGHT     # Always start facing right
         self.steps = 0                 # Step counter for max-step detection
+        if self.detect_cycles:
+            self.core.enable_state_hash()
+            self._seen_states = {self.core.state_hash}
 
         self.update_locations()
 
@@ -219,6 +237,7 @@ class SnakeGameEnvironment(gym.Env):
         Reward (training mode only):
             +1.0 for eating apple (resets step counter).
             -0.5 for exceeding max_steps (anti-loop, truncates).
+            -0.5 for repeating a state, with detect_cycles (anti-loop, truncates).
             -min(20, max(1, (length-3)*0.5)) for death (scales with length, terminates).
 
         The anti-loop timeout is a `truncated` event (an artificial cutoff, not
@@ -229,7 +248,7 @@ class SnakeGameEnvironment(gym.Env):
 
         Returns: (observation, reward, terminated, truncated, info)
         """
-        if self.snakeGame is None:
+        if self.core is None:
             raise RuntimeError("Call reset() before step().")
 
         if self.dir is None:
@@ -245,10 +264,11 @@ class SnakeGameEnvironment(gym.Env):
         truncated = False
         death_cause = None
         self.steps += 1
-        snake_length = len(self.snakeGame.snake_list)
+        snake_length = self.core.length
 
-        alive = self.snakeGame.move_snake(self.dir)
-        apple_eaten = self.snakeGame.eat_apple()
+        alive = self.core.move(*self.dir.value)
+        # Through the view if one exists, so it can start its eat animation
+        apple_eaten = (self._game or self.core).eat_apple()
 
         # Max steps before timeout = 2/3 of total grid cells
         max_steps = 2/3 * (self.grid_width * self.grid_height)
@@ -256,10 +276,18 @@ class SnakeGameEnvironment(gym.Env):
         if apple_eaten:
             reward = 1
             self.steps = 0             # Reset after eating
+            if self.detect_cycles:
+                # The snake is longer now, so no earlier state can come back
+                self._seen_states = {self.core.state_hash}
         elif self.steps >= max_steps and self.training:
             truncated = True           # Anti-loop cutoff, not a real game-over
             death_cause = "timeout"
             reward = -0.5              # Anti-loop penalty
+        elif self.detect_cycles and alive and self._seen_state():
+            truncated = True           # Cut short, the state itself isn't terminal
+            death_cause = "cycle"
+            if self.training:
+                reward = -0.5          # Same anti-loop penalty as the timeout
 
         if not alive:
             terminated = True
@@ -279,6 +307,50 @@ class SnakeGameEnvironment(gym.Env):
 
         return observation, reward, terminated, truncated, info
     
+    def _seen_state(self) -> bool:
+        """Record the current state; True if it was already seen since the
+        last apple (see detect_cycles)."""
+        state = self.core.state_hash
+        if state in self._seen_states:
+            return True
+        self._seen_states.add(state)
+        return False
+
+    def snapshot(self) -> EnvSnapshot:
+        """
+        Compact copy of the episode state -- the game (SnakeCore.snapshot():
+        int32 body cells, apple, score) plus the current direction and the
+        anti-loop step counter -- for search/lookahead. O(length), a few
+        hundred bytes for typical snakes.
+        """
+        if self.core is None:
+            raise RuntimeError("Call reset() before snapshot().")
+        return EnvSnapshot(self.core.snapshot(), self.dir, self.steps)
+
+    def restore(self, snapshot: EnvSnapshot):
+        """
+        Return to a snapshot()'s state; the next step() continues from there.
+        The snapshot may come from another env with the same grid size and
+        FOV radius (e.g. a headless copy used for search, see rl/planning.py).
+        Nothing is rendered. The states seen since the last apple aren't part
+        of a snapshot: cycle detection starts over from the restored state.
+        """
+        if self.core is None:
+            raise RuntimeError("Call reset() before restore().")
+        if self._game is not None:
+            self._game.restore(snapshot.core)
+        else:
+            self.core.restore(snapshot.core)
+        self.dir = snapshot.dir
+        self.steps = snapshot.steps
+        if self.detect_cycles:
+            self._seen_states = {self.core.state_hash}
+        self.update_locations()
+
+    def observe(self):
+        """Observation of the current state (e.g. right after restore())."""
+        return self._get_obs()
+
     def render(self):
         """Public render (Gymnasium API). Only returns data for rgb_array mode."""
         if self.render_mode == "rgb_array":
@@ -292,27 +364,56 @@ class SnakeGameEnvironment(gym.Env):
         game/snake_game.py) only ever get sampled once per step, which reads as
         choppy at low "speed" settings even though their actual duration is already
         speed-independent."""
-        canvas = pygame.Surface((self.grid_size * self.grid_width, self.grid_size * self.grid_height))
-        canvas.fill(COLOR_BACKGROUND)
+        pygame = _import_pygame()
+        from game.snake_game import COLOR_BACKGROUND, SnakeGame
+
+        # One canvas reused across redraws (the human-mode hold loop builds
+        # ~60 per game step); the cached draw() covers all of it with the
+        # background blit, so it only needs the fill on the primitive path.
+        if self._canvas is None:
+            self._canvas = pygame.Surface((self.grid_size * self.grid_width, self.grid_size * self.grid_height))
+        canvas = self._canvas
+        if not SnakeGame.use_render_cache:
+            canvas.fill(COLOR_BACKGROUND)
 
         self.snakeGame.draw(canvas)
+        for _, sprite, topleft in self._overlay_sprites():
+            canvas.blit(sprite, topleft)
 
-        if self.show_debug_overlay:
-            self._draw_fov_overlay(canvas)
+        return canvas
 
-        # Render score overlay (font only exists in human mode)
-        if self.font is not None:
-            draw_hud(canvas, self.font, self.snakeGame.score)
+    def _overlay_sprites(self):
+        """(key, surface, topleft) of everything drawn over the game, in order:
+        the FOV highlight, the score HUD (font only exists in human mode) and
+        the apple-direction arrow -- the debug parts only while toggled on."""
+        from game.snake_game import hud_sprites
 
+        sprites = []
         if self.show_debug_overlay:
-            self._draw_apple_direction_arrow(canvas)
-
-        return canvas
+            sprites.append(self._fov_overlay_sprite())
+        if self.font is not None:
+            sprites.extend(hud_sprites(self.font, self.snakeGame.score))
+        if self.show_debug_overlay:
+            arrow = self._apple_direction_sprite()
+            if arrow is not None:
+                sprites.append(arrow)
+        return sprites
+
+    def _present(self):
+        """Show the current state in the window: only the changed regions with
+        dirty_rects, else a full canvas and a flip of the whole window."""
+        pygame = _import_pygame()
+        if self._dirty is not None:
+            pygame.display.update(self._dirty.draw(self.snakeGame, self._overlay_sprites()))
+        else:
+            self.screen.blit(self._build_canvas(), (0, 0))
+            pygame.display.flip()
 
     def _pump_events(self):
         """Handle QUIT/ESC/'f'-toggle. Called every redraw (not just once per game
         step) so ESC and the debug-overlay toggle react immediately instead of
         only at the end of a held frame."""
+        pygame = _import_pygame()
         for event in pygame.event.get():
             if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
                 self.close()
@@ -322,16 +423,24 @@ class SnakeGameEnvironment(gym.Env):
 
     def _render_frame(self):
         """Internal render. Human mode: Pygame window. rgb_array: returns np array."""
+        if self.render_mode == "rgb_array" and self.rgb_renderer == "numpy":
+            return self._rasterize()
+
+        pygame = _import_pygame()
+
         # Lazy-init Pygame display for human mode
         if self.screen is None and self.render_mode == "human":
             pygame.init()
             self.screen = pygame.display.set_mode((self.grid_size * self.grid_width, self.grid_size * self.grid_height))
             self.font = pygame.font.Font(None, 45)
+            if self.dirty_rects:
+                from game.dirty_rects import DirtyRectRenderer
+                self._dirty = DirtyRectRenderer(self.screen, self.grid_size, self.grid_width, self.grid_height)
 
         if self.clock is None and self.render_mode == "human":
             self.clock = pygame.time.Clock()
 
-        if self.snakeGame is None:
+        if self.core is None:
             raise RuntimeError("Call reset() before rendering.")
 
         if self.render_mode == "human" and self.screen is not None and self.clock is not None:
@@ -345,16 +454,14 @@ class SnakeGameEnvironment(gym.Env):
             # steps and would overshoot noticeably at speeds like 40/50 fps.
             if self.render_fps >= 60:
                 self._pump_events()
-                self.screen.blit(self._build_canvas(), (0, 0))
-                pygame.display.flip()
+                self._present()
                 self.clock.tick(self.render_fps)
             else:
                 target_ms = 1000.0 / self.render_fps
                 start = pygame.time.get_ticks()
                 while True:
                     self._pump_events()
-                    self.screen.blit(self._build_canvas(), (0, 0))
-                    pygame.display.flip()
+                    self._present()
                     self.clock.tick(60)
                     if pygame.time.get_ticks() - start >= target_ms:
                         break
@@ -364,61 +471,59 @@ class SnakeGameEnvironment(gym.Env):
                 np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
             )
 
-    def _draw_fov_overlay(self, canvas):
-        """Highlight the (2r+1)x(2r+1) FOV window the model currently observes."""
+    def _rasterize(self):
+        """rgb_array frame from the NumPy renderer. Returns its reused frame
+        buffer -- overwritten by the next render() (a SubprocVecEnv worker
+        pickles it right away anyway)."""
+        if self.core is None:
+            raise RuntimeError("Call reset() before rendering.")
+        if self._rasterizer is None:
+            from game.raster import GridRasterizer
+            self._rasterizer = GridRasterizer(self.grid_width, self.grid_height, self.render_cell_size)
+        return self._rasterizer.render(self.core.body_xy(), self.core.apple_xy)
+
+    def _fov_overlay_sprite(self):
+        """Highlight of the (2r+1)x(2r+1) FOV window the model currently observes."""
+        from game import render_cache
         hx, hy = self.head_location
         r = self.snake_fov_radius
-        size = self.grid_size * (2*r + 1)
-
-        overlay = pygame.Surface((size, size), pygame.SRCALPHA)
-        overlay.fill(pygame.Color(255, 220, 90, 55))
-        pygame.draw.rect(overlay, pygame.Color(255, 220, 90, 170), overlay.get_rect(), width=3)
+        overlay = render_cache.fov_overlay(self.grid_size, r)
 
         # Pygame clips blits at the canvas edge automatically, so no special
         # handling is needed when the head is close to a wall.
-        top_left = ((hx - r) * self.grid_size, (hy - r) * self.grid_size)
-        canvas.blit(overlay, top_left)
+        top_left = (int(hx - r) * self.grid_size, int(hy - r) * self.grid_size)
+        return ("fov", r), overlay, top_left
 
-    def _draw_apple_direction_arrow(self, canvas):
-        """Draw a small fixed arrow icon (top-right corner) pointing in the
-        direction of the apple_dir observation feature."""
+    def _apple_direction_sprite(self):
+        """Small fixed arrow icon (top-right corner) pointing in the direction
+        of the apple_dir observation feature, or None when there is none."""
+        from game import render_cache
         dx_sign, dy_sign = self._apple_direction()
-        dx, dy = dx_sign - 1, dy_sign - 1      # back from {0,1,2} to {-1,0,1}
+        dx, dy = int(dx_sign) - 1, int(dy_sign) - 1      # back from {0,1,2} to {-1,0,1}
         if dx == 0 and dy == 0:
-            return
-
-        direction = pygame.Vector2(dx, dy)
-        if direction.length() > 0:
-            direction = direction.normalize()
+            return None
 
-        box_size = 56
+        # One of at most 8 icons, built once (see game/render_cache.py)
+        icon = render_cache.direction_icon(dx, dy)
         margin = 16
-        icon = pygame.Surface((box_size, box_size), pygame.SRCALPHA)
-        center = pygame.Vector2(box_size / 2, box_size / 2)
-        pygame.draw.circle(icon, pygame.Color(15, 16, 24, 180), center, box_size / 2)
-
-        arrow_len = box_size * 0.32
-        tip = center + direction * arrow_len
-        back = center - direction * arrow_len * 0.6
-        perp = pygame.Vector2(-direction.y, direction.x)
-        left = back + perp * arrow_len * 0.45
-        right = back - perp * arrow_len * 0.45
-        pygame.draw.polygon(icon, pygame.Color(255, 210, 90), [tip, left, right])
-
-        canvas.blit(icon, (canvas.get_width() - margin - box_size, margin))
+        return ("apple_dir", dx, dy), icon, (self.grid_size * self.grid_width - margin - icon.get_width(), margin)
 
     def close(self):
         """Clean up Pygame resources."""
         if self.screen is not None:
+            pygame = _import_pygame()
+            from game import render_cache
             pygame.display.quit()
             pygame.quit()
+            render_cache.clear()
 
 
-def make_snake_env(grid_size, grid_width, grid_height, snake_fov_radius = 1, render_mode = None, training = True, obs_mode = "flat", render_fps = None):
-    """Factory returning a callable that creates a Monitor-wrapped environment.
+def make_snake_env(grid_size, grid_width, grid_height, snake_fov_radius = 1, render_mode = None, training = True, obs_mode = "flat", render_fps = None, obs_encoding = "standard", rgb_renderer = "pygame", render_cell_size = None, dirty_rects = False, detect_cycles = False):
+    """Factory returning a callable that creates a Monitor-wrapped environment
+    (game.monitor.EpisodeMonitor: SB3 Monitor's episode stats without torch).
     Required by SubprocVecEnv (one callable per subprocess)."""
     def _init():
-        env = SnakeGameEnvironment(grid_size, grid_width, grid_height, snake_fov_radius, render_mode, training, obs_mode, render_fps)
-        env = Monitor(env, filename=None)
+        env = SnakeGameEnvironment(grid_size, grid_width, grid_height, snake_fov_radius, render_mode, training, obs_mode, render_fps, obs_encoding, rgb_renderer, render_cell_size, dirty_rects, detect_cycles)
+        env = EpisodeMonitor(env)
         return env
     return _init
\ No newline at end of file
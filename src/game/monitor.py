@@ -0,0 +1,61 @@
+"""
+monitor.py - Torch-free episode statistics wrapper.
+
+EpisodeMonitor reports the same per-episode statistics as
+stable_baselines3.common.monitor.Monitor (with filename=None): on the step
+that ends an episode, info["episode"] = {"r": return, "l": length,
+"t": seconds since the wrapper was created}, which SB3 picks up for its
+rollout/ep_rew_mean and rollout/ep_len_mean logs. Importing SB3's Monitor
+pulls in torch, which every training worker process would otherwise pay for
+at startup just to sum up rewards.
+
+Classes:
+    EpisodeMonitor - gym.Wrapper adding Monitor-style episode stats.
+"""
+
+import time
+
+import gymnasium as gym
+
+
+class EpisodeMonitor(gym.Wrapper):
+    """Monitor-equivalent episode statistics, without SB3/torch imports."""
+
+    def __init__(self, env):
+        super().__init__(env)
+        self.t_start = time.time()
+        self.rewards = []
+        self.episode_returns = []
+        self.episode_lengths = []
+        self.episode_times = []
+        self.total_steps = 0
+
+    def reset(self, **kwargs):
+        self.rewards = []
+        return self.env.reset(**kwargs)
+
+    def step(self, action):
+        observation, reward, terminated, truncated, info = self.env.step(action)
+        self.rewards.append(float(reward))
+        if terminated or truncated:
+            ep_rew = sum(self.rewards)
+            ep_len = len(self.rewards)
+            ep_info = {"r": round(ep_rew, 6), "l": ep_len, "t": round(time.time() - self.t_start, 6)}
+            self.episode_returns.append(ep_rew)
+            self.episode_lengths.append(ep_len)
+            self.episode_times.append(time.time() - self.t_start)
+            info["episode"] = ep_info
+        self.total_steps += 1
+        return observation, reward, terminated, truncated, info
+
+    def get_total_steps(self) -> int:
+        return self.total_steps
+
+    def get_episode_rewards(self) -> list[float]:
+        return self.episode_returns
+
+    def get_episode_lengths(self) -> list[int]:
+        return self.episode_lengths
+
+    def get_episode_times(self) -> list[float]:
+        return self.episode_times
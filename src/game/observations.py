@@ -0,0 +1,186 @@
+"""
+observations.py - Building FOV observations straight from an occupancy board.
+
+Both game.environment.SnakeGameEnvironment (one game) and
+game.vector_engine.VectorSnakeEngine (N games in lockstep) keep a wall-padded
+board whose cell codes already are the FOV encoding (see game/snake_core.py:
+0=empty, 1=body, 2=apple, 3=wall). The (2r+1)x(2r+1) FOV around the head is
+therefore a single gather of precomputed flat offsets, and the FLAT/GRID
+observations are a reshape/one-hot of that -- no per-cell Python work.
+
+Every function here accepts any number of leading batch dimensions, so the
+same code serves the single-env and the vectorized path.
+
+Observations come in one of three encodings (`obs_encoding`), all carrying
+the same information:
+    "standard" - the original layout: FLAT as an int64 MultiDiscrete vector,
+                 GRID as a 4-channel one-hot uint8 grid. Default, and what
+                 every existing checkpoint was trained on.
+    "compact"  - uint8 categorical cell codes: FLAT as a uint8 Box vector of
+                 the same values (8x smaller), GRID as a single (2r+1)x(2r+1) map of
+                 codes (4x smaller; the head's cell holds whatever the board
+                 has there and is masked out again on expansion).
+    "packed"   - "compact", additionally 2-bit packed (4 codes per byte, low
+                 bits first): FLAT's cells + apple direction into one uint8
+                 vector, GRID's map row by row.
+The policy side undoes compact/packed in rl/feature_extractors.py, so the
+network sees exactly the one-hot input it would for "standard".
+"""
+
+import numpy as np
+
+from game.snake_core import APPLE
+
+N_CELL_TYPES = 4   # empty / body / apple / wall
+OBS_ENCODINGS = ("standard", "compact", "packed")
+
+_ONE_HOT = np.eye(N_CELL_TYPES, dtype=np.uint8)
+
+
+def fov_side(radius) -> int:
+    return 2*radius + 1
+
+
+def fov_offsets(radius, stride) -> np.ndarray:
+    """Flat board offsets of every FOV cell relative to the head, row by row
+    (dy outer, dx inner) -- the same order the observation has always used."""
+    d = np.arange(-radius, radius + 1)
+    return (d[:, None] * stride + d[None, :]).reshape(-1)
+
+
+def non_center_index(radius) -> np.ndarray:
+    """Indices into a flattened FOV window that skip the head's own cell."""
+    side = fov_side(radius)
+    center = (side * side) // 2
+    return np.delete(np.arange(side * side), center)
+
+
+def fov_window(cells, heads, offsets) -> np.ndarray:
+    """
+    Gather the FOV window around each head.
+
+    Args:
+        cells:   (..., n_cells) flat padded board(s).
+        heads:   (...) flat head index per board.
+        offsets: fov_offsets(radius, stride).
+
+    Returns:
+        (..., (2r+1)**2) uint8 cell codes.
+    """
+    idx = np.asarray(heads)[..., None] + offsets
+    return np.take_along_axis(cells, idx, axis=-1)
+
+
+def apple_direction(head_xy, apple_xy) -> np.ndarray:
+    """Sign of the apple's offset from the head, mapped from {-1,0,1} to
+    {0,1,2} per axis. (..., 2) int64 for (..., 2) inputs."""
+    return np.sign(np.asarray(apple_xy, dtype=np.int64) - np.asarray(head_xy, dtype=np.int64)) + 1
+
+
+def flat_observation(window, apple_dir, radius) -> np.ndarray:
+    """FOV cells without the head's cell, followed by the apple direction --
+    (..., (2r+1)**2 - 1 + 2) int64, identical to the original per-cell loop."""
+    cells = window[..., non_center_index(radius)].astype(np.int64)
+    return np.concatenate([cells, apple_dir], axis=-1)
+
+
+def grid_observation(window, apple_dir, radius) -> dict:
+    """One-hot (..., 4, 2r+1, 2r+1) uint8 FOV grid (the head's cell all-zero
+    across every channel) plus the apple direction."""
+    side = fov_side(radius)
+    one_hot = _ONE_HOT[window]                                 # (..., side*side, 4)
+    one_hot[..., (side * side) // 2, :] = 0
+    grid = np.moveaxis(one_hot, -1, -2).reshape(*window.shape[:-1], N_CELL_TYPES, side, side)
+    return {"grid": grid, "apple_dir": apple_dir}
+
+
+def window_with_apple(window, heads, apples, offsets):
+    """Force the apple's code into the window even if the board shows BODY
+    there. Only happens on a completely full board (the apple stays on the
+    cell it was just eaten from), where the original classify_cell() checked
+    the apple first."""
+    rel = np.asarray(apples)[..., None] - np.asarray(heads)[..., None]
+    hit = rel == offsets
+    if hit.any():
+        window = np.where(hit, np.uint8(APPLE), window)
+    return window
+
+
+def packed_size(n_values) -> int:
+    """Bytes needed for `n_values` 2-bit codes."""
+    return -(-n_values // 4)
+
+
+def pack_2bit(values) -> np.ndarray:
+    """Pack codes 0-3 along the last axis, 4 per byte (first value in the
+    lowest two bits), zero-padding the last byte."""
+    values = np.asarray(values, dtype=np.uint8)
+    n = values.shape[-1]
+    padded = np.zeros((*values.shape[:-1], packed_size(n) * 4), dtype=np.uint8)
+    padded[..., :n] = values
+    quads = padded.reshape(*values.shape[:-1], -1, 4)
+    return quads[..., 0] | (quads[..., 1] << 2) | (quads[..., 2] << 4) | (quads[..., 3] << 6)
+
+
+def encode_observation(window, apple_dir, radius, obs_mode, obs_encoding="standard"):
+    """The observation for an FOV `window` (see fov_window()) and apple
+    direction, in the given mode and encoding."""
+    if obs_encoding == "standard":
+        if obs_mode == "flat":
+            return flat_observation(window, apple_dir, radius)
+        return grid_observation(window, apple_dir, radius)
+
+    apple_dir = np.asarray(apple_dir, dtype=np.uint8)
+    if obs_mode == "flat":
+        values = np.concatenate([window[..., non_center_index(radius)], apple_dir], axis=-1)
+        return values if obs_encoding == "compact" else pack_2bit(values)
+
+    side = fov_side(radius)
+    grid = window.reshape(*window.shape[:-1], side, side)
+    if obs_encoding == "packed":
+        grid = pack_2bit(grid)
+    return {"grid": grid, "apple_dir": apple_dir}
+
+
+def observation_space(obs_mode, radius, obs_encoding="standard"):
+    """The gymnasium observation space for `obs_mode` ("flat" or "grid") at
+    FOV radius `radius`, in the given encoding."""
+    import gymnasium as gym
+
+    assert obs_encoding in OBS_ENCODINGS
+    side = fov_side(radius)
+    n_cells = side**2 - 1
+    if obs_mode == "flat":
+        if obs_encoding == "standard":
+            return gym.spaces.MultiDiscrete([N_CELL_TYPES] * n_cells + [3, 3])
+        if obs_encoding == "packed":
+            return gym.spaces.Box(low=0, high=255, shape=(packed_size(n_cells + 2),), dtype=np.uint8)
+        # A Box rather than a uint8 MultiDiscrete: SB3 sums `nvec` in its
+        # dtype, which overflows uint8 from radius 4 on.
+        high = np.array([N_CELL_TYPES - 1] * n_cells + [2, 2], dtype=np.uint8)
+        return gym.spaces.Box(low=0, high=high, dtype=np.uint8)
+
+    if obs_encoding == "standard":
+        grid = gym.spaces.Box(low=0, high=1, shape=(N_CELL_TYPES, side, side), dtype=np.uint8)
+        apple_dir = gym.spaces.MultiDiscrete([3, 3])
+    else:
+        if obs_encoding == "compact":
+            grid = gym.spaces.Box(low=0, high=N_CELL_TYPES - 1, shape=(side, side), dtype=np.uint8)
+        else:
+            grid = gym.spaces.Box(low=0, high=255, shape=(side, packed_size(side)), dtype=np.uint8)
+        apple_dir = gym.spaces.MultiDiscrete([3, 3], dtype=np.uint8)
+    return gym.spaces.Dict({"grid": grid, "apple_dir": apple_dir})
+
+
+def observation_encoding(space) -> str:
+    """Which encoding a (e.g. loaded model's) observation space uses."""
+    import gymnasium as gym
+
+    if isinstance(space, gym.spaces.Dict):
+        grid = space["grid"]
+        if len(grid.shape) == 3:
+            return "standard"
+        return "compact" if int(grid.high.max()) == N_CELL_TYPES - 1 else "packed"
+    if isinstance(space, gym.spaces.Box):
+        return "compact" if int(space.high.max()) == N_CELL_TYPES - 1 else "packed"
+    return "standard"
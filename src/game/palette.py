@@ -0,0 +1,18 @@
+"""
+palette.py - The dark-theme color palette as plain RGB tuples (no pygame).
+
+game.snake_game turns these into pygame.Color objects for the pygame
+renderer; game.raster uses them directly, so both renderers (and the UI
+theme, via game.snake_game) always agree on colors.
+"""
+
+BACKGROUND = (24, 26, 38)
+GRID_LINE = (32, 35, 50)
+SNAKE_HEAD = (140, 235, 160)
+SNAKE_TAIL = (45, 130, 90)
+SNAKE_EYE = (20, 20, 30)
+APPLE = (235, 87, 87)
+APPLE_HIGHLIGHT = (255, 175, 175)
+APPLE_LEAF = (96, 168, 96)
+SCORE_TEXT = (235, 237, 245)
+SCORE_PANEL = (15, 16, 24)
@@ -0,0 +1,167 @@
+"""
+raster.py - Pure-NumPy renderer for rgb_array frames (no pygame).
+
+GridRasterizer draws a game state straight into one reusable (H, W, 3)
+uint8 array: the background (with grid lines) is a precomputed full frame
+copied in with one np.copyto(), and every cell-sized sprite -- body segment
+(rounded square), head eyes per facing direction, apple -- is precomputed
+once as a mask at the chosen cell size. Drawing the snake is then a single
+fancy-indexed assignment into a (rows, cell, cols, cell, 3) view of the
+frame, instead of one pygame primitive per segment plus a Surface
+allocation and a surfarray copy/transpose per frame.
+
+The look follows SnakeGame.draw() (same palette, head-to-tail gradient,
+eyes, apple with highlight and leaf) closely enough for the live training
+view and video export, minus the time-based effects (apple shimmer, eat
+ring) and the score HUD, which the pygame rgb_array path doesn't draw
+either.
+
+Classes:
+    GridRasterizer - Reusable-buffer NumPy renderer for one board size.
+
+Functions (shared with the pygame renderers):
+    on_board()    - Mask of the body cells inside the board.
+    head_facing() - (dx, dy) the head moved in.
+"""
+
+import numpy as np
+
+from game import palette
+
+# (dx, dy) facing -> index into the precomputed eye masks
+_FACINGS = {(1, 0): 0, (0, 1): 1, (-1, 0): 2, (0, -1): 3}
+
+
+def on_board(body, grid_width, grid_height) -> np.ndarray:
+    """Mask of the (n, 2) body cells inside the board -- a head that just
+    moved onto the wall is outside it."""
+    return (body[:, 0] >= 0) & (body[:, 0] < grid_width) & (body[:, 1] >= 0) & (body[:, 1] < grid_height)
+
+
+def head_facing(body):
+    """(dx, dy) the head moved in, from the head and the first body segment."""
+    if len(body) > 1:
+        facing = tuple(int(v) for v in np.sign(body[0] - body[1]))
+        if facing != (0, 0):
+            return facing
+    return (1, 0)
+
+
+def _rgb(color) -> np.ndarray:
+    return np.array(color, dtype=np.float64)
+
+
+def _pixel_centers(cell_size):
+    c = np.arange(cell_size) + 0.5
+    return c[None, :], c[:, None]        # x (1, cs), y (cs, 1)
+
+
+def _rounded_square(cell_size, radius) -> np.ndarray:
+    """Mask of a cell-filling square with rounded corners (pygame.draw.rect's
+    border_radius)."""
+    x, y = _pixel_centers(cell_size)
+    dx = np.maximum(np.maximum(radius - x, x - (cell_size - radius)), 0)
+    dy = np.maximum(np.maximum(radius - y, y - (cell_size - radius)), 0)
+    return dx**2 + dy**2 <= radius**2
+
+
+def _disc(cell_size, cx, cy, radius) -> np.ndarray:
+    x, y = _pixel_centers(cell_size)
+    return (x - cx)**2 + (y - cy)**2 <= radius**2
+
+
+def _triangle(cell_size, a, b, c) -> np.ndarray:
+    x, y = _pixel_centers(cell_size)
+
+    def side(p, q):
+        return (q[0] - p[0]) * (y - p[1]) - (q[1] - p[1]) * (x - p[0])
+    s1, s2, s3 = side(a, b), side(b, c), side(c, a)
+    return ((s1 >= 0) & (s2 >= 0) & (s3 >= 0)) | ((s1 <= 0) & (s2 <= 0) & (s3 <= 0))
+
+
+class GridRasterizer:
+    """
+    Args:
+        grid_width/height: Board size in cells.
+        cell_size:         Pixels per cell (the render scale).
+    """
+
+    def __init__(self, grid_width, grid_height, cell_size):
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.cell_size = cs = cell_size
+
+        # Background cell: grid lines along its top and left edge (SnakeGame
+        # draws a line at every multiple of the cell size).
+        self._bg_cell = np.empty((cs, cs, 3), dtype=np.uint8)
+        self._bg_cell[:] = palette.BACKGROUND
+        self._bg_cell[0, :] = palette.GRID_LINE
+        self._bg_cell[:, 0] = palette.GRID_LINE
+        self._background = np.tile(self._bg_cell, (grid_height, grid_width, 1))
+
+        self.frame = np.empty_like(self._background)
+        # (row, y_in_cell, col, x_in_cell, rgb) view: a cell is frame4[row, :, col]
+        self._frame4 = self.frame.reshape(grid_height, cs, grid_width, cs, 3)
+
+        self._segment = _rounded_square(cs, max(2, int(cs * 0.25)))
+        self._head = _rgb(palette.SNAKE_HEAD)
+        self._tail = _rgb(palette.SNAKE_TAIL)
+        self._eyes = np.stack([self._eye_mask(fx, fy) for (fx, fy) in _FACINGS])
+        self._apple = self._apple_sprite()
+
+    def _eye_mask(self, fx, fy):
+        cs = self.cell_size
+        px, py = -fy, fx                               # perpendicular
+        cx = cs / 2 + fx * cs * 0.18
+        cy = cs / 2 + fy * cs * 0.18
+        radius = max(2, cs * 0.09)
+        return (_disc(cs, cx + px * cs * 0.22, cy + py * cs * 0.22, radius)
+                | _disc(cs, cx - px * cs * 0.22, cy - py * cs * 0.22, radius))
+
+    def _apple_sprite(self):
+        """The apple composited over a background cell: circle, highlight, leaf."""
+        cs = self.cell_size
+        c = cs / 2
+        r = cs / 2 * 0.85
+        sprite = self._bg_cell.copy()
+        sprite[_disc(cs, c, c, r)] = palette.APPLE
+        sprite[_disc(cs, c - r * 0.35, c - r * 0.35, r * 0.28)] = palette.APPLE_HIGHLIGHT
+        leaf = _triangle(cs, (c, c - r * 0.95), (c + r * 0.35, c - r * 1.3), (c - r * 0.05, c - r * 1.05))
+        sprite[leaf] = palette.APPLE_LEAF
+        return sprite
+
+    def render(self, body_xy, apple_xy) -> np.ndarray:
+        """
+        Draw one state into self.frame and return it.
+
+        Args:
+            body_xy:  (L, 2) segment grid coordinates, head first (e.g.
+                      SnakeCore.body_xy() or VectorSnakeEngine.body_xy(i)).
+            apple_xy: (x, y) of the apple.
+
+        Returns:
+            self.frame -- the same array every call, overwritten by the next
+            render(); copy it if it has to outlive that.
+        """
+        np.copyto(self.frame, self._background)
+        frame4 = self._frame4
+
+        body = np.asarray(body_xy, dtype=np.int64).reshape(-1, 2)
+        ax, ay = int(apple_xy[0]), int(apple_xy[1])
+        if 0 <= ax < self.grid_width and 0 <= ay < self.grid_height:
+            frame4[ay, :, ax] = self._apple
+
+        inside = on_board(body, self.grid_width, self.grid_height)
+        n = len(body)
+        t = np.arange(n) / max(1, n - 1)               # 0 at head, 1 at tail
+        colors = np.rint(self._head + (self._tail - self._head) * t[:, None]).astype(np.uint8)
+        # Assigned head to tail, so where two segments share a cell (a pending
+        # growth) the tail-most one ends up on top, as in SnakeGame.draw().
+        sprites = np.where(self._segment[None, :, :, None], colors[:, None, None, :], self._bg_cell[None])
+        keep = np.flatnonzero(inside)
+        frame4[body[keep, 1], :, body[keep, 0]] = sprites[keep]
+
+        if n and inside[0]:
+            eyes = self._eyes[_FACINGS.get(head_facing(body), 0)]
+            frame4[body[0, 1], :, body[0, 0]][eyes] = palette.SNAKE_EYE
+        return self.frame
@@ -0,0 +1,213 @@
+"""
+render_cache.py - Pre-rendered surfaces for the pygame renderer.
+
+In human mode the environment redraws the whole canvas at ~60 FPS while it
+holds a game step (see SnakeGameEnvironment._render_frame), so at
+render_fps < 60 every game step meant ~60 full redraws: every grid line via
+pygame.draw.line, one primitive per body segment, the HUD text through
+font.render, and a fresh SRCALPHA Surface for the HUD panel, the eat ring,
+the FOV overlay and the apple-direction icon. Almost none of that changes
+between redraws.
+
+This module builds each of those pieces once and hands back the same
+Surface afterwards; drawing is then a handful of blits. Every builder is a
+functools.lru_cache with a fixed maxsize, so the caches stay bounded even
+across many board sizes, font objects or scores (least recently used
+entries are evicted first). The keys are quantized where the input is
+continuous:
+    - the head-to-tail gradient to GRADIENT_STEPS colors,
+    - the apple's idle pulse to PULSE_PHASES phases per period,
+    - the eat ring's lifetime to RING_STEPS frames.
+At these step counts a cached frame differs from the primitive path
+(SnakeGame.use_render_cache = False) by a few color units along the body
+and a handful of edge pixels of the pulsing apple -- not visible, see
+benchmarks/render_frame.py, which also times the two paths.
+
+Functions:
+    background       - Board background with grid lines, per (cell, width, height).
+    segment_sprite   - Rounded body segment at one gradient step.
+    eyes_sprite      - The head's eyes for one facing direction.
+    apple_sprite     - Apple (circle, highlight, leaf) at one pulse phase.
+    eat_ring_sprite  - Expanding eat ring at one step of its lifetime.
+    hud_surfaces     - Score text and its rounded panel.
+    fov_overlay      - Debug overlay of the observed FOV window.
+    direction_icon   - Debug apple-direction arrow icon.
+    gradient_steps / pulse_phase / ring_step - Quantizers for the keys above.
+    cache_info       - Hit/miss/size statistics of every cache.
+    clear            - Drop every cached surface.
+"""
+
+import math
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+from game import palette
+
+GRADIENT_STEPS = 256
+PULSE_PHASES = 48
+RING_STEPS = 24
+
+# Apple idle pulse and eat ring timing, shared with SnakeGame's primitive path
+PULSE_AMPLITUDE = 0.06
+PULSE_SPEED = 2.4            # rad/s
+EAT_RING_MS = 350
+
+
+def _prepared(surface):
+    """convert_alpha() once a display exists, so later blits don't convert
+    pixel formats on the fly (no display in rgb_array mode: keep as is)."""
+    if pygame.display.get_init() and pygame.display.get_surface() is not None:
+        return surface.convert_alpha()
+    return surface
+
+
+def gradient_steps(n) -> np.ndarray:
+    """Index into the quantized gradient of every segment of an n-long snake,
+    head first."""
+    return np.rint(np.arange(n) / max(1, n - 1) * (GRADIENT_STEPS - 1)).astype(np.int64)
+
+
+def pulse_phase(ticks_ms):
+    """pygame.time.get_ticks() -> index into the quantized pulse period."""
+    period_ms = 2 * math.pi / PULSE_SPEED * 1000.0
+    return int(ticks_ms % period_ms / period_ms * PULSE_PHASES) % PULSE_PHASES
+
+
+def ring_step(elapsed_ms):
+    """Milliseconds since the apple was eaten -> ring frame, or None once over."""
+    if elapsed_ms >= EAT_RING_MS:
+        return None
+    return int(elapsed_ms / EAT_RING_MS * RING_STEPS)
+
+
+@lru_cache(maxsize=4)
+def background(cell_size, grid_width, grid_height):
+    """Full-board Surface: background fill plus the grid lines SnakeGame
+    draws at every multiple of the cell size."""
+    width_px, height_px = cell_size * grid_width, cell_size * grid_height
+    surface = pygame.Surface((width_px, height_px))
+    surface.fill(palette.BACKGROUND)
+    for x in range(0, width_px + 1, cell_size):
+        pygame.draw.line(surface, palette.GRID_LINE, (x, 0), (x, height_px))
+    for y in range(0, height_px + 1, cell_size):
+        pygame.draw.line(surface, palette.GRID_LINE, (0, y), (width_px, y))
+    if pygame.display.get_init() and pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    return surface
+
+
+@lru_cache(maxsize=2 * GRADIENT_STEPS)
+def segment_sprite(cell_size, step):
+    t = step / (GRADIENT_STEPS - 1)
+    color = pygame.Color(*palette.SNAKE_HEAD).lerp(pygame.Color(*palette.SNAKE_TAIL), t)
+    surface = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+    radius = max(2, int(cell_size * 0.25))
+    pygame.draw.rect(surface, color, surface.get_rect(), border_radius=radius)
+    return _prepared(surface)
+
+
+@lru_cache(maxsize=16)
+def eyes_sprite(cell_size, facing):
+    """facing: (dx, dy) unit direction of travel."""
+    fx, fy = facing
+    surface = pygame.Surface((cell_size, cell_size), pygame.SRCALPHA)
+    center = pygame.Vector2(cell_size / 2, cell_size / 2)
+    forward_offset = pygame.Vector2(fx, fy) * (cell_size * 0.18)
+    side_offset = pygame.Vector2(-fy, fx) * (cell_size * 0.22)
+    eye_radius = max(2, cell_size * 0.09)
+    for side in (1, -1):
+        pygame.draw.circle(surface, palette.SNAKE_EYE, center + forward_offset + side_offset * side, eye_radius)
+    return _prepared(surface)
+
+
+@lru_cache(maxsize=4 * PULSE_PHASES)
+def apple_sprite(cell_size, phase):
+    """Apple at one pulse phase, on a 2x2-cell Surface around the apple's cell
+    (the leaf reaches above the cell) -- blit it cell_size // 2 up-left of the
+    cell."""
+    pulse = 1.0 + PULSE_AMPLITUDE * math.sin(2 * math.pi * phase / PULSE_PHASES)
+    surface = pygame.Surface((2 * cell_size, 2 * cell_size), pygame.SRCALPHA)
+    center = pygame.Vector2(cell_size // 2 + cell_size / 2, cell_size // 2 + cell_size / 2)
+    radius = cell_size / 2 * 0.85 * pulse
+    pygame.draw.circle(surface, palette.APPLE, center, radius)
+    pygame.draw.circle(surface, palette.APPLE_HIGHLIGHT, center + pygame.Vector2(-radius * 0.35, -radius * 0.35), radius * 0.28)
+    leaf_points = [
+        center + pygame.Vector2(0, -radius * 0.95),
+        center + pygame.Vector2(radius * 0.35, -radius * 1.3),
+        center + pygame.Vector2(-radius * 0.05, -radius * 1.05),
+    ]
+    pygame.draw.polygon(surface, palette.APPLE_LEAF, leaf_points)
+    return _prepared(surface)
+
+
+@lru_cache(maxsize=4 * RING_STEPS)
+def eat_ring_sprite(cell_size, step):
+    """Eat ring at one step of its lifetime, on a 2x2-cell Surface centered
+    on the eaten apple's cell."""
+    t = step / RING_STEPS
+    surface_size = cell_size * 2
+    surface = pygame.Surface((surface_size, surface_size), pygame.SRCALPHA)
+    r, g, b = palette.APPLE
+    pygame.draw.circle(
+        surface, pygame.Color(r, g, b, int(255 * (1 - t))),
+        (surface_size / 2, surface_size / 2), cell_size * 0.9 * t, width=max(2, int(cell_size * 0.08)),
+    )
+    return _prepared(surface)
+
+
+@lru_cache(maxsize=128)
+def hud_surfaces(font, score):
+    """(panel, text, padding) for draw_hud(). Kept as two Surfaces blitted in
+    turn, as before, rather than one composite: blending the text into the
+    translucent panel first would change the edge pixels of the glyphs."""
+    text = font.render(f"Score: {score}", True, palette.SCORE_TEXT)
+    padding = 12
+    panel = pygame.Surface((text.get_width() + 2*padding, text.get_height() + 2*padding), pygame.SRCALPHA)
+    r, g, b = palette.SCORE_PANEL
+    pygame.draw.rect(panel, pygame.Color(r, g, b, 170), panel.get_rect(), border_radius=10)
+    return _prepared(panel), text, padding
+
+
+@lru_cache(maxsize=8)
+def fov_overlay(cell_size, radius):
+    size = cell_size * (2*radius + 1)
+    overlay = pygame.Surface((size, size), pygame.SRCALPHA)
+    overlay.fill(pygame.Color(255, 220, 90, 55))
+    pygame.draw.rect(overlay, pygame.Color(255, 220, 90, 170), overlay.get_rect(), width=3)
+    return _prepared(overlay)
+
+
+@lru_cache(maxsize=8)
+def direction_icon(dx, dy, box_size=56):
+    """Arrow icon pointing along (dx, dy) in {-1, 0, 1}^2, not both 0."""
+    direction = pygame.Vector2(dx, dy).normalize()
+    icon = pygame.Surface((box_size, box_size), pygame.SRCALPHA)
+    center = pygame.Vector2(box_size / 2, box_size / 2)
+    pygame.draw.circle(icon, pygame.Color(15, 16, 24, 180), center, box_size / 2)
+
+    arrow_len = box_size * 0.32
+    tip = center + direction * arrow_len
+    back = center - direction * arrow_len * 0.6
+    perp = pygame.Vector2(-direction.y, direction.x)
+    left = back + perp * arrow_len * 0.45
+    right = back - perp * arrow_len * 0.45
+    pygame.draw.polygon(icon, pygame.Color(255, 210, 90), [tip, left, right])
+    return _prepared(icon)
+
+
+_CACHES = (background, segment_sprite, eyes_sprite, apple_sprite, eat_ring_sprite,
+           hud_surfaces, fov_overlay, direction_icon)
+
+
+def cache_info() -> dict:
+    """{cache name: functools CacheInfo(hits, misses, maxsize, currsize)}."""
+    return {cache.__name__: cache.cache_info() for cache in _CACHES}
+
+
+def clear():
+    """Drop every cached surface (e.g. after pygame.quit(), which invalidates
+    surfaces converted for the old display)."""
+    for cache in _CACHES:
+        cache.cache_clear()
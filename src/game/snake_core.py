@@ -0,0 +1,430 @@
+"""
+snake_core.py - Array-backed Snake game state (no pygame).
+
+SnakeCore is the part of the game that actually runs every step: the body
+lives in a fixed-size ring buffer of integer cell indices, and a wall-padded
+occupancy board records what is on every cell. Moving, growing and the
+self-collision check are all constant time -- no per-segment objects are
+copied or compared, however long the snake gets.
+
+game.snake_game.SnakeGame wraps one of these and exposes the original
+object-oriented API (SnakePart/Apple views) for rendering and human play.
+
+Board cell codes match the environment's FOV encoding, so an observation is
+just a slice of the board:
+    EMPTY=0, BODY=1, APPLE=2, WALL=3.
+
+Direction (the movement enum) lives here too, so the headless environment
+and training workers never have to import pygame via game.snake_game.
+
+Free cells (every playable cell not covered by the snake) are kept in a
+dense list plus a position index, updated by swap-remove as the head and
+tail move, so placing an apple is a single uniform random pick instead of a
+scan over the whole board.
+
+Optionally (enable_state_hash()) the core also keeps a Zobrist hash of the
+whole game state -- snake and apple -- updated with a few XORs per move,
+so the environment can spot a repeated state (a policy going round in a
+loop) without comparing boards. See SnakeCore.enable_state_hash().
+"""
+
+import random
+from enum import Enum
+from typing import NamedTuple
+
+import numpy as np
+
+EMPTY = 0
+BODY = 1
+APPLE = 2
+WALL = 3
+
+# Zobrist key columns per cell: the four directions a segment can link to
+# the next segment toward the head, a pending growth's duplicate entry
+# (linked to itself), the head, and the apple.
+LINK_STAY = 4
+KEY_HEAD = 5
+KEY_APPLE = 6
+_zobrist_tables = {}           # padded board size -> keys, shared by every core of that size
+
+
+def zobrist_keys(n_cells):
+    """(n_cells, 7) random 63-bit keys as nested lists (XORing Python ints is
+    faster than going through NumPy scalars one at a time). Seeded by the
+    board size, so hashes agree across processes and cores."""
+    keys = _zobrist_tables.get(n_cells)
+    if keys is None:
+        rng = np.random.default_rng(n_cells)
+        keys = _zobrist_tables[n_cells] = rng.integers(0, 2**63, size=(n_cells, 7), dtype=np.int64).tolist()
+    return keys
+
+
+class Direction(Enum):
+    """
+    Represents the four cardinal movement directions.
+
+    Each direction stores its (dx, dy) vector as the enum value.
+    Positive x = right, positive y = down (Pygame coordinate system).
+    """
+    LEFT = (-1, 0)
+    RIGHT = (1, 0)
+    UP = (0, -1)
+    DOWN = (0, 1)
+
+    @property
+    def array(self):
+        """Return the direction as a numpy array, e.g. np.array([-1, 0]) for LEFT."""
+        return np.array(self.value)
+
+    def opposite(self):
+        """Return the opposite direction (e.g. LEFT → RIGHT).
+        Used to prevent the snake from reversing into itself."""
+        opposites = {
+            Direction.LEFT: Direction.RIGHT,
+            Direction.RIGHT: Direction.LEFT,
+            Direction.UP: Direction.DOWN,
+            Direction.DOWN: Direction.UP
+        }
+        return opposites[self]
+    
+    def left(self):
+        """Return the direction 90° counter-clockwise (e.g. UP → LEFT).
+        Useful for relative-direction observations."""
+        lefts = {
+            Direction.LEFT: Direction.DOWN,
+            Direction.RIGHT: Direction.UP,
+            Direction.UP: Direction.LEFT,
+            Direction.DOWN: Direction.RIGHT
+        }
+        return lefts[self]
+    
+    def right(self):
+        """Return the direction 90° clockwise (e.g. UP → RIGHT).
+        Useful for relative-direction observations."""
+        rights = {
+            Direction.LEFT: Direction.UP,
+            Direction.RIGHT: Direction.DOWN,
+            Direction.UP: Direction.RIGHT,
+            Direction.DOWN: Direction.LEFT
+        }
+        return rights[self]
+
+
+class CoreSnapshot(NamedTuple):
+    """Everything SnakeCore.restore() needs to put a game back: the body as
+    flat cell indices (head first, int32 -- 4 bytes a segment), the apple's
+    cell, the score and the collided flag. The board and the free-cell index
+    are derived from these, so they aren't stored."""
+    body: np.ndarray
+    apple: int
+    score: int
+    collided: bool
+
+
+class SnakeCore:
+    """
+    Grid-level Snake state: body ring buffer + occupancy board + apple + score.
+
+    Cells are addressed by their flat index into the padded board
+    (`(y + pad) * stride + (x + pad)`), so a move is a single integer add and
+    the head can step one cell past the edge -- onto the WALL padding --
+    without any special casing.
+
+    Args:
+        grid_width:  Number of playable cells horizontally.
+        grid_height: Number of playable cells vertically.
+        pad:         Width of the WALL border around the playable area. 1 is
+                     enough for the game itself (the head never gets further
+                     out than one cell); the environment passes fov_radius + 1
+                     so every FOV window is an in-bounds slice of the board.
+    """
+
+    def __init__(self, grid_width, grid_height, pad=1):
+        self._setup(grid_width, grid_height, pad)
+
+        # Spawn at the center facing right, with 3 segments: head + 2 body
+        # parts extending to the left (same layout as the original engine).
+        cx, cy = grid_width // 2, grid_height // 2
+        for x in (cx - 2, cx - 1, cx):
+            self._push_head(self.cell_index(x, cy))
+            self._cells[self.head] = BODY
+            self._remove_free(self.head)
+
+        self.apple = self.head        # Sentinel until place_apple() succeeds
+        self.place_apple()
+
+    def _setup(self, grid_width, grid_height, pad):
+        """Allocate an empty board (walls only), free-cell index and body ring."""
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.pad = pad
+        self.stride = grid_width + 2*pad
+
+        self.board = np.full((grid_height + 2*pad, self.stride), WALL, dtype=np.uint8)
+        self.board[pad:pad + grid_height, pad:pad + grid_width] = EMPTY
+        self._cells = self.board.reshape(-1)   # Flat view, shares memory with self.board
+
+        # Free-cell index: _free is a dense list of every free cell, and
+        # _free_pos[cell] is that cell's slot in it (-1 if not free) -- both
+        # add and remove are O(1) (remove swaps the last entry into the hole).
+        self._free = [int(c) for c in np.flatnonzero(self._cells == EMPTY)]
+        self._free_pos = [-1] * self._cells.size
+        for i, cell in enumerate(self._free):
+            self._free_pos[cell] = i
+
+        # One slot per playable cell, plus one for the duplicated tail entry
+        # eat_apple() adds (see there), plus one for a head that just moved
+        # onto the wall padding.
+        self.capacity = grid_width * grid_height + 2
+        self._body = [0] * self.capacity
+        self._head_ptr = 0
+        self.length = 0
+        self.score = 0
+        self.collided = False
+        self.state_hash = None         # Maintained only after enable_state_hash()
+        self._keys = None
+
+    @classmethod
+    def from_state(cls, grid_width, grid_height, body_xy, apple_xy, score=0, pad=1):
+        """
+        Rebuild a core from plain coordinates: `body_xy` is a sequence of (x, y)
+        segments, head first (a repeated last entry is a pending growth, as
+        left by eat_apple()), `apple_xy` the apple's cell. Used to hand a game
+        held in some other representation (e.g. one slot of
+        game.vector_engine.VectorSnakeEngine) to SnakeGame for rendering.
+        """
+        core = cls.__new__(cls)
+        core._setup(grid_width, grid_height, pad)
+        for x, y in reversed(list(body_xy)):
+            cell = core.cell_index(int(x), int(y))
+            core._push_head(cell)
+            if core._cells[cell] == EMPTY:
+                core._cells[cell] = BODY
+                core._remove_free(cell)
+        core.apple = core.cell_index(int(apple_xy[0]), int(apple_xy[1]))
+        if core._cells[core.apple] == EMPTY:
+            core._cells[core.apple] = APPLE
+        core.score = score
+        return core
+
+    # --- Coordinates ---------------------------------------------------------
+
+    def cell_index(self, x, y) -> int:
+        """Flat board index of grid cell (x, y)."""
+        return (y + self.pad) * self.stride + (x + self.pad)
+
+    def cell_xy(self, cell) -> tuple[int, int]:
+        """Grid coordinates (x, y) of a flat board index -- may lie outside the
+        playable area for a head that just hit the wall."""
+        y, x = divmod(cell, self.stride)
+        return x - self.pad, y - self.pad
+
+    @property
+    def head(self) -> int:
+        return self._body[self._head_ptr]
+
+    @property
+    def tail(self) -> int:
+        return self._body[(self._head_ptr - self.length + 1) % self.capacity]
+
+    @property
+    def head_xy(self) -> tuple[int, int]:
+        return self.cell_xy(self.head)
+
+    @property
+    def apple_xy(self) -> tuple[int, int]:
+        return self.cell_xy(self.apple)
+
+    def body_cells(self) -> list[int]:
+        """Flat indices of every segment, head first. O(length) -- meant for
+        rendering and snapshots, never needed by move()/eat_apple()."""
+        cap = self.capacity
+        return [self._body[(self._head_ptr - i) % cap] for i in range(self.length)]
+
+    def body_xy(self) -> np.ndarray:
+        """(length, 2) int array of segment grid coordinates, head first."""
+        cells = np.array(self.body_cells(), dtype=np.int64)
+        ys, xs = np.divmod(cells, self.stride)
+        return np.stack([xs - self.pad, ys - self.pad], axis=1)
+
+    @property
+    def free_count(self) -> int:
+        """Number of playable cells not covered by the snake."""
+        return len(self._free)
+
+    # --- Snapshots -----------------------------------------------------------
+
+    def snapshot(self) -> CoreSnapshot:
+        """Compact copy of the game state, O(length). See restore()."""
+        return CoreSnapshot(np.array(self.body_cells(), dtype=np.int32), int(self.apple), self.score, self.collided)
+
+    def restore(self, snapshot: CoreSnapshot):
+        """
+        Put the game back into a snapshot()'s state, in place and in
+        O(length of both snakes): the current snake and apple are lifted off
+        the board and the snapshot's laid down, with the free-cell index
+        updated cell by cell instead of being rebuilt. The snapshot may come
+        from another core of the same size and padding (cell indices are
+        only meaningful between those), e.g. a real game's into a search
+        copy.
+
+        The free-cell list may end up in a different order than the original
+        game's, so apples placed after a restore() are drawn from the same
+        free cells but not necessarily in the same sequence for a given
+        random seed.
+        """
+        cells = self._cells
+        # set(): a pending growth or a collided head lists a cell twice.
+        # Only BODY cells are lifted -- a head that moved onto the wall sits
+        # on a WALL cell, which stays as it is.
+        for cell in set(self.body_cells()):
+            if cells[cell] == BODY:
+                cells[cell] = EMPTY
+                self._add_free(cell)
+        # The apple's cell is in the free-cell index already (see place_apple())
+        if cells[self.apple] == APPLE:
+            cells[self.apple] = EMPTY
+
+        body = snapshot.body.tolist()
+        self._body[:len(body)] = body[::-1]
+        self._head_ptr = len(body) - 1
+        self.length = len(body)
+        for cell in body:
+            if cells[cell] == EMPTY:
+                cells[cell] = BODY
+                self._remove_free(cell)
+        self.apple = snapshot.apple
+        if cells[self.apple] == EMPTY:
+            cells[self.apple] = APPLE
+        self.score = snapshot.score
+        self.collided = snapshot.collided
+        if self._keys is not None:
+            self.state_hash = self._full_hash()
+
+    # --- State hash ----------------------------------------------------------
+
+    def enable_state_hash(self):
+        """
+        Start maintaining `state_hash`, a Zobrist hash of the game state.
+
+        Each segment contributes a key for (its cell, the direction to the
+        next segment toward the head) -- the set of those pairs pins down the
+        whole snake, order included, unlike the set of occupied cells alone --
+        plus one key for the head's cell and one for the apple's. A move
+        changes only the tail's pair, the old head's and the new head's, so
+        move()/grow()/place_apple() keep the hash current with a few XORs,
+        independent of the snake's length. The direction of travel is the
+        old head's link, so two states with equal hashes (barring a 2^-63
+        collision) play out identically under the same actions.
+        """
+        self._keys = zobrist_keys(self._cells.size)
+        stride = self.stride
+        self._links = {1: 0, stride: 1, -1: 2, -stride: 3, 0: LINK_STAY}   # cell delta -> key column
+        self.state_hash = self._full_hash()
+
+    def _full_hash(self) -> int:
+        """state_hash from scratch, O(length)."""
+        keys, links = self._keys, self._links
+        cells = self.body_cells()
+        h = keys[cells[0]][KEY_HEAD] ^ keys[self.apple][KEY_APPLE]
+        for toward_head, cell in zip(cells, cells[1:]):
+            h ^= keys[cell][links[toward_head - cell]]
+        return h
+
+    # --- Free-cell index -----------------------------------------------------
+
+    def _add_free(self, cell):
+        self._free_pos[cell] = len(self._free)
+        self._free.append(cell)
+
+    def _remove_free(self, cell):
+        i = self._free_pos[cell]
+        last = self._free.pop()
+        if last != cell:
+            self._free[i] = last
+            self._free_pos[last] = i
+        self._free_pos[cell] = -1
+
+    # --- Game logic ----------------------------------------------------------
+
+    def _push_head(self, cell):
+        self._head_ptr = (self._head_ptr + 1) % self.capacity
+        self._body[self._head_ptr] = cell
+        self.length += 1
+
+    def move(self, dx, dy) -> bool:
+        """
+        Move the snake one cell by (dx, dy). Returns True if it is still alive,
+        False if the head hit the wall or its own body.
+
+        The tail is released *before* the head's new cell is checked, so
+        moving into the cell the tail vacates this same tick is not a
+        collision -- matching the original cascade-then-check order.
+        """
+        cap = self.capacity
+        cells = self._cells
+
+        tail_ptr = (self._head_ptr - self.length + 1) % cap
+        tail = self._body[tail_ptr]
+        next_segment = self._body[(tail_ptr + 1) % cap]
+        # A duplicated tail entry (pending growth, see eat_apple()) shares its
+        # cell with the next segment, which keeps occupying it.
+        if next_segment != tail:
+            cells[tail] = EMPTY
+            self._add_free(tail)
+        self.length -= 1
+
+        old_head = self.head
+        new_head = old_head + dx + dy*self.stride
+        self._push_head(new_head)
+
+        if self._keys is not None:
+            keys = self._keys
+            self.state_hash ^= (keys[tail][self._links[next_segment - tail]]
+                                ^ keys[old_head][KEY_HEAD] ^ keys[old_head][self._links[new_head - old_head]]
+                                ^ keys[new_head][KEY_HEAD])
+
+        code = cells[new_head]
+        if code == WALL:
+            return False
+        cells[new_head] = BODY
+        if code == BODY:
+            self.collided = True
+            return False
+        self._remove_free(new_head)
+        return True
+
+    def grow(self):
+        """Add a segment on top of the current tail. It separates from the
+        tail on the next move, since the tail then stays where it is."""
+        cap = self.capacity
+        tail_ptr = (self._head_ptr - self.length + 1) % cap
+        self._body[(tail_ptr - 1) % cap] = self._body[tail_ptr]
+        self.length += 1
+        if self._keys is not None:
+            self.state_hash ^= self._keys[self._body[tail_ptr]][LINK_STAY]
+
+    def eat_apple(self) -> bool:
+        """If the head is on the apple: grow by one segment, increment the
+        score and re-place the apple. Returns True if the apple was eaten."""
+        if self.head != self.apple:
+            return False
+        self.grow()
+        self.score += 1
+        self.place_apple()
+        return True
+
+    def place_apple(self) -> bool:
+        """Place the apple uniformly at random on a free cell -- a single pick
+        from the free-cell index, O(1) regardless of board size or snake
+        length. Only ever called right after the old apple was eaten (the head
+        now covers it), so every free cell is a valid target. Returns False
+        (leaving the apple where it was) if the board is completely full."""
+        if not self._free:
+            return False
+        old_apple = self.apple
+        self.apple = self._free[random.randrange(len(self._free))]
+        self._cells[self.apple] = APPLE
+        if self._keys is not None:
+            self.state_hash ^= self._keys[old_apple][KEY_APPLE] ^ self._keys[self.apple][KEY_APPLE]
+        return True
@@ -6,8 +6,10 @@ It is independent of any AI/RL framework and can be played standalone
 by running this file directly (WASD controls).
 
 Classes:
-    Direction - Enum for movement directions with helper methods.
-    SnakeGame - Main game controller managing the snake, apple, and score.
+    Direction - Enum for movement directions with helper methods (defined in
+                game/snake_core.py so headless code can use it without pygame).
+    SnakeGame - Main game controller managing the snake, apple, and score
+                (a view over game.snake_core.SnakeCore, which holds the state).
     SnakePart  - A single segment of the snake body.
     Apple      - The food item that the snake tries to eat.
 """
@@ -37,7 +39,10 @@ from typing import Any
 from numpy.typing import NDArray
 import pygame, random, math
 import numpy as np
-from enum import Enum
+
+from game.snake_core import SnakeCore, Direction
+from game import palette, render_cache
+from game.raster import head_facing
 
 # Default grid configuration used when running this file standalone.
 # These are NOT used by the RL environment - it passes its own values.
@@ -47,117 +52,76 @@ GRID_HEIGHT = 18     # Number of cells vertically
 
 # Color palette (dark theme). Shared by the standalone game loop and by
 # snake_game_environment.py's rendering, so both look the same.
-COLOR_BACKGROUND = pygame.Color(24, 26, 38)
-COLOR_GRID_LINE = pygame.Color(32, 35, 50)
-COLOR_SNAKE_HEAD = pygame.Color(140, 235, 160)
-COLOR_SNAKE_TAIL = pygame.Color(45, 130, 90)
-COLOR_SNAKE_EYE = pygame.Color(20, 20, 30)
-COLOR_APPLE = pygame.Color(235, 87, 87)
-COLOR_APPLE_HIGHLIGHT = pygame.Color(255, 175, 175)
-COLOR_APPLE_LEAF = pygame.Color(96, 168, 96)
-COLOR_SCORE_TEXT = pygame.Color(235, 237, 245)
-COLOR_SCORE_PANEL = pygame.Color(15, 16, 24)
+# The RGB values live in game/palette.py (shared with the NumPy renderer in
+# game/raster.py).
+COLOR_BACKGROUND = pygame.Color(*palette.BACKGROUND)
+COLOR_GRID_LINE = pygame.Color(*palette.GRID_LINE)
+COLOR_SNAKE_HEAD = pygame.Color(*palette.SNAKE_HEAD)
+COLOR_SNAKE_TAIL = pygame.Color(*palette.SNAKE_TAIL)
+COLOR_SNAKE_EYE = pygame.Color(*palette.SNAKE_EYE)
+COLOR_APPLE = pygame.Color(*palette.APPLE)
+COLOR_APPLE_HIGHLIGHT = pygame.Color(*palette.APPLE_HIGHLIGHT)
+COLOR_APPLE_LEAF = pygame.Color(*palette.APPLE_LEAF)
+COLOR_SCORE_TEXT = pygame.Color(*palette.SCORE_TEXT)
+COLOR_SCORE_PANEL = pygame.Color(*palette.SCORE_PANEL)
+
+
+def hud_sprites(font, score, pos=(15, 15)):
+    """draw_hud()'s panel and text as (key, surface, topleft) sprites, the form
+    game/dirty_rects.py tracks overlays in. The text and panel only change with
+    the score, so they come from game/render_cache.py (rebuilt every call with
+    SnakeGame.use_render_cache off, as draw_hud() used to)."""
+    build = render_cache.hud_surfaces if SnakeGame.use_render_cache else render_cache.hud_surfaces.__wrapped__
+    panel, text, padding = build(font, score)
+    return [
+        (("hud_panel", score), panel, pos),
+        (("hud_text", score), text, (pos[0] + padding, pos[1] + padding)),
+    ]
 
 
 def draw_hud(surface, font, score, pos=(15, 15)):
     """Draw the score in a small rounded, semi-transparent panel."""
-    text = font.render(f"Score: {score}", True, COLOR_SCORE_TEXT)
-    padding = 12
-    panel_rect = pygame.Rect(pos[0], pos[1], text.get_width() + 2*padding, text.get_height() + 2*padding)
-
-    panel = pygame.Surface(panel_rect.size, pygame.SRCALPHA)
-    r, g, b, _ = COLOR_SCORE_PANEL
-    pygame.draw.rect(panel, pygame.Color(r, g, b, 170), panel.get_rect(), border_radius=10)
-
-    surface.blit(panel, panel_rect.topleft)
-    surface.blit(text, (panel_rect.x + padding, panel_rect.y + padding))
-
-
-class Direction(Enum):
-    """
-    Represents the four cardinal movement directions.
-
-    Each direction stores its (dx, dy) vector as the enum value.
-    Positive x = right, positive y = down (Pygame coordinate system).
-    """
-    LEFT = (-1, 0)
-    RIGHT = (1, 0)
-    UP = (0, -1)
-    DOWN = (0, 1)
-
-    @property
-    def array(self):
-        """Return the direction as a numpy array, e.g. np.array([-1, 0]) for LEFT."""
-        return np.array(self.value)
-
-    def opposite(self):
-        """Return the opposite direction (e.g. LEFT → RIGHT).
-        Used to prevent the snake from reversing into itself."""
-        opposites = {
-            Direction.LEFT: Direction.RIGHT,
-            Direction.RIGHT: Direction.LEFT,
-            Direction.UP: Direction.DOWN,
-            Direction.DOWN: Direction.UP
-        }
-        return opposites[self]
-    
-    def left(self):
-        """Return the direction 90° counter-clockwise (e.g. UP → LEFT).
-        Useful for relative-direction observations."""
-        lefts = {
-            Direction.LEFT: Direction.DOWN,
-            Direction.RIGHT: Direction.UP,
-            Direction.UP: Direction.LEFT,
-            Direction.DOWN: Direction.RIGHT
-        }
-        return lefts[self]
-    
-    def right(self):
-        """Return the direction 90° clockwise (e.g. UP → RIGHT).
-        Useful for relative-direction observations."""
-        rights = {
-            Direction.LEFT: Direction.UP,
-            Direction.RIGHT: Direction.DOWN,
-            Direction.UP: Direction.RIGHT,
-            Direction.DOWN: Direction.LEFT
-        }
-        return rights[self]
+    for _, sprite, topleft in hud_sprites(font, score, pos):
+        surface.blit(sprite, topleft)
 
 
 class SnakeGame:
     """
     Main game controller that manages the snake, apple, scoring, and game state.
 
-    The game operates on a discrete grid. Positions are stored in pixel coordinates
-    (multiples of grid_size) and also tracked as grid coordinates for collision
-    detection and observation building.
+    The actual state lives in a SnakeCore (see game/snake_core.py): a ring
+    buffer of cell indices plus an occupancy board, so moving, growing and
+    collision checks are constant time. This class keeps the original
+    object-oriented API on top of it -- `head`, `snake_list` and `apple` are
+    SnakePart/Apple views in pixel coordinates, built from the core on
+    demand for rendering and human play.
 
     Args:
         grid_size:   Pixel size of one grid cell.
         grid_width:  Number of cells in the horizontal axis.
         grid_height: Number of cells in the vertical axis.
+        pad:         Wall padding of the core's board (see SnakeCore).
+        core:        Existing SnakeCore to wrap instead of starting a fresh game.
     """
 
-    def __init__(self, grid_size, grid_width, grid_height):
+    # draw() and draw_hud() blit pre-rendered surfaces from game/render_cache.py
+    # instead of drawing every primitive on every redraw. Class-wide so the
+    # frame-time benchmark (benchmarks/render_frame.py) can switch back to the
+    # primitive path for comparison.
+    use_render_cache = True
+
+    def __init__(self, grid_size, grid_width, grid_height, pad=1, core=None):
         self.grid_size = grid_size
         self.grid_width = grid_width
         self.grid_height = grid_height
-        self.score = 0
-
-        # Initialize the snake at the center of the grid, facing right,
-        # with 3 segments: head + 2 body parts extending to the left.
-        # Divide the cell counts first, *then* scale by grid_size -- dividing
-        # the pixel total instead (grid_size*grid_width // 2) only lands back
-        # on a grid line when grid_width is even; for an odd width (e.g. 45)
-        # it lands mid-cell, permanently offsetting the snake and apple from
-        # the grid lines for that whole game.
-        pos = pygame.Vector2((grid_width // 2) * grid_size, (grid_height // 2) * grid_size)
-        self.head = SnakePart(grid_size, grid_width, grid_height, pos)
-        self.snake_list = [self.head, SnakePart(grid_size, grid_width, grid_height, pos - pygame.Vector2(self.grid_size, 0)), SnakePart(grid_size, grid_width, grid_height, pos - 2*pygame.Vector2(self.grid_size, 0))]
-
-        # Create the apple, placed on a cell not occupied by the snake
+
+        # Snake spawns at the center of the grid, facing right, with 3
+        # segments, and the apple is placed on a free cell -- both done by
+        # the core itself.
+        self.core = core if core is not None else SnakeCore(grid_width, grid_height, pad)
+
         self.apple = Apple(grid_size, grid_width, grid_height)
-        self.apple.place([part.grid_pos for part in self.snake_list])
+        self.apple.set_grid_pos(*self.core.apple_xy)
 
         # (pixel_pos, start_ticks) of the most recently eaten apple, drawn as a
         # brief expanding ring by _draw_eat_effect() -- None when no effect is
@@ -165,25 +129,47 @@ class SnakeGame:
         # immediately re-places the apple at a new position.
         self._eat_effect = None
 
+    @property
+    def score(self) -> int:
+        return self.core.score
+
+    @property
+    def length(self) -> int:
+        """Number of segments (head included). O(1), unlike len(snake_list)."""
+        return self.core.length
+
+    def _part_at(self, x, y):
+        pos = pygame.Vector2(x * self.grid_size, y * self.grid_size)
+        return SnakePart(self.grid_size, self.grid_width, self.grid_height, pos)
+
+    @property
+    def head(self):
+        """SnakePart view of the head."""
+        return self._part_at(*self.core.head_xy)
+
+    @property
+    def snake_list(self):
+        """SnakePart views of every segment, head first. O(length) -- only
+        meant for rendering; game logic goes through self.core."""
+        return [self._part_at(int(x), int(y)) for x, y in self.core.body_xy()]
+
     def get_tail_locations(self) -> list[NDArray[Any]]:
         """Return a list of grid positions for all body parts (excluding the head).
         Used by the RL environment to build the observation."""
-        return [part.grid_pos for part in self.snake_list[1:]]
+        return list(self.core.body_xy()[1:])
 
     def add_part(self):
         """Append a new segment at the tail's current position.
         The new part will separate from the tail on the next move."""
-        self.snake_list.append(SnakePart(self.grid_size, self.grid_width, self.grid_height, self.snake_list[-1].pos))
+        self.core.grow()
 
     def move_snake(self, dir: Direction) -> bool:
         """
         Move the entire snake one step in the given direction.
 
-        Movement logic:
-        1. Move the head in the specified direction.
-        2. Check for self-collision (head overlaps any body segment).
-        3. Cascade body positions: each segment takes the previous position
-           of the segment in front of it (classic snake movement).
+        The head advances one cell and the tail releases its cell in the same
+        O(1) update (see SnakeCore.move); moving into the cell the tail just
+        vacated is not a collision.
 
         Args:
             dir: The Direction to move the head.
@@ -191,33 +177,13 @@ class SnakeGame:
         Returns:
             True if the snake is still alive, False if it hit a wall or itself.
         """
-        new_pos = self.head.pos.copy()
-        alive = self.head.move(dir)
-
-        # Cascade positions: each body part takes the previous position
-        # of the part in front of it
-        for part in self.snake_list[1:]:
-            pos = part.pos.copy()
-            part.pos = new_pos.copy()
-            part.grid_pos = np.array([part.pos.x // self.grid_size, part.pos.y // self.grid_size])
-            new_pos = pos
-
-        # Check self-collision after the cascade, so moving into the cell the
-        # tail just vacated (the tail always moves away this same tick) is not
-        # incorrectly counted as a collision.
-        if self.detect_collision():
-            alive = False
-
-        return alive
+        return self.core.move(*dir.value)
 
     def detect_collision(self) -> bool:
         """Check if the snake's head overlaps with any body segment.
         Returns True if a self-collision is detected."""
-        for part in self.snake_list[1:]:
-            if np.array_equal(part.grid_pos, self.head.grid_pos):
-                return True
-        return False
-            
+        return self.core.collided
+
     def eat_apple(self) -> bool:
         """
         Check if the snake's head is on the apple.
@@ -227,29 +193,40 @@ class SnakeGame:
         Returns:
             True if the apple was eaten, False otherwise.
         """
-        if not np.array_equal(self.apple.grid_pos, self.head.grid_pos):
+        if not self.core.eat_apple():
             return False
 
-        # Remember where the apple was eaten (before it's re-placed below) so
-        # draw() can flash a brief ring there.
+        # Remember where the apple was eaten (self.apple still holds the old
+        # position until it's synced below) so draw() can flash a brief ring there.
         self._eat_effect = (self.apple.pos.copy(), pygame.time.get_ticks())
-
-        # Apple was eaten: grow snake and increment score
-        self.add_part()
-        self.score += 1
-
-        # Re-place the apple on a cell not occupied by the snake
-        self.apple.place([part.grid_pos for part in self.snake_list])
-
+        self.apple.set_grid_pos(*self.core.apple_xy)
         return True
 
+    def snapshot(self):
+        """Compact copy of the game state (a game.snake_core.CoreSnapshot: the
+        body as int32 cell indices plus apple, score and collided flag --
+        a few hundred bytes), instead of copying SnakePart/Vector2 objects."""
+        return self.core.snapshot()
+
+    def restore(self, snapshot):
+        """Put the game back into a snapshot()'s state (see SnakeCore.restore)
+        and re-sync the apple view. A running eat animation is dropped."""
+        self.core.restore(snapshot)
+        self.apple.set_grid_pos(*self.core.apple_xy)
+        self._eat_effect = None
+
     def draw(self, screen):
         """Render the grid, all snake segments (head to tail gradient + eyes),
         and the apple onto the given Pygame surface."""
+        if self.use_render_cache:
+            self._draw_cached(screen)
+            return
+
         self._draw_grid(screen)
 
-        n = len(self.snake_list)
-        for i, part in enumerate(self.snake_list):
+        snake_list = self.snake_list
+        n = len(snake_list)
+        for i, part in enumerate(snake_list):
             t = i / max(1, n - 1)   # 0 at head, 1 at tail
             color = COLOR_SNAKE_HEAD.lerp(COLOR_SNAKE_TAIL, t)
             part.draw(screen, color)
@@ -258,6 +235,53 @@ class SnakeGame:
         self.apple.draw(screen)
         self._draw_eat_effect(screen)
 
+    def _draw_cached(self, screen):
+        """draw() from cached sprites: the background with its grid lines is one
+        blit, and every segment, the eyes, the apple (at the current pulse
+        phase) and the eat ring are blits of Surfaces built once per cell size.
+        Works off the core's body array directly instead of building a
+        SnakePart per segment."""
+        gs = self.grid_size
+        screen.blit(render_cache.background(gs, self.grid_width, self.grid_height), (0, 0))
+
+        body = self.core.body_xy()
+        n = len(body)
+        steps = render_cache.gradient_steps(n).tolist()
+        screen.blits([
+            (render_cache.segment_sprite(gs, step), (x * gs, y * gs))
+            for step, (x, y) in zip(steps, body.tolist())
+        ], doreturn=False)
+
+        if n:
+            hx, hy = body[0]
+            screen.blit(render_cache.eyes_sprite(gs, head_facing(body)), (int(hx) * gs, int(hy) * gs))
+
+        for _, sprite, topleft in self.animation_sprites(pygame.time.get_ticks()):
+            screen.blit(sprite, topleft)
+
+    def animation_sprites(self, ticks) -> list:
+        """
+        The apple at its current pulse phase and, while it lasts, the eat ring,
+        as (key, surface, topleft) sprites drawn over the snake. Clears the eat
+        effect once it has run its course.
+
+        Args:
+            ticks: pygame.time.get_ticks() of the frame being drawn.
+        """
+        gs = self.grid_size
+        ax, ay = self.core.apple_xy
+        phase = render_cache.pulse_phase(ticks)
+        sprites = [(("apple", phase), render_cache.apple_sprite(gs, phase), (ax * gs - gs // 2, ay * gs - gs // 2))]
+
+        if self._eat_effect is not None:
+            pos, start_ticks = self._eat_effect
+            step = render_cache.ring_step(ticks - start_ticks)
+            if step is None:
+                self._eat_effect = None
+            else:
+                sprites.append((("eat_ring", step), render_cache.eat_ring_sprite(gs, step), (int(pos.x - gs / 2), int(pos.y - gs / 2))))
+        return sprites
+
     def _draw_eat_effect(self, screen):
         """Draw a brief expanding, fading ring where the apple was just eaten
         (Google-Snake-style feedback). No-ops once the effect's duration has
@@ -266,7 +290,7 @@ class SnakeGame:
             return
 
         pos, start_ticks = self._eat_effect
-        duration_ms = 350
+        duration_ms = render_cache.EAT_RING_MS
         elapsed = pygame.time.get_ticks() - start_ticks
         if elapsed >= duration_ms:
             self._eat_effect = None
@@ -299,10 +323,11 @@ class SnakeGame:
         """Draw two eyes on the head, facing the direction of travel. The facing
         direction is inferred from the head's position relative to the first
         body segment, so no separate direction state is needed here."""
-        if len(self.snake_list) > 1:
-            facing = self.head.pos - self.snake_list[1].pos
+        body = self.core.body_xy()
+        if len(body) > 1:
+            facing = pygame.Vector2(*(body[0] - body[1]))
         else:
-            facing = pygame.Vector2(self.grid_size, 0)
+            facing = pygame.Vector2(1, 0)
         facing = facing.normalize() if facing.length() > 0 else pygame.Vector2(1, 0)
         perp = pygame.Vector2(-facing.y, facing.x)
 
@@ -396,6 +421,12 @@ class Apple:
         self.grid_pos = np.array([-1, -1])       # Sentinel until place() is called
         self.pos = pygame.Vector2(-1, -1)
 
+    def set_grid_pos(self, gx, gy):
+        """Move the apple to grid cell (gx, gy) -- used by SnakeGame to mirror
+        the position its SnakeCore placed the apple at."""
+        self.grid_pos = np.array([gx, gy])
+        self.pos = pygame.Vector2(gx * self.grid_size, gy * self.grid_size)
+
     def place(self, occupied_cells) -> bool:
         """
         Randomly place the apple on a free grid cell.
@@ -418,16 +449,14 @@ class Apple:
         if not free_cells:
             return False  # Grid is completely filled by the snake
 
-        gx, gy = random.choice(free_cells)
-        self.grid_pos = np.array([gx, gy])
-        self.pos = pygame.Vector2(gx * self.grid_size, gy * self.grid_size)
+        self.set_grid_pos(*random.choice(free_cells))
         return True
 
     def draw(self, screen):
         """Draw the apple as a circle with a highlight and a small leaf.
         A slow, subtle radius pulse (idle "shimmer") keeps a static apple
         from reading as a flat, lifeless sprite while it waits to be eaten."""
-        pulse = 1.0 + 0.06 * math.sin(pygame.time.get_ticks() / 1000.0 * 2.4)
+        pulse = 1.0 + render_cache.PULSE_AMPLITUDE * math.sin(pygame.time.get_ticks() / 1000.0 * render_cache.PULSE_SPEED)
         center = self.pos + pygame.Vector2(self.grid_size / 2, self.grid_size / 2)
         radius = self.grid_size / 2 * 0.85 * pulse
         pygame.draw.circle(screen, COLOR_APPLE, center, radius)
@@ -0,0 +1,357 @@
+"""
+vector_engine.py - N Snake games advanced in lockstep with NumPy (no pygame).
+
+VectorSnakeEngine holds every game's state in stacked arrays -- one padded
+occupancy board, body ring buffer and free-cell index per game, exactly the
+layout of game.snake_core.SnakeCore -- so one step() call moves, checks,
+feeds and rewards all N snakes with a handful of array operations instead of
+N Python game objects. It is what rl.vec_env.SnakeVecEnv exposes to SB3.
+
+Game rules, reward shaping and observations are the same as
+game.environment.SnakeGameEnvironment (observations are built by the shared
+helpers in game/observations.py, so they are bit-identical); only the random
+apple sequence differs, since apples are drawn from the engine's own
+np.random.Generator instead of the global `random` module.
+
+With detect_cycles every game also carries SnakeCore's Zobrist state hash
+(same keys, so the same value for the same state), updated with array
+XORs. A per-game set of seen hashes doesn't vectorize, so repeats are
+found with Brent's algorithm instead: each game remembers the state it was
+in when its steps-since-apple count last hit a power of two and compares
+every later state against it. That is O(1) memory and two array
+operations a step, and still catches every loop -- at most about twice
+the loop's length (or its lead-in) after it starts, rather than on the
+first repeat as SnakeGameEnvironment does.
+
+Classes:
+    VectorSnakeEngine - Batched game state + step/reset/observe.
+"""
+
+import numpy as np
+
+from game.snake_core import EMPTY, BODY, APPLE, WALL, LINK_STAY, KEY_HEAD, KEY_APPLE, zobrist_keys
+from game.observations import (
+    fov_offsets, fov_window, window_with_apple, apple_direction,
+    encode_observation, observation_space,
+)
+
+# Action index -> (dx, dy), same mapping as SnakeGameEnvironment.action_to_direction
+# (0=RIGHT, 1=DOWN, 2=LEFT, 3=UP; the opposite of action a is (a + 2) % 4).
+ACTION_DX = np.array([1, 0, -1, 0], dtype=np.int64)
+ACTION_DY = np.array([0, 1, 0, -1], dtype=np.int64)
+
+# step() reports the death cause as a small integer per game; index into this
+# tuple for the value SnakeGameEnvironment puts into info["death_cause"].
+DEATH_CAUSES = (None, "timeout", "collision", "cycle")
+_TIMEOUT = 1
+_COLLISION = 2
+_CYCLE = 3
+
+
+class VectorSnakeEngine:
+    """
+    `num_envs` independent Snake games stepped together.
+
+    Cells are flat indices into each game's padded board (see SnakeCore);
+    the padding is fov_radius + 1 wide so every FOV window -- even around a
+    head that just moved onto the wall -- is an in-bounds gather.
+
+    Args:
+        num_envs:         Number of games.
+        grid_width/height: Grid dimensions in cells.
+        snake_fov_radius: FOV radius around the head.
+        obs_mode:         "flat" or "grid", as in SnakeGameEnvironment.
+        obs_encoding:     "standard", "compact" or "packed", as in SnakeGameEnvironment.
+        training:         If True, apply the training reward shaping
+                          (timeout cutoff and penalties).
+        seed:             Seed for the apple placement generator.
+        detect_cycles:    End a game (truncated, death cause "cycle") once it
+                          repeats a state since its last apple, as in
+                          SnakeGameEnvironment (see the module docstring).
+    """
+
+    def __init__(self, num_envs, grid_width, grid_height, snake_fov_radius=1, obs_mode="flat", training=True, seed=None, obs_encoding="standard", detect_cycles=False):
+        assert obs_mode in ("flat", "grid")
+        self.num_envs = num_envs
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        self.snake_fov_radius = snake_fov_radius
+        self.obs_mode = obs_mode
+        self.obs_encoding = obs_encoding
+        self.training = training
+        self.observation_space = observation_space(obs_mode, snake_fov_radius, obs_encoding)
+
+        self.pad = snake_fov_radius + 1
+        self.stride = grid_width + 2*self.pad
+        board = np.full((grid_height + 2*self.pad, self.stride), WALL, dtype=np.uint8)
+        board[self.pad:self.pad + grid_height, self.pad:self.pad + grid_width] = EMPTY
+        self._empty_board = board.reshape(-1)
+        self._playable = np.flatnonzero(self._empty_board == EMPTY)
+        n_cells = self._empty_board.size
+        n_playable = grid_width * grid_height
+
+        # Same capacity reasoning as SnakeCore._setup()
+        self.capacity = n_playable + 2
+        # Max steps before timeout = 2/3 of total grid cells
+        self.max_steps = 2/3 * n_playable
+
+        self.cells = np.empty((num_envs, n_cells), dtype=np.uint8)
+        self.body = np.zeros((num_envs, self.capacity), dtype=np.int64)
+        self.head_ptr = np.zeros(num_envs, dtype=np.int64)
+        self.length = np.zeros(num_envs, dtype=np.int64)
+        self.free = np.empty((num_envs, n_playable), dtype=np.int64)
+        self.free_pos = np.full((num_envs, n_cells), -1, dtype=np.int64)
+        self.free_count = np.zeros(num_envs, dtype=np.int64)
+        self.apple = np.zeros(num_envs, dtype=np.int64)
+        self.score = np.zeros(num_envs, dtype=np.int64)
+        self.steps = np.zeros(num_envs, dtype=np.int64)   # Steps since last apple
+        self.dir = np.zeros(num_envs, dtype=np.int64)     # Current action index
+
+        # Starting snake (tail first, head last): 3 segments at the center
+        # facing right, as in SnakeCore
+        cx, cy = grid_width // 2, grid_height // 2
+        self.start_body = np.array([(cy + self.pad) * self.stride + (x + self.pad) for x in (cx - 2, cx - 1, cx)], dtype=np.int64)
+
+        self._offsets = fov_offsets(snake_fov_radius, self.stride)
+        self._all = np.arange(num_envs)
+        self.rng = np.random.default_rng(seed)
+
+        self.detect_cycles = detect_cycles
+        if detect_cycles:
+            # Link columns are in action order (RIGHT, DOWN, LEFT, UP), so a
+            # move's link is its action index; _link_of[delta + stride] for
+            # a tail entry's cell delta to the next segment.
+            self._keys = np.array(zobrist_keys(n_cells), dtype=np.int64)
+            self._link_of = np.zeros(2*self.stride + 1, dtype=np.int64)
+            for column, delta in enumerate((1, self.stride, -1, -self.stride, 0)):
+                self._link_of[delta + self.stride] = column
+            self.state_hash = np.zeros(num_envs, dtype=np.int64)
+            self._brent_hash = np.zeros(num_envs, dtype=np.int64)   # state at the last power-of-two step
+
+    def seed(self, seed):
+        """Re-seed the apple placement generator."""
+        self.rng = np.random.default_rng(seed)
+
+    # --- Coordinates ---------------------------------------------------------
+
+    def cell_xy(self, cells) -> np.ndarray:
+        """(..., 2) grid coordinates of flat board indices."""
+        ys, xs = np.divmod(np.asarray(cells), self.stride)
+        return np.stack([xs - self.pad, ys - self.pad], axis=-1)
+
+    def heads(self, idx=None) -> np.ndarray:
+        idx = self._all if idx is None else idx
+        return self.body[idx, self.head_ptr[idx]]
+
+    def body_counts(self, idx=None) -> np.ndarray:
+        """Cells each snake occupies: its length, minus one while a growth
+        is pending (the duplicated tail entry, see SnakeCore.grow())."""
+        idx = self._all if idx is None else idx
+        tail_ptr = (self.head_ptr[idx] - self.length[idx] + 1) % self.capacity
+        pending = self.body[idx, tail_ptr] == self.body[idx, (tail_ptr + 1) % self.capacity]
+        return self.length[idx] - pending
+
+    def body_xy(self, i) -> np.ndarray:
+        """(length, 2) segment coordinates of game `i`, head first (a
+        repeated last entry is a pending growth, as in SnakeCore)."""
+        ptrs = (self.head_ptr[i] - np.arange(self.length[i])) % self.capacity
+        return self.cell_xy(self.body[i, ptrs])
+
+    # --- Free-cell index -----------------------------------------------------
+    # Batched versions of SnakeCore._add_free/_remove_free: `idx` are distinct
+    # game indices, `cells` one cell per game.
+
+    def _add_free(self, idx, cells):
+        slot = self.free_count[idx]
+        self.free[idx, slot] = cells
+        self.free_pos[idx, cells] = slot
+        self.free_count[idx] += 1
+
+    def _remove_free(self, idx, cells):
+        slot = self.free_pos[idx, cells]
+        last = self.free[idx, self.free_count[idx] - 1]
+        self.free[idx, slot] = last
+        self.free_pos[idx, last] = slot
+        self.free_pos[idx, cells] = -1   # After the swap, in case last == cells
+        self.free_count[idx] -= 1
+
+    def _place_apple(self, idx):
+        """One uniform pick from each game's free-cell index. Games with a
+        completely full board keep their apple where it was."""
+        idx = idx[self.free_count[idx] > 0]
+        if len(idx) == 0:
+            return
+        pick = (self.rng.random(len(idx)) * self.free_count[idx]).astype(np.int64)
+        if self.detect_cycles:
+            self.state_hash[idx] ^= self._keys[self.apple[idx], KEY_APPLE]
+        self.apple[idx] = self.free[idx, pick]
+        self.cells[idx, self.apple[idx]] = APPLE
+        if self.detect_cycles:
+            self.state_hash[idx] ^= self._keys[self.apple[idx], KEY_APPLE]
+
+    # --- Game logic ----------------------------------------------------------
+
+    def reset(self, idx=None):
+        """Start fresh games in slots `idx` (all if None): 3 segments at the
+        center facing right, new apple -- the same layout as SnakeCore."""
+        idx = self._all if idx is None else np.asarray(idx)
+        if len(idx) == 0:
+            return
+        self.cells[idx] = self._empty_board
+        self.free[idx] = self._playable
+        self.free_pos[idx] = -1
+        self.free_pos[idx[:, None], self._playable[None, :]] = np.arange(len(self._playable))
+        self.free_count[idx] = len(self._playable)
+
+        for i, cell in enumerate(self.start_body):
+            self.body[idx, i] = cell
+            self.cells[idx, cell] = BODY
+            self._remove_free(idx, np.full(len(idx), cell))
+        self.head_ptr[idx] = 2
+        self.length[idx] = 3
+
+        self.score[idx] = 0
+        self.steps[idx] = 0
+        self.dir[idx] = 0              # Always start facing right
+        if self.detect_cycles:
+            # The starting snake (head, then two segments each linked RIGHT to
+            # the next), with the apple sentinel on the head's cell that
+            # _place_apple() swaps out, as in SnakeCore.__init__()
+            start = self.body[idx[0], :3]
+            keys = self._keys
+            self.state_hash[idx] = (keys[start[0], 0] ^ keys[start[1], 0] ^ keys[start[2], KEY_HEAD]
+                                    ^ keys[start[2], KEY_APPLE])
+            self.apple[idx] = start[2]
+        self._place_apple(idx)
+        if self.detect_cycles:
+            self._brent_hash[idx] = self.state_hash[idx]
+
+    def step(self, actions):
+        """
+        Advance every game by one step. Same rules and reward shaping as
+        SnakeGameEnvironment.step() (see there), evaluated for all games at
+        once. Finished games are NOT reset here -- the caller decides when.
+
+        Returns: (rewards float32, terminated bool, truncated bool,
+                  death_cause int8 index into DEATH_CAUSES), each (num_envs,).
+        """
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        # Prevent 180° reversal (would cause instant self-collision)
+        self.dir = np.where(actions == (self.dir + 2) % 4, self.dir, actions)
+
+        cap = self.capacity
+        games = self._all
+        snake_length = self.length.copy()
+
+        # Release the tail (before the head is checked, see SnakeCore.move());
+        # a duplicated tail entry is a pending growth and keeps its cell.
+        tail_ptr = (self.head_ptr - self.length + 1) % cap
+        tail = self.body[games, tail_ptr]
+        next_segment = self.body[games, (tail_ptr + 1) % cap]
+        release = next_segment != tail
+        rel = games[release]
+        self.cells[rel, tail[release]] = EMPTY
+        self._add_free(rel, tail[release])
+
+        old_head = self.body[games, self.head_ptr]
+        new_head = old_head + ACTION_DX[self.dir] + ACTION_DY[self.dir]*self.stride
+        self.head_ptr = (self.head_ptr + 1) % cap
+        self.body[games, self.head_ptr] = new_head
+
+        if self.detect_cycles:
+            # Same XORs as SnakeCore.move()
+            keys = self._keys
+            self.state_hash ^= (keys[tail, self._link_of[next_segment - tail + self.stride]]
+                                ^ keys[old_head, KEY_HEAD] ^ keys[old_head, self.dir] ^ keys[new_head, KEY_HEAD])
+
+        code = self.cells[games, new_head]
+        on_board = code != WALL
+        alive = on_board & (code != BODY)
+        self.cells[games[on_board], new_head[on_board]] = BODY
+        self._remove_free(games[alive], new_head[alive])
+
+        # Eat: grow by duplicating the tail entry (see SnakeCore.grow()).
+        ate = alive & (new_head == self.apple)
+        eat = games[ate]
+        tail_ptr = (self.head_ptr[eat] - self.length[eat] + 1) % cap
+        self.body[eat, (tail_ptr - 1) % cap] = self.body[eat, tail_ptr]
+        self.length[eat] += 1
+        if self.detect_cycles:
+            self.state_hash[eat] ^= self._keys[self.body[eat, tail_ptr], LINK_STAY]
+        self.score[eat] += 1
+        self._place_apple(eat)
+
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        death_cause = np.zeros(self.num_envs, dtype=np.int8)
+        self.steps += 1
+
+        rewards[ate] = 1
+        self.steps[ate] = 0            # Reset after eating
+        if self.training:
+            timeout = ~ate & (self.steps >= self.max_steps)
+            truncated |= timeout       # Anti-loop cutoff, not a real game-over
+            death_cause[timeout] = _TIMEOUT
+            rewards[timeout] = -0.5    # Anti-loop penalty
+        if self.detect_cycles:
+            # Brent: compare with the state saved at the last power-of-two
+            # step since the apple (step 0 is the apple itself), then move
+            # the saved state up whenever another power of two is reached
+            cycle = ~ate & alive & (self.state_hash == self._brent_hash) & (death_cause == 0)
+            truncated |= cycle
+            death_cause[cycle] = _CYCLE
+            if self.training:
+                rewards[cycle] = -0.5  # Same anti-loop penalty as the timeout
+            save = (self.steps & (self.steps - 1)) == 0
+            self._brent_hash[save] = self.state_hash[save]
+
+        terminated = ~alive
+        death_cause[terminated] = _COLLISION
+        if self.training:
+            # Death penalty scaled by snake length (min -1, max -20)
+            rewards[terminated] = -np.minimum(20, np.maximum(1, (snake_length[terminated] - 3) * 0.5))
+
+        return rewards, terminated, truncated, death_cause
+
+    # --- Observations --------------------------------------------------------
+
+    def observe(self, idx=None):
+        """Observations of games `idx` (all if None), stacked along axis 0 --
+        an array for "flat", a dict of arrays for "grid"."""
+        idx = self._all if idx is None else np.asarray(idx)
+        heads = self.heads(idx)
+        apples = self.apple[idx]
+        window = fov_window(self.cells[idx], heads, self._offsets)
+        window = window_with_apple(window, heads, apples, self._offsets)
+        apple_dir = apple_direction(self.cell_xy(heads), self.cell_xy(apples))
+        return encode_observation(window, apple_dir, self.snake_fov_radius, self.obs_mode, self.obs_encoding)
+
+    def observe_states(self, heads, apples, segments, n_segments):
+        """
+        Observations of B arbitrary game states on this engine's board --
+        bit-identical to what observe() returns for a game in that state.
+        Used to regenerate replay buffer observations from the compact
+        per-step states rl.replay_buffer.TrajectoryReplayBuffer stores.
+
+        Args:
+            heads:      (B,) head cells (may be a wall cell, as after a collision).
+            apples:     (B,) apple cells.
+            segments:   (B, K) cells of the rest of each body; only the first
+                        n_segments[b] entries of row b are used.
+            n_segments: (B,) number of body cells besides the head.
+        """
+        heads, apples = np.asarray(heads), np.asarray(apples)
+        n = len(heads)
+        n_cells = self._empty_board.size
+        base = np.arange(n)[:, None] * n_cells
+        boards = np.tile(self._empty_board, n)
+
+        used = np.arange(segments.shape[1])[None, :] < np.asarray(n_segments)[:, None]
+        body = np.concatenate([(segments + base)[used], heads + base[:, 0]])
+        # A head that hit the wall leaves the wall cell as it is, like step()
+        boards[body] = np.where(boards[body] == WALL, WALL, BODY)
+        boards[apples + base[:, 0]] = APPLE
+
+        window = boards[(heads + base[:, 0])[:, None] + self._offsets]
+        apple_dir = apple_direction(self.cell_xy(heads), self.cell_xy(apples))
+        return encode_observation(window, apple_dir, self.snake_fov_radius, self.obs_mode, self.obs_encoding)
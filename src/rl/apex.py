@@ -0,0 +1,323 @@
+"""
+rl/apex.py - DQN with separate actor processes (Ape-X style).
+
+SB3's DQN takes turns: step every env once, store the transitions, every
+train_freq steps run gradient_steps updates -- and while it updates, no env
+moves; while the envs step, nothing learns. ApexDQN moves the env stepping
+into `n_actors` actor processes that run continuously:
+    - each actor plays its own SnakeVecEnv (the in-process vector engine,
+      game/vector_engine.py) with a copy of the Q-network, epsilon-greedy
+      with its own fixed epsilon (Ape-X's eps_i = 0.4^(1 + 7 i / (N - 1)),
+      so some actors explore a lot and others hardly at all),
+    - every `chunk` steps it sends the transitions to the learner,
+    - every `sync_every` steps it refreshes its network from the learner's
+      latest weights, which the learner publishes into one shared-memory
+      array after every round of updates (a version counter around the copy
+      lets an actor detect a torn read and retry later).
+The learner (this process) adds whatever has arrived to the one replay
+buffer and trains, then goes back for more -- the actors keep playing in
+the meantime. Each actor step delivered counts as one of DQN's env steps
+(n_envs = the actor's game count), so num_timesteps, the callbacks
+(EvalCallback, PeriodicCheckpoint, DeathLogger...), the target network
+updates and tensorboard's rollout/* scalars behave as with a plain DQN --
+except for the exploration rate, as no actor follows DQN's schedule:
+rollout/exploration_rate is the actors' mean epsilon, and
+rollout/actor_epsilon/<i> each actor's own. The model's exploration_rate
+(what predict(deterministic=False) and the .npz export explore with) stays
+at exploration_final_eps, where a plain DQN's ends up.
+Updates keep DQN's replay ratio: gradient_steps per train_freq steps
+delivered, however many steps arrived at once.
+
+The saved zip is an ordinary DQN checkpoint (the actor settings and runtime
+state aren't saved): DQN.load() reads it, and ApexDQN.load() continues it.
+
+Classes:
+    ApexDQN - DQN fed by actor processes.
+"""
+
+import multiprocessing as mp
+import queue as queue_module
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import torch
+from stable_baselines3 import DQN
+from stable_baselines3.common.type_aliases import RolloutReturn
+from torch.nn.utils import parameters_to_vector, vector_to_parameters
+
+from rl.vec_env import SnakeVecEnv
+
+# What a transition's info keeps on the way to the learner -- what the
+# replay buffer, DeathLogger and the episode statistics read
+_INFO_KEYS = ("death_cause", "TimeLimit.truncated", "episode", "snake_length")
+
+
+def _stack(items):
+    if isinstance(items[0], dict):
+        return {key: np.stack([item[key] for item in items]) for key in items[0]}
+    return np.stack(items)
+
+
+def _index(batch, t):
+    if isinstance(batch, dict):
+        return {key: value[t] for key, value in batch.items()}
+    return batch[t]
+
+
+def _pull_weights(flat, version, policy, local_version):
+    """Copy the learner's latest weights into `policy` if they changed.
+    Returns the version now loaded."""
+    current = version.value
+    if current == local_version or current % 2:
+        return local_version          # Unchanged, or being written right now
+    weights = torch.from_numpy(flat.copy())
+    if version.value != current:
+        return local_version          # Overwritten while copying -- next time
+    vector_to_parameters(weights, policy.q_net.parameters())
+    return current
+
+
+def _actor(index, epsilon, n_envs, env_kwargs, policy_class, policy_kwargs, weights_name, version, transitions, stop,
+           chunk, sync_every, seed):
+    """Actor process: play, send transitions in chunks, refresh the network."""
+    torch.set_num_threads(1)
+    env = SnakeVecEnv(n_envs, seed=seed, **env_kwargs)
+    policy = policy_class(**policy_kwargs)
+    policy.set_training_mode(False)
+    weights = shared_memory.SharedMemory(name=weights_name)
+    flat = np.ndarray((sum(p.numel() for p in policy.q_net.parameters()),), dtype=np.float32, buffer=weights.buf)
+    rng = np.random.default_rng(seed)
+    local_version = -1
+    obs = env.reset()
+    steps = []
+    try:
+        step = 0
+        while not stop.is_set():
+            if step % sync_every == 0:
+                local_version = _pull_weights(flat, version, policy, local_version)
+            step += 1
+            actions, _ = policy.predict(obs, deterministic=True)
+            explore = rng.random(n_envs) < epsilon
+            actions[explore] = rng.integers(0, env.action_space.n, size=int(explore.sum()))
+            new_obs, rewards, dones, infos = env.step(actions)
+
+            # What SB3's _store_transition() stores as next_obs: the final
+            # observation for games that just ended (new_obs already shows
+            # the next game's start there)
+            next_obs = {key: value.copy() for key, value in new_obs.items()} if isinstance(new_obs, dict) else new_obs.copy()
+            sent_infos = []
+            for i, done in enumerate(dones):
+                if done:
+                    if isinstance(next_obs, dict):
+                        for key in next_obs:
+                            next_obs[key][i] = infos[i]["terminal_observation"][key]
+                    else:
+                        next_obs[i] = infos[i]["terminal_observation"]
+                    sent_infos.append({key: infos[i][key] for key in _INFO_KEYS if key in infos[i]})
+                else:
+                    sent_infos.append({})
+            steps.append((obs, next_obs, actions, rewards, dones, sent_infos))
+            obs = new_obs
+
+            if len(steps) == chunk:
+                batch = (_stack([s[0] for s in steps]), _stack([s[1] for s in steps]), np.stack([s[2] for s in steps]),
+                         np.stack([s[3] for s in steps]), np.stack([s[4] for s in steps]), [s[5] for s in steps])
+                steps = []
+                # Blocks while the learner is behind, so actors can't run
+                # arbitrarily far ahead of it -- but keeps checking `stop`
+                while not stop.is_set():
+                    try:
+                        transitions.put(batch, timeout=0.1)
+                        break
+                    except queue_module.Full:
+                        pass
+    finally:
+        weights.close()
+        env.close()
+
+
+class ApexDQN(DQN):
+    """
+    DQN(...) plus:
+        n_actors:         Actor processes.
+        actor_env_kwargs: SnakeVecEnv keyword arguments for the actors' games
+                          (grid_size, grid_width, ...); each actor plays as many
+                          games as the env passed to the model has.
+        chunk:            Actor steps per message to the learner.
+        sync_every:       Actor steps between weight refreshes.
+        start_method:     multiprocessing start method for the actors
+                          ("forkserver" where available, else "spawn").
+    """
+
+    def __init__(self, *args, n_actors=2, actor_env_kwargs=None, chunk=16, sync_every=16, start_method=None, **kwargs):
+        self.n_actors = n_actors
+        self.actor_env_kwargs = actor_env_kwargs
+        self.chunk = chunk
+        self.sync_every = sync_every
+        self.start_method = start_method
+        self._actors = None
+        self._gradient_credit = 0.0
+        self._rollout_steps = 0
+        super().__init__(*args, **kwargs)
+        self.exploration_rate = self.exploration_final_eps
+
+    @property
+    def actor_epsilons(self):
+        if self.n_actors == 1:
+            return [0.4]
+        return [0.4 ** (1 + 7 * i / (self.n_actors - 1)) for i in range(self.n_actors)]
+
+    def _excluded_save_params(self):
+        # Actor settings and handles aren't part of the model -- keeps the zip
+        # a plain DQN checkpoint
+        return super()._excluded_save_params() + [
+            "n_actors", "actor_env_kwargs", "chunk", "sync_every", "start_method", "_actors",
+            "_gradient_credit", "_rollout_steps",
+        ]
+
+    # --- Actors ---------------------------------------------------------------
+
+    def _publish_weights(self):
+        flat, version = self._actors["flat"], self._actors["version"]
+        version.value += 1             # Odd: being written
+        flat[:] = parameters_to_vector(self.q_net.parameters()).detach().numpy()
+        version.value += 1
+
+    def _start_actors(self):
+        start_method = self.start_method
+        if start_method is None:
+            start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(start_method)
+        n_params = sum(p.numel() for p in self.q_net.parameters())
+        weights = shared_memory.SharedMemory(create=True, size=n_params * 4)
+        self._actors = {
+            "weights": weights,
+            "flat": np.ndarray((n_params,), dtype=np.float32, buffer=weights.buf),
+            "version": ctx.RawValue("l", 0),
+            "transitions": ctx.Queue(maxsize=4 * self.n_actors),
+            "stop": ctx.Event(),
+            "processes": [],
+        }
+        self._publish_weights()
+        seed = np.random.SeedSequence().entropy
+        for index, epsilon in enumerate(self.actor_epsilons):
+            process = ctx.Process(
+                target=_actor, name=f"apex-actor-{index}", daemon=True,
+                args=(index, epsilon, self.n_envs, self.actor_env_kwargs, type(self.policy),
+                      self.policy._get_constructor_parameters(), weights.name, self._actors["version"],
+                      self._actors["transitions"], self._actors["stop"], self.chunk, self.sync_every,
+                      (seed + index) % 2**32),
+            )
+            process.start()
+            self._actors["processes"].append(process)
+        if self.verbose >= 1:
+            print(f"Started {self.n_actors} actor(s) x {self.n_envs} games, epsilon "
+                  + ", ".join(f"{epsilon:.3f}" for epsilon in self.actor_epsilons))
+
+    def _stop_actors(self):
+        if self._actors is None:
+            return
+        actors, self._actors = self._actors, None
+        actors["stop"].set()
+        # Keep draining, so no actor stays blocked on a full queue
+        deadline = time.monotonic() + 5
+        while any(process.is_alive() for process in actors["processes"]) and time.monotonic() < deadline:
+            try:
+                actors["transitions"].get(timeout=0.1)
+            except queue_module.Empty:
+                pass
+        for process in actors["processes"]:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        actors["transitions"].cancel_join_thread()
+        actors["weights"].close()
+        actors["weights"].unlink()
+
+    def learn(self, *args, **kwargs):
+        self._start_actors()
+        try:
+            return super().learn(*args, **kwargs)
+        finally:
+            self._stop_actors()
+
+    # --- Learner --------------------------------------------------------------
+
+    def _on_step(self) -> None:
+        # DQN's: the target network updates, and the exploration schedule --
+        # which describes none of the actors, so its value is replaced (see
+        # the module docstring)
+        super()._on_step()
+        self.exploration_rate = self.exploration_final_eps
+        epsilons = self.actor_epsilons
+        self.logger.record("rollout/exploration_rate", float(np.mean(epsilons)))
+        for index, epsilon in enumerate(epsilons):
+            self.logger.record(f"rollout/actor_epsilon/{index}", epsilon)
+
+    def collect_rollouts(self, env, callback, train_freq, replay_buffer, action_noise=None, learning_starts=0,
+                         log_interval=None):
+        """
+        The learn() loop's collection step: wait for at least one chunk from
+        the actors, then take every chunk already waiting, and handle each
+        actor step as DQN.collect_rollouts() handles an env step.
+        """
+        self.policy.set_training_mode(False)
+        transitions = self._actors["transitions"]
+        batches = []
+        while not batches:
+            try:
+                batches.append(transitions.get(timeout=1.0))
+            except queue_module.Empty:
+                if not any(process.is_alive() for process in self._actors["processes"]):
+                    raise RuntimeError("All actor processes died")
+        while len(batches) < self.n_actors * 4:
+            try:
+                batches.append(transitions.get_nowait())
+            except queue_module.Empty:
+                break
+
+        callback.on_rollout_start()
+        num_collected_steps, num_collected_episodes = 0, 0
+        continue_training = True
+        for obs_chunk, next_obs_chunk, actions_chunk, rewards_chunk, dones_chunk, infos_chunk in batches:
+            for t in range(len(dones_chunk)):
+                if self.num_timesteps >= self._total_timesteps:
+                    break
+                # Same names as in DQN.collect_rollouts(), for callbacks reading self.locals
+                new_obs, rewards, dones, infos = _index(next_obs_chunk, t), rewards_chunk[t], dones_chunk[t], infos_chunk[t]
+                actions = actions_chunk[t]
+                self.num_timesteps += self.n_envs
+                num_collected_steps += 1
+
+                callback.update_locals(locals())
+                if not callback.on_step():
+                    self._rollout_steps = num_collected_steps
+                    return RolloutReturn(num_collected_steps * self.n_envs, num_collected_episodes, continue_training=False)
+
+                self._update_info_buffer(infos, dones)
+                replay_buffer.add(_index(obs_chunk, t), new_obs, actions, rewards, dones, infos)
+                self._update_current_progress_remaining(self.num_timesteps, self._total_timesteps)
+                self._on_step()
+
+                for done in dones:
+                    if done:
+                        num_collected_episodes += 1
+                        self._episode_num += 1
+                        if log_interval is not None and self._episode_num % log_interval == 0:
+                            self.dump_logs()
+        callback.on_rollout_end()
+        self._rollout_steps = num_collected_steps
+        return RolloutReturn(num_collected_steps * self.n_envs, num_collected_episodes, continue_training)
+
+    def train(self, gradient_steps, batch_size=100):
+        # learn() asks for gradient_steps after every collect_rollouts(),
+        # whatever it delivered -- scale to the steps that actually arrived
+        self._gradient_credit += self._rollout_steps * gradient_steps / self.train_freq.frequency
+        self._rollout_steps = 0
+        steps = int(self._gradient_credit)
+        if steps == 0:
+            return
+        self._gradient_credit -= steps
+        super().train(gradient_steps=steps, batch_size=batch_size)
+        self._publish_weights()
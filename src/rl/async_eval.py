@@ -0,0 +1,215 @@
+"""
+rl/async_eval.py - EvalCallback that evaluates in a separate process.
+
+SB3's EvalCallback plays its evaluation episodes inside the training loop:
+about 25 times per run the learner and every SubprocVecEnv worker sit idle
+until n_eval_episodes full games are over, which with a good policy means
+thousands of steps each.
+
+AsyncEvalCallback hands that work to one evaluator process instead. At
+every eval_freq-th call it takes a snapshot of the model: in-memory copies
+of its state dicts (policy, target network, optimizer) and its other
+attributes, as rl.checkpoint_writer's _snapshot() takes them. The
+snapshot's policy weights are sent to the evaluator, and the snapshot is
+kept here in case it turns out to be the new best. Nothing is zipped or
+written at this point, so training goes on after a copy of the tensors.
+The evaluator plays the episodes in lockstep (rl.evaluation.play_batched())
+and sends the scores back; they are folded in the next time the callback
+runs, exactly as EvalCallback would have handled them at the snapshot's
+timestep:
+    - the tensorboard scalars (eval/mean_reward, eval/mean_ep_length) are
+      written at the snapshot's timestep,
+    - a new best serializes the snapshot into best_model.zip (through the
+      CheckpointWriter's thread if there is one), and updates
+      best_mean_reward (so best_score.json gets the right score); other
+      snapshots are just dropped,
+    - callback_on_new_best then fires with `evaluated_timestep` set to the
+      snapshot's timestep (train_model()'s _RecordBestTimestep reads it, so
+      best_model's filename suffix still names the timestep its weights are
+      from).
+At most `max_in_flight` snapshots are out at once; an eval_freq tick that
+finds the evaluator that far behind is skipped rather than queued. When
+training ends, the callback waits for the outstanding results, so every
+snapshot taken counts before train_model() finalizes the checkpoints.
+
+Classes:
+    AsyncEvalCallback - EvalCallback replacement that evaluates out of process.
+"""
+
+import multiprocessing as mp
+import os
+
+import numpy as np
+import torch
+from stable_baselines3.common.callbacks import EvalCallback
+
+from rl.checkpoint_writer import _snapshot, _write_model_zip
+from rl.evaluation import make_eval_vec_env, play_batched
+
+
+def _evaluator(conn, policy_class, policy_kwargs, env_kwargs, n_eval_episodes, deterministic):
+    """Evaluator process: rebuild the policy once, then for every (timestep,
+    weights) received load the weights, play the episodes and send back
+    (timestep, scores, lengths). None shuts it down."""
+    torch.set_num_threads(1)           # Leave the cores to the learner and its workers
+    policy = policy_class(**policy_kwargs)
+    policy.set_training_mode(False)
+    env = make_eval_vec_env(**env_kwargs)
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            timestep, weights = message
+            policy.load_state_dict({key: torch.from_numpy(value) for key, value in weights.items()})
+            scores, lengths = play_batched(policy, env, n_eval_episodes, deterministic)
+            conn.send((timestep, scores, lengths))
+    finally:
+        env.close()
+        conn.close()
+
+
+class AsyncEvalCallback(EvalCallback):
+    """
+    Args:
+        eval_env:             Evaluation VecEnv, as for EvalCallback (only used
+                              by code that evaluates in this process, e.g.
+                              train_model()'s final evaluation).
+        eval_env_kwargs:      make_eval_vec_env() arguments for the evaluator's
+                              own copy of the evaluation env.
+        callback_on_new_best: As for EvalCallback; fires when a result comes in.
+        n_eval_episodes:      Episodes per evaluation.
+        eval_freq:            Snapshot every eval_freq calls of the callback.
+        best_model_save_path: Folder for best_model.zip, as for EvalCallback.
+        deterministic:        Deterministic or stochastic actions.
+        verbose:              1 prints every result, like EvalCallback.
+        max_in_flight:        Snapshots the evaluator may be behind by.
+        start_method:         multiprocessing start method for the evaluator
+                              ("forkserver" where available, else "spawn").
+        checkpoint_writer:    Optional rl.checkpoint_writer.CheckpointWriter that
+                              writes a new best_model.zip in the background.
+        callback_after_eval:  As in EvalCallback, fired after every folded-in result.
+    """
+
+    def __init__(self, eval_env, eval_env_kwargs, callback_on_new_best=None, n_eval_episodes=10, eval_freq=10000,
+                 best_model_save_path=None, deterministic=True, verbose=1, max_in_flight=2, start_method=None,
+                 checkpoint_writer=None, callback_after_eval=None):
+        super().__init__(eval_env, callback_on_new_best=callback_on_new_best, callback_after_eval=callback_after_eval,
+                         n_eval_episodes=n_eval_episodes, eval_freq=eval_freq,
+                         best_model_save_path=best_model_save_path, deterministic=deterministic, verbose=verbose)
+        self.eval_env_kwargs = eval_env_kwargs
+        self.max_in_flight = max_in_flight
+        self.start_method = start_method
+        self.checkpoint_writer = checkpoint_writer
+        self.evaluated_timestep = None     # Snapshot timestep of the result being folded in
+        self.skipped_evaluations = 0
+        self._pending = {}                 # snapshot timestep -> the model's _snapshot() at that point
+        self._conn = None
+        self._process = None
+
+    # --- Evaluator process ---------------------------------------------------
+
+    def _init_callback(self) -> None:
+        super()._init_callback()
+        if self.start_method is None:
+            self.start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+        ctx = mp.get_context(self.start_method)
+        conn, child_conn = ctx.Pipe()
+        policy = self.model.policy
+        process = ctx.Process(
+            target=_evaluator,
+            args=(child_conn, type(policy), policy._get_constructor_parameters(), self.eval_env_kwargs,
+                  self.n_eval_episodes, self.deterministic),
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        self._conn, self._process = conn, process
+
+    def close(self):
+        """Stop the evaluator (idempotent). Outstanding results are dropped --
+        _on_training_end() collects them first on a normal finish."""
+        if self._process is None:
+            return
+        try:
+            self._conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._conn.close()
+        self._process = None
+
+    def _receive(self):
+        try:
+            return self._conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Evaluator process exited unexpectedly (exit code {self._process.exitcode})") from None
+
+    # --- Training loop hooks -------------------------------------------------
+
+    def _on_step(self) -> bool:
+        continue_training = True
+        while self._pending and self._conn.poll():
+            continue_training = self._fold(*self._receive()) and continue_training
+
+        if self.eval_freq > 0 and self.n_calls % self.eval_freq == 0:
+            self._submit()
+        return continue_training
+
+    def _on_training_end(self) -> None:
+        while self._pending:
+            self._fold(*self._receive())
+        self.close()
+
+    def _submit(self):
+        if len(self._pending) >= self.max_in_flight:
+            self.skipped_evaluations += 1
+            if self.verbose >= 1:
+                print(f"Evaluator busy, skipping the evaluation at num_timesteps={self.num_timesteps}")
+            return
+        # Copies of the state dicts only: zipping them is left to _fold(), for
+        # the snapshots that turn out to be a new best
+        snapshot = _snapshot(self.model)
+        self._pending[self.num_timesteps] = snapshot
+        weights = {key: value.cpu().numpy() for key, value in snapshot[1]["policy"].items()}
+        self._conn.send((self.num_timesteps, weights))
+
+    def _fold(self, timestep, scores, lengths) -> bool:
+        """Handle one evaluation result the way EvalCallback._on_step() handles
+        its own, as of the snapshot's timestep."""
+        snapshot = self._pending.pop(timestep)
+        mean_reward, std_reward = float(np.mean(scores)), float(np.std(scores))
+        mean_ep_length, std_ep_length = float(np.mean(lengths)), float(np.std(lengths))
+        self.last_mean_reward = mean_reward
+        self.evaluated_timestep = timestep
+
+        if self.verbose >= 1:
+            print(f"Eval num_timesteps={timestep}, episode_reward={mean_reward:.2f} +/- {std_reward:.2f} "
+                  f"(async, {self.num_timesteps - timestep} steps ago)")
+            print(f"Episode length: {mean_ep_length:.2f} +/- {std_ep_length:.2f}")
+        # Straight to the output formats at the snapshot's step: going through
+        # logger.record()/dump() would also flush the training metrics
+        # collected so far, at the wrong step
+        values = {"eval/mean_reward": mean_reward, "eval/mean_ep_length": mean_ep_length}
+        for output in self.logger.output_formats:
+            output.write(values, {key: None for key in values}, timestep)
+
+        continue_training = True
+        if mean_reward > self.best_mean_reward:
+            if self.verbose >= 1:
+                print("New best mean reward!")
+            if self.best_model_save_path is not None:
+                best_path = os.path.join(self.best_model_save_path, "best_model.zip")
+                if self.checkpoint_writer is not None:
+                    self.checkpoint_writer.save_snapshot(snapshot, best_path)
+                else:
+                    with open(best_path, "w+b") as file:   # Readable too: the zip is appended to
+                        _write_model_zip(file, *snapshot)
+            self.best_mean_reward = mean_reward
+            if self.callback_on_new_best is not None:
+                continue_training = self.callback_on_new_best.on_step()
+        if self.callback is not None:
+            continue_training = continue_training and self._on_event()
+        return continue_training
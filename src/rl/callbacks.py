@@ -9,6 +9,10 @@ Classes:
                          reports percentages every 100k timesteps.
     PeriodicCheckpoint - Periodically saves the in-progress model, so a crash
                          mid-run doesn't lose the entire run.
+    BestModelSaver     - callback_on_new_best that saves best_model.zip through a
+                         CheckpointWriter instead of EvalCallback's own blocking save.
+    PlateauStopping    - callback_after_eval that ends training once the eval reward
+                         trend has flattened out.
 """
 
 import os
@@ -19,10 +23,11 @@ import numpy as np
 
 class DeathLogger(BaseCallback):
     """
-    Tracks and reports death causes during training: max-step timeout vs. collision.
+    Tracks and reports death causes during training: max-step timeout vs.
+    collision vs. a detected loop (environments with detect_cycles).
 
     Distinguishes death types via the environment's explicit `info["death_cause"]`
-    flag ("timeout" | "collision" | None) instead of inferring it from the reward
+    flag ("timeout" | "collision" | "cycle" | None) instead of inferring it from the reward
     value, which is robust to future changes of the reward constants.
 
     Reports percentages every 100k timesteps.
@@ -32,6 +37,7 @@ class DeathLogger(BaseCallback):
         super().__init__(verbose)
         self.maxstep_deaths = 0        # Count of max-step timeout deaths
         self.collision_deaths = 0      # Count of collision deaths
+        self.cycle_deaths = 0          # Count of repeated-state cutoffs
         self.total_episodes = 0        # Total completed episodes
         self.last_reported_timestep = 0
 
@@ -54,13 +60,16 @@ class DeathLogger(BaseCallback):
                 self.maxstep_deaths += 1
             elif death_cause == "collision":
                 self.collision_deaths += 1
+            elif death_cause == "cycle":
+                self.cycle_deaths += 1
 
         # Report death statistics every 100k timesteps
         if self.num_timesteps - self.last_reported_timestep >= 100_000:
             if self.total_episodes > 0:
                 maxstep_rate = 100 * self.maxstep_deaths / self.total_episodes
                 collision_rate = 100 * self.collision_deaths / self.total_episodes
-                print(f"[Step {self.num_timesteps:,}] MaxStep: {maxstep_rate:.1f}% | Collision: {collision_rate:.1f}% | Total Episodes: {self.total_episodes}")
+                cycle_rate = 100 * self.cycle_deaths / self.total_episodes
+                print(f"[Step {self.num_timesteps:,}] MaxStep: {maxstep_rate:.1f}% | Collision: {collision_rate:.1f}% | Cycle: {cycle_rate:.1f}% | Total Episodes: {self.total_episodes}")
             else:
                 print(f"[Step {self.num_timesteps:,}] No episodes completed yet")
 
@@ -75,15 +84,106 @@ class PeriodicCheckpoint(BaseCallback):
     crash (or killed process) loses at most `save_freq` calls of progress
     instead of the whole run -- EvalCallback already gives `best_model` this
     safety net via its own eval-triggered saves; this gives `last_model` the
-    same one.
+    same one. A DQN replay buffer that can be flushed incrementally (see
+    rl/replay_buffer.py) is flushed at the same time, so it survives a crash
+    along with the checkpoint. With a checkpoint_writer (rl/checkpoint_writer.py)
+    the model is written in the background instead of inside the training loop;
+    the buffer's rows are still synced right away, but its position is only
+    recorded once that last_model.zip is on disk -- after a crash the buffer
+    is never newer than the checkpoint it resumes with.
     """
 
-    def __init__(self, save_freq, save_path, verbose=0):
+    def __init__(self, save_freq, save_path, verbose=0, checkpoint_writer=None):
         super().__init__(verbose)
         self.save_freq = max(save_freq, 1)
         self.save_path = save_path
+        self.checkpoint_writer = checkpoint_writer
 
     def _on_step(self) -> bool:
         if self.n_calls % self.save_freq == 0:
-            self.model.save(os.path.join(self.save_path, "last_model"))
+            buffer = getattr(self.model, "replay_buffer", None)
+            flushable = hasattr(buffer, "flush")
+            if self.checkpoint_writer is not None:
+                on_written = None
+                if flushable:
+                    # Recording the position is what makes the synced rows
+                    # count on resume, so it waits for the checkpoint. A save
+                    # superseded before it's written never records its state;
+                    # the newer one's covers these rows too.
+                    state = buffer.flush(self.num_timesteps, record=False)
+                    on_written = lambda: buffer.record_state(state)
+                self.checkpoint_writer.save(self.model, os.path.join(self.save_path, "last_model"), on_written)
+            else:
+                self.model.save(os.path.join(self.save_path, "last_model"))
+                if flushable:
+                    buffer.flush(self.num_timesteps)
         return True  # Continue training
+
+
+class BestModelSaver(BaseCallback):
+    """
+    Saves best_model.zip through a CheckpointWriter (rl/checkpoint_writer.py)
+    whenever EvalCallback finds a new best -- pass it in callback_on_new_best
+    and leave EvalCallback's best_model_save_path unset. Fires at the same
+    point EvalCallback's own (blocking) save would have run.
+    """
+
+    def __init__(self, checkpoint_writer, save_path, verbose=0):
+        super().__init__(verbose)
+        self.checkpoint_writer = checkpoint_writer
+        self.save_path = save_path
+
+    def _on_step(self) -> bool:
+        self.checkpoint_writer.save(self.model, os.path.join(self.save_path, "best_model"))
+        return True
+
+
+class PlateauStopping(BaseCallback):
+    """
+    Ends training once the evaluation reward has stopped improving -- pass it
+    as EvalCallback's callback_after_eval. After every evaluation it fits a
+    straight line through the last `window` mean rewards over their timesteps;
+    the slope is the improvement to expect per million more timesteps if the
+    trend holds. Once that stays below `min_improvement` for `patience`
+    evaluations in a row, it returns False, which ends .learn() the same way
+    a cancel does -- the model is still saved, evaluated and finalized.
+
+    A fixed reward threshold (StopTrainingOnRewardThreshold) only fires for a
+    run that gets very good; this also catches runs that are stuck, long
+    before their timesteps budget is spent.
+
+    Attributes:
+        slope_per_million: The latest fitted slope (None until `window` evaluations).
+        stopped_at:        num_timesteps when it stopped training, else None.
+    """
+
+    def __init__(self, min_improvement, window=8, patience=3, verbose=1):
+        super().__init__(verbose)
+        self.min_improvement = min_improvement
+        self.window = max(window, 2)
+        self.patience = patience
+        self.slope_per_million = None
+        self.stopped_at = None
+        self._history = []
+        self._flat_evaluations = 0
+
+    def _on_step(self) -> bool:
+        # AsyncEvalCallback's result belongs to an earlier snapshot
+        timestep = getattr(self.parent, "evaluated_timestep", None)
+        if timestep is None:
+            timestep = self.num_timesteps
+        self._history = (self._history + [(timestep, float(self.parent.last_mean_reward))])[-self.window:]
+        if len(self._history) < self.window:
+            return True
+
+        timesteps, rewards = np.array(self._history).T
+        self.slope_per_million = float(np.polyfit(timesteps / 1e6, rewards, 1)[0])
+        self._flat_evaluations = self._flat_evaluations + 1 if self.slope_per_million < self.min_improvement else 0
+        if self._flat_evaluations < self.patience:
+            return True
+
+        self.stopped_at = self.num_timesteps
+        if self.verbose >= 1:
+            print(f"Stopping training: eval reward trend is {self.slope_per_million:+.2f} per million steps over the "
+                  f"last {self.window} evaluations (threshold {self.min_improvement:+.2f}) for {self.patience} in a row")
+        return False
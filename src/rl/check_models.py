@@ -6,15 +6,23 @@ Catches problems like a refactor leaving a stale module path baked into an
 old checkpoint's pickle (see rl/feature_extractors.py's sys.modules alias for
 a real example this caught) before a user hits it while testing in the UI,
 instead of only finding out when someone happens to click "Start Test".
+A checkpoint's NumPy export (rl/numpy_policy.py), if it has one, must also
+load and pick the same deterministic actions as the checkpoint itself --
+otherwise it's stale or broken, and playback through it would differ.
 
 Usage: python -m rl.check_models
 """
 
+import os
 import sys
 
+import numpy as np
 from stable_baselines3 import DQN, PPO
 
+from game.observations import observation_encoding
 from ui.models import _discover_models
+from rl.evaluation import make_eval_vec_env
+from rl.numpy_policy import NumpyPolicy, npz_path
 from rl.paths import _find_checkpoint
 # Not referenced by name below -- importing it registers the "feature_extractors"
 # sys.modules alias (see rl/feature_extractors.py) needed to unpickle GRID-mode
@@ -22,12 +30,34 @@ from rl.paths import _find_checkpoint
 import rl.feature_extractors  # noqa: F401
 
 
+# Below this, an export counts as not matching its checkpoint (float rounding
+# can flip the odd near-tie between two actions, nothing more)
+_MIN_AGREEMENT = 0.99
+
+
+def _export_agreement(model, policy, info, n_games=64, n_steps=8) -> float:
+    """Share of deterministic actions the NumPy `policy` and the SB3 `model`
+    agree on, over observations from a few random steps of n_games games."""
+    env = make_eval_vec_env(n_games, info["grid_width"], info["grid_height"], info["fov"],
+                            obs_mode="grid" if info["obs_mode"] == "GRID" else "flat",
+                            obs_encoding=observation_encoding(model.observation_space), seed=0)
+    rng = np.random.default_rng(0)
+    obs = env.reset()
+    matches = []
+    for _ in range(n_steps):
+        matches.append(model.predict(obs, deterministic=True)[0] == policy.predict(obs, deterministic=True)[0])
+        obs, _, _, _ = env.step(rng.integers(0, 4, size=n_games))
+    env.close()
+    return float(np.mean(matches))
+
+
 def check_all_models_loadable():
     """
     Try to load every checkpoint _discover_models() finds (its best
-    checkpoint if one exists, else its last). Returns a list of
-    (info, checkpoint_path, exception) for the ones that failed to load --
-    an empty list means every discovered model loads cleanly.
+    checkpoint if one exists, else its last), and its NumPy export if it
+    has one. Returns a list of (info, checkpoint_path, exception) for the
+    ones that failed to load or whose export disagrees with them -- an empty
+    list means every discovered model loads cleanly.
     """
     models = _discover_models()
     print(f"Checking {len(models)} discovered model configuration(s)...")
@@ -41,7 +71,13 @@ def check_all_models_loadable():
 
         checkpoint_path = _find_checkpoint(info["path"], prefix)
         try:
-            model_class.load(checkpoint_path, device="cpu")
+            model = model_class.load(checkpoint_path, device="cpu")
+            export = npz_path(checkpoint_path)
+            if os.path.exists(export):
+                agreement = _export_agreement(model, NumpyPolicy.load(export), info)
+                if agreement < _MIN_AGREEMENT:
+                    raise ValueError(f"NumPy export {export} agrees on only {agreement:.1%} of actions (stale?)")
+                label += f", NumPy export agrees {agreement:.1%}"
             print(f"  OK    {label}")
         except Exception as exc:
             print(f"  FAIL  {label}\n        [{checkpoint_path}]\n        {type(exc).__name__}: {exc}")
@@ -0,0 +1,171 @@
+"""
+rl/checkpoint_writer.py - Writes model checkpoints on a background thread.
+
+PeriodicCheckpoint and the best-model save of EvalCallback used to call
+model.save() inside the training loop: serialize the model's attributes,
+torch.save() the policy, target network and optimizer state into a zip,
+write it -- with the learner and every env waiting.
+
+CheckpointWriter.save() does only the part that has to see the model at
+that exact moment on the training thread: the JSON of its attributes (what
+model.save() puts into the zip's "data") and a copy of every state dict.
+Zipping and writing happen on the writer's thread, into a temporary file
+that is fsync'ed and then renamed over the target -- readers (and
+_finalize_checkpoint()) only ever see a complete best_model.zip /
+last_model.zip. Saves to the same path are latest-wins: a save that is
+still queued when a newer one arrives is dropped, and one already being
+written is discarded instead of renamed if a newer one came in meanwhile.
+
+A save can come with an on_written() callback, run on the writer's thread
+right after that checkpoint is renamed into place -- never for a save that
+was dropped or failed. PeriodicCheckpoint records the replay buffer's
+position from it, so the buffer on disk is never newer than last_model.zip.
+
+flush() waits for everything queued (callbacks included); train_model() calls close() (flush +
+stop) as soon as model.learn() returns, before its own final saves and the
+checkpoint renames.
+
+Classes:
+    CheckpointWriter - Background, latest-wins, atomic checkpoint writes.
+"""
+
+import os
+import threading
+import zipfile
+
+import torch
+from stable_baselines3.common.save_util import data_to_json, recursive_getattr, save_to_zip_file
+
+
+def _clone(value):
+    """Copy of a (nested) state dict: tensors cloned, containers rebuilt,
+    everything else (numbers, strings) shared."""
+    if isinstance(value, torch.Tensor):
+        return value.detach().clone()
+    if isinstance(value, dict):
+        return {key: _clone(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return type(value)(_clone(item) for item in value)
+    return value
+
+
+def _snapshot(model):
+    """What model.save() would write, taken now: (serialized data,
+    state dicts, pytorch variables) -- the same selection as
+    BaseAlgorithm.save()."""
+    data = model.__dict__.copy()
+    exclude = set(model._excluded_save_params())
+    state_dicts_names, torch_variable_names = model._get_torch_save_params()
+    for name in state_dicts_names + torch_variable_names:
+        exclude.add(name.split(".")[0])
+    for name in exclude:
+        data.pop(name, None)
+
+    pytorch_variables = None
+    if torch_variable_names is not None:
+        pytorch_variables = {name: _clone(recursive_getattr(model, name)) for name in torch_variable_names}
+    return data_to_json(data), _clone(model.get_parameters()), pytorch_variables
+
+
+def _write_model_zip(file, serialized_data, params, pytorch_variables):
+    # SB3's own writer for the tensors and metadata, then the
+    # already-serialized data added to the same archive
+    save_to_zip_file(file, data=None, params=params, pytorch_variables=pytorch_variables)
+    with zipfile.ZipFile(file, mode="a") as archive:
+        archive.writestr("data", serialized_data)
+
+
+class CheckpointWriter:
+    """
+    One writer thread for a training run's checkpoints.
+
+    Attributes:
+        written: Checkpoints written.
+        dropped: Saves superseded by a newer save to the same path.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.dropped = 0
+        self._cond = threading.Condition()
+        self._queue = {}               # target path -> (generation, write(file), on_written)
+        self._generation = {}          # target path -> newest generation submitted
+        self._busy = False
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def save(self, model, path, on_written=None):
+        """Like model.save(path): `path` with or without ".zip". on_written()
+        is called once this checkpoint is in place (see the module docstring)."""
+        self.save_snapshot(_snapshot(model), path, on_written)
+
+    def save_snapshot(self, snapshot, path, on_written=None):
+        """Write a _snapshot() taken earlier (e.g. one kept in memory until
+        its evaluation came back, see rl/async_eval.py) the same way."""
+        target = path if path.endswith(".zip") else path + ".zip"
+        self._submit(target, lambda file: _write_model_zip(file, *snapshot), on_written)
+
+    def _submit(self, target, write, on_written=None):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("CheckpointWriter is closed")
+            generation = self._generation.get(target, 0) + 1
+            self._generation[target] = generation
+            if target in self._queue:
+                self.dropped += 1
+            self._queue[target] = (generation, write, on_written)
+            self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                target = next(iter(self._queue))
+                generation, write, on_written = self._queue.pop(target)
+                self._busy = True
+
+            partial = target[:-len(".zip")] + ".partial.zip"
+            try:
+                with open(partial, "w+b") as file:
+                    write(file)
+                    file.flush()
+                    os.fsync(file.fileno())
+                with self._cond:
+                    current = self._generation[target] == generation
+                    if current:
+                        os.replace(partial, target)
+                        self.written += 1
+                    else:
+                        os.remove(partial)
+                        self.dropped += 1
+                if current and on_written is not None:
+                    on_written()
+            except Exception as exc:
+                # A lost periodic checkpoint isn't worth stopping training for;
+                # train_model() still saves the final state synchronously
+                print(f"Checkpoint write to {target} failed: {exc!r}")
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def flush(self):
+        """Wait until every queued checkpoint is written."""
+        with self._cond:
+            while self._queue or self._busy:
+                self._cond.wait()
+
+    def close(self):
+        """flush(), then stop the thread (idempotent)."""
+        with self._cond:
+            if self._closed:
+                return
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
@@ -0,0 +1,163 @@
+"""
+rl/evaluation.py - Batched (lockstep) evaluation of a trained model.
+
+Scoring a model used to mean playing its evaluation episodes one after the
+other on a single SnakeGameEnvironment, with one model.predict() call per
+step at batch size 1 -- for a DQN/PPO MLP that forward pass costs about the
+same at batch size 1 as at 10, so almost all of an evaluation's time went
+into per-call overhead.
+
+Here all episodes of an evaluation play at once, one per game of a
+SnakeVecEnv (game.vector_engine.VectorSnakeEngine): every tick is one
+batched model.predict() over all games plus one array step of the engine.
+Same rules, observations and clean score (apples eaten, training=False) as
+the serial loop; only the apple sequence differs (the engine draws apples
+from its own generator).
+
+SB3's evaluate_policy() already spreads episodes over a multi-env VecEnv
+the same way, so EvalCallback gets the batched behaviour simply by being
+handed make_eval_vec_env()'s env (see train_model()).
+
+SnakeVecEnv is an SB3 VecEnv, so it imports SB3 and torch. evaluate_scores()
+and play_engine() don't use it: they step a VectorSnakeEngine themselves
+(same rules, step cap and cycle detection, one episode per game), so scoring
+an rl.numpy_policy.NumpyPolicy needs only NumPy. This module imports SB3 only
+inside make_eval_vec_env().
+
+Functions:
+    make_eval_vec_env() - SnakeVecEnv set up for evaluation (clean score, step cap, cycle detection).
+    evaluate_batched()  - Play n episodes in lockstep; {"mean_score", "episodes", "scores"}.
+    play_batched()      - The same, returning the raw (scores, episode lengths).
+    play_engine()       - play_batched() without a VecEnv (no torch), one episode per game.
+    evaluate_scores()   - Deterministic + stochastic mean scores of a model, through play_engine().
+"""
+
+import numpy as np
+
+from game.observations import observation_encoding
+from game.vector_engine import VectorSnakeEngine
+from rl.paths import GRID_SIZE
+
+# Hard per-episode step limit, as the serial evaluation's TimeLimit wrapper had
+EVAL_MAX_EPISODE_STEPS = 10000
+
+
+def make_eval_vec_env(n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode="flat", obs_encoding="standard", detect_cycles=True, seed=None):
+    """
+    One game per evaluation episode, without reward shaping (training=False,
+    so an episode's return is its score) and capped at EVAL_MAX_EPISODE_STEPS
+    -- without the training timeout, an undertrained/looping policy would
+    otherwise never finish an episode. With detect_cycles, a game that repeats
+    a state also ends right there (see game/vector_engine.py); evaluate_batched()
+    switches that off for stochastic episodes, which can still break out of a
+    loop.
+    """
+    from rl.vec_env import SnakeVecEnv
+
+    return SnakeVecEnv(n_episodes, GRID_SIZE, grid_width, grid_height, snake_fov_radius, training=False, obs_mode=obs_mode,
+                       max_episode_steps=EVAL_MAX_EPISODE_STEPS, seed=seed, obs_encoding=obs_encoding, detect_cycles=detect_cycles)
+
+
+def evaluate_batched(model, env, n_episodes, deterministic=True) -> dict:
+    """
+    Play n_episodes on `env` (make_eval_vec_env(), or any VecEnv reporting
+    Monitor-style info["episode"]) in lockstep, spread over its games the way
+    SB3's evaluate_policy() does: game i plays (n_episodes + i) // num_envs
+    of them, back to back, so a game that finishes early doesn't bias the
+    result toward short episodes. Games past their share keep stepping with
+    the rest (they're part of the same array step) but aren't counted.
+
+    Returns:
+        {"mean_score": float, "episodes": n_episodes, "scores": [float, ...]},
+        the scores in the order their episodes finished.
+    """
+    scores, _ = play_batched(model, env, n_episodes, deterministic)
+    return {"mean_score": sum(scores) / len(scores), "episodes": n_episodes, "scores": scores}
+
+
+def play_batched(model, env, n_episodes, deterministic=True) -> tuple[list, list]:
+    """The loop behind evaluate_batched(): (scores, episode lengths), in the
+    order the episodes finished. `model` only needs predict() -- an SB3 model
+    or a bare policy (see rl/async_eval.py)."""
+    num_envs = env.num_envs
+    targets = np.array([(n_episodes + i) // num_envs for i in range(num_envs)])
+    counts = np.zeros(num_envs, dtype=np.int64)
+
+    engine = getattr(env, "engine", None)
+    if engine is not None and hasattr(engine, "state_hash"):
+        # Cycle detection only proves an endless loop for a deterministic
+        # policy. Set before reset(), which starts the hashes fresh.
+        engine.detect_cycles = deterministic
+
+    scores, lengths = [], []
+    obs = env.reset()
+    while (counts < targets).any():
+        actions, _ = model.predict(obs, deterministic=deterministic)
+        obs, _, dones, infos = env.step(actions)
+        for i in np.flatnonzero(dones):
+            if counts[i] < targets[i]:
+                scores.append(float(infos[i]["episode"]["r"]))
+                lengths.append(int(infos[i]["episode"]["l"]))
+                counts[i] += 1
+    return scores, lengths
+
+
+def play_engine(model, n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode="flat", obs_encoding="standard",
+                deterministic=True, seed=None) -> tuple[list, list]:
+    """
+    play_batched() over make_eval_vec_env(n_episodes, ...)'s games, without
+    the VecEnv (and so without SB3/torch): n_episodes games step in lockstep
+    on one VectorSnakeEngine, each counting its first episode. As there,
+    episodes are capped at EVAL_MAX_EPISODE_STEPS and, if deterministic,
+    end at their first repeated state; games that have finished keep
+    stepping with the rest, so with the same seed the results are
+    play_batched()'s. Returns (scores, episode lengths) in the order the
+    episodes finished.
+    """
+    engine = VectorSnakeEngine(n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode, training=False, seed=seed,
+                               obs_encoding=obs_encoding, detect_cycles=deterministic)
+    engine.reset()
+    returns = np.zeros(n_episodes, dtype=np.float64)
+    lengths = np.zeros(n_episodes, dtype=np.int64)
+    counted = np.zeros(n_episodes, dtype=bool)
+    scores, episode_lengths = [], []
+    obs = engine.observe()
+    while not counted.all():
+        actions, _ = model.predict(obs, deterministic=deterministic)
+        rewards, terminated, truncated, _ = engine.step(actions)
+        returns += rewards
+        lengths += 1
+        dones = terminated | truncated | (lengths >= EVAL_MAX_EPISODE_STEPS)
+        done_idx = np.flatnonzero(dones)
+        for i in done_idx:
+            if not counted[i]:
+                scores.append(round(float(returns[i]), 6))
+                episode_lengths.append(int(lengths[i]))
+                counted[i] = True
+        if len(done_idx):
+            engine.reset(done_idx)
+            returns[done_idx] = 0
+            lengths[done_idx] = 0
+        obs = engine.observe()
+    return scores, episode_lengths
+
+
+def evaluate_scores(model, grid_width, grid_height, snake_fov_radius, obs_mode="flat", n_episodes=10, verbose=True, seed=None) -> dict:
+    """
+    {"deterministic": ..., "stochastic": ...}, each evaluate_batched()'s
+    {"mean_score", "episodes", "scores"} over n_episodes play_engine()
+    episodes -- what rl.training.evaluate_model_performance() reports. `model`
+    only needs predict() and observation_space (its observation encoding is
+    taken from there), so a NumpyPolicy is scored without importing torch.
+    """
+    encoding = observation_encoding(model.observation_space)
+    rng = np.random.default_rng(seed)
+    results = {}
+    for label, deterministic in [("deterministic", True), ("stochastic", False)]:
+        # One seed per set, drawn from `seed`: the two sets don't replay the same apples
+        scores, _ = play_engine(model, n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode, encoding,
+                                deterministic=deterministic, seed=int(rng.integers(2**31)))
+        results[label] = {"mean_score": sum(scores) / len(scores), "episodes": n_episodes, "scores": scores}
+        if verbose:
+            print(f"  {label}: mean score = {results[label]['mean_score']:.2f} ({n_episodes} episodes)")
+    return results
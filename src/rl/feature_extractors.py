@@ -11,14 +11,43 @@ one feature vector.
 SB3's default CnnPolicy/NatureCNN assumes large, image-like inputs (>=36x36,
 usually 84x84) and produces invalid dimensions for a small FOV window (e.g.
 7x7 or 11x11) -- hence this small, purpose-built extractor instead.
+
+Both extractors also accept the "compact"/"packed" observation encodings
+(see game/observations.py) and expand them back to the exact one-hot input
+the "standard" encoding gives, so the encoding only changes what is stored
+and shipped between processes, not what the network sees:
+    SnakeCombinedExtractor - GRID mode, any encoding.
+    CompactFlatExtractor   - FLAT mode, "compact"/"packed" encoding (for an
+                             MlpPolicy; "standard" FLAT needs no extractor,
+                             SB3 one-hot encodes the MultiDiscrete itself).
 """
 
 import sys
 
 import torch as th
 import torch.nn as nn
+import torch.nn.functional as F
 from stable_baselines3.common.torch_layers import BaseFeaturesExtractor
 
+from game.observations import N_CELL_TYPES, fov_side
+
+
+def unpack_2bit(packed, n_values):
+    """Inverse of game.observations.pack_2bit() for a torch tensor: (..., k)
+    bytes -> (..., n_values) long codes."""
+    shifts = th.arange(0, 8, 2, device=packed.device)
+    codes = (packed.long().unsqueeze(-1) >> shifts) & 3
+    return codes.flatten(-2)[..., :n_values]
+
+
+def expand_grid(grid):
+    """Categorical (B, S, S) codes -> the "standard" one-hot (B, 4, S, S)
+    float grid, head (center) cell all-zero."""
+    side = grid.shape[-1]
+    one_hot = F.one_hot(grid.long(), N_CELL_TYPES).permute(0, 3, 1, 2).float()
+    one_hot[:, :, side // 2, side // 2] = 0
+    return one_hot
+
 
 class SnakeCombinedExtractor(BaseFeaturesExtractor):
     """Combines a small CNN over the FOV grid with a linear branch over the
@@ -28,6 +57,13 @@ class SnakeCombinedExtractor(BaseFeaturesExtractor):
         super().__init__(observation_space, cnn_features_dim + dir_features_dim)
 
         grid_shape = observation_space["grid"].shape
+        # (4, S, S) one-hot ("standard"), (S, S) codes ("compact") or
+        # (S, ceil(S/4)) packed codes ("packed") -- the CNN always sees (4, S, S).
+        if len(grid_shape) == 3:
+            self.grid_encoding = "standard"
+        else:
+            self.grid_encoding = "compact" if grid_shape[0] == grid_shape[1] else "packed"
+            grid_shape = (N_CELL_TYPES, grid_shape[0], grid_shape[0])
         channels = grid_shape[0]
         self.cnn = nn.Sequential(
             nn.Conv2d(channels, 16, kernel_size=3, padding=1), nn.ReLU(),
@@ -44,12 +80,40 @@ class SnakeCombinedExtractor(BaseFeaturesExtractor):
         n_dir = int(sum(observation_space["apple_dir"].nvec))
         self.dir_linear = nn.Sequential(nn.Linear(n_dir, dir_features_dim), nn.ReLU())
 
+    def _grid_input(self, grid):
+        if self.grid_encoding == "standard":
+            return grid.float()
+        if self.grid_encoding == "packed":
+            grid = unpack_2bit(grid, grid.shape[-2])
+        return expand_grid(grid)
+
     def forward(self, observations):
-        grid_features = self.cnn_linear(self.cnn(observations["grid"].float()))
+        grid_features = self.cnn_linear(self.cnn(self._grid_input(observations["grid"])))
         dir_features = self.dir_linear(observations["apple_dir"].float())
         return th.cat([grid_features, dir_features], dim=1)
 
 
+class CompactFlatExtractor(BaseFeaturesExtractor):
+    """FLAT mode, "compact" or "packed" encoding: (unpacks and) one-hot
+    encodes the codes exactly like SB3 preprocesses the "standard"
+    MultiDiscrete vector (4 classes per FOV cell, 3 per apple-direction axis,
+    concatenated), so an MlpPolicy on top sees the same input either way."""
+
+    def __init__(self, observation_space, snake_fov_radius):
+        self.n_cells = fov_side(snake_fov_radius)**2 - 1
+        self.packed = observation_space.shape[0] != self.n_cells + 2
+        super().__init__(observation_space, self.n_cells * N_CELL_TYPES + 2 * 3)
+
+    def forward(self, observations):
+        if self.packed:
+            codes = unpack_2bit(observations, self.n_cells + 2)
+        else:
+            codes = observations.long()
+        cells = F.one_hot(codes[:, :self.n_cells], N_CELL_TYPES).flatten(1)
+        apple_dir = F.one_hot(codes[:, self.n_cells:], 3).flatten(1)
+        return th.cat([cells, apple_dir], dim=1).float()
+
+
 # GRID-mode checkpoints saved before the package refactor have this class
 # cloudpickled by reference under its old top-level module path
 # ("feature_extractors.SnakeCombinedExtractor"). Alias that name to this
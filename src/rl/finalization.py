@@ -0,0 +1,98 @@
+"""
+rl/finalization.py - train_model()'s post-training tail, as a parallel pipeline.
+
+Once model.learn() returns, a run still has to write its results: the DQN
+replay buffer's final flush (see rl/replay_buffer.py), the tb_best snapshot
+(rl.paths._rebuild_tb_best() replays the whole tensorboard history), and the
+deterministic + stochastic evaluations of the last and the best checkpoint.
+None of these depend on each other -- they only need the checkpoints saved
+and renamed first, which train_model() still does up front, since the final
+evaluation decides which model becomes best_model. Run one after the other,
+they kept the UI showing "training" for as long as all of them added up.
+
+FinalizationPipeline runs them as tasks on a thread pool. The buffer flush
+is mostly file I/O and the evaluations mostly NumPy/torch, which release
+the GIL for their heavy lifting, so the tasks overlap in practice and the
+tail takes about as long as its slowest task. Every task start/finish is
+printed and passed to an optional on_progress callback (the Train Model
+screen shows it on its button). Timing starts at a caller-given moment,
+"learn finished" in train_model(), so elapsed() is the whole tail.
+
+Classes:
+    FinalizationPipeline - Concurrent named tasks with progress reporting.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class FinalizationPipeline:
+    """
+    Args:
+        on_progress: Optional callable(dict), called from the thread that runs
+                     run() (train_model()'s own thread) with
+                     {"task", "status" ("started" | "done" | "failed" | "finished"),
+                      "completed", "total", "elapsed"} -- elapsed being seconds
+                     since `started` for "finished", else the task's own time.
+        started:     time.perf_counter() value to measure the tail from
+                     (default: now).
+        max_workers: Thread pool size.
+    """
+
+    def __init__(self, on_progress=None, started=None, max_workers=4):
+        self.on_progress = on_progress
+        self.started = time.perf_counter() if started is None else started
+        self.max_workers = max_workers
+        self.task_times = {}               # task name -> seconds it took
+        self._tasks = []
+
+    def submit(self, name, func, *args, **kwargs):
+        """Queue func(*args, **kwargs) as task `name`; run() starts them all."""
+        self._tasks.append((name, func, args, kwargs))
+
+    def elapsed(self) -> float:
+        """Seconds since `started`."""
+        return time.perf_counter() - self.started
+
+    def _report(self, task, status, completed, elapsed):
+        event = {"task": task, "status": status, "completed": completed, "total": len(self._tasks), "elapsed": elapsed}
+        if status != "finished":
+            print(f"[finalize] {task}: {status}" + (f" ({elapsed:.1f}s)" if status != "started" else ""))
+        if self.on_progress is not None:
+            self.on_progress(event)
+
+    def run(self) -> dict:
+        """
+        Run every submitted task concurrently and wait for all of them.
+
+        Returns:
+            {task name: return value}. If a task raised, the others still run
+            to completion (a failed evaluation shouldn't lose the replay
+            buffer), then the first error is re-raised.
+        """
+        def timed(name, func, args, kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.task_times[name] = time.perf_counter() - start
+
+        results, first_error = {}, None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="finalize") as pool:
+            futures = {}
+            for name, func, args, kwargs in self._tasks:
+                self._report(name, "started", 0, 0.0)
+                futures[pool.submit(timed, name, func, args, kwargs)] = name
+            for completed, future in enumerate(as_completed(futures), start=1):
+                name = futures[future]
+                try:
+                    results[name] = future.result()
+                    self._report(name, "done", completed, self.task_times[name])
+                except Exception as exc:
+                    first_error = first_error or exc
+                    self._report(name, "failed", completed, self.task_times.get(name, 0.0))
+
+        self._report("all", "finished", len(self._tasks), self.elapsed())
+        if first_error is not None:
+            raise first_error
+        return results
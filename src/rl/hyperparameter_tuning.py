@@ -19,7 +19,7 @@ import optuna, os, json
 from stable_baselines3 import DQN
 from stable_baselines3.common.callbacks import BaseCallback
 from stable_baselines3.common.evaluation import evaluate_policy
-from stable_baselines3.common.vec_env import SubprocVecEnv
+from rl.subproc_vec_env import HeadlessSubprocVecEnv
 
 # Directory where optimization results (best params JSON) are saved
 PATH = os.path.join("Training", "DQN_Hyperparameter_Tuning")
@@ -95,7 +95,7 @@ def optimize_dqn(trial, grid_size = 30, grid_width = 30, grid_height = 20, snake
     
     # ── Create environment ──
     from game.environment import make_snake_env
-    env = SubprocVecEnv([make_snake_env(grid_size, grid_width, grid_height, snake_fov_radius) for _ in range(num_envs)])
+    env = HeadlessSubprocVecEnv([make_snake_env(grid_size, grid_width, grid_height, snake_fov_radius) for _ in range(num_envs)])
     
     try:
         # Build DQN model with the sampled hyperparameters
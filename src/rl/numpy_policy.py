@@ -0,0 +1,392 @@
+"""
+rl/numpy_policy.py - Trained policies as plain NumPy: .npz export plus a torch-free forward pass.
+
+Playing or scoring a checkpoint used to mean PPO/DQN.load(): torch, the
+optimizer state, the whole SB3 model -- only to run predict() on a small
+MLP or SnakeCombinedExtractor CNN, at well over 100us per call at batch
+size 1, most of it torch's per-call overhead. export_policy() writes the
+part predict() actually needs -- the observation preprocessing, the layers'
+weights and, for DQN, the exploration rate -- to a small .npz next to the
+checkpoint (best_model_<t>.zip -> best_model_<t>.npz), and NumpyPolicy
+runs it again with nothing but NumPy:
+    - DQN: argmax over the Q-values; deterministic=False is SB3's
+      epsilon-greedy with the checkpoint's final exploration rate,
+    - PPO: argmax of the action logits, or a sample from their softmax.
+Supported: FLAT MlpPolicies in every observation encoding (SB3's one-hot
+for "standard", CompactFlatExtractor for "compact"/"packed") and GRID
+MultiInputPolicies with SnakeCombinedExtractor -- every policy
+train_model() builds. Anything else raises ValueError at export.
+
+NumpyPolicy has SB3's predict() signature and an observation_space, so
+test_model(), evaluate_model_performance() and rl.evaluation take it in
+place of a loaded model. Importing this module (and running a NumpyPolicy)
+doesn't import torch; only exporting needs a loaded SB3 model. Of those
+callers, test_model() and rl.evaluation.evaluate_scores()/play_engine()
+stay torch-free too. evaluate_model_performance() lives in rl/training.py,
+and make_eval_vec_env()'s SnakeVecEnv is an SB3 VecEnv; both import torch.
+
+train_model() exports both checkpoints at the end of every run; for older
+ones: python -m rl.numpy_policy (from src/) exports every discovered
+checkpoint that has no up-to-date .npz yet.
+
+Classes:
+    NumpyPolicy - NumPy-only predict() for an exported policy.
+
+Functions:
+    export_policy()     - Write a loaded model's policy to an .npz.
+    export_checkpoint() - Load a checkpoint .zip and export it next to itself.
+    export_all()        - Export every discovered checkpoint lacking an up-to-date .npz.
+    npz_path()          - The .npz path belonging to a checkpoint .zip.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+# Bumped whenever the .npz layout changes incompatibly
+FORMAT_VERSION = 1
+
+
+def npz_path(checkpoint_path) -> str:
+    """best_model_3000000.zip -> best_model_3000000.npz"""
+    return os.path.splitext(checkpoint_path)[0] + ".npz"
+
+
+# --- Export (needs the loaded SB3 model, but never imports torch itself) -----
+
+def _layers(module, prefix, arrays):
+    """[layer spec] for `module` (an nn.Sequential, or one layer), storing its
+    weights in `arrays` under `prefix`. Decided by class name, so exporting
+    doesn't import torch either."""
+    children = list(module) if type(module).__name__ == "Sequential" else [module]
+    layers = []
+    for index, layer in enumerate(children):
+        kind = type(layer).__name__
+        key = f"{prefix}.{index}"
+        if kind == "Linear":
+            arrays[f"{key}.weight"] = layer.weight.detach().cpu().numpy()
+            arrays[f"{key}.bias"] = layer.bias.detach().cpu().numpy()
+            layers.append({"op": "linear", "key": key})
+        elif kind == "Conv2d":
+            if layer.stride != (1, 1) or layer.dilation != (1, 1) or layer.groups != 1 or isinstance(layer.padding, str) \
+                    or layer.padding[0] != layer.padding[1]:
+                raise ValueError(f"Can't export {layer}: only stride 1, no dilation/groups, square numeric padding")
+            arrays[f"{key}.weight"] = layer.weight.detach().cpu().numpy()
+            arrays[f"{key}.bias"] = layer.bias.detach().cpu().numpy()
+            layers.append({"op": "conv2d", "key": key, "padding": layer.padding[0]})
+        elif kind in ("ReLU", "Tanh"):
+            layers.append({"op": kind.lower()})
+        elif kind == "Flatten":
+            layers.append({"op": "flatten"})
+        elif kind != "Identity":
+            raise ValueError(f"Can't export a {kind} layer")
+    return layers
+
+
+def _features(extractor, observation_space, arrays):
+    kind = type(extractor).__name__
+    if kind == "FlattenExtractor":
+        if not hasattr(observation_space, "nvec"):
+            raise ValueError("FlattenExtractor export expects a MultiDiscrete observation (FLAT, \"standard\" encoding)")
+        return {"type": "one_hot", "nvec": [int(n) for n in observation_space.nvec]}
+    if kind == "CompactFlatExtractor":
+        return {"type": "compact_flat", "n_cells": extractor.n_cells, "packed": extractor.packed}
+    if kind == "SnakeCombinedExtractor":
+        return {
+            "type": "snake_cnn",
+            "grid_encoding": extractor.grid_encoding,
+            "dir_nvec": [int(n) for n in observation_space["apple_dir"].nvec],
+            "cnn": _layers(extractor.cnn, "cnn", arrays),
+            "cnn_linear": _layers(extractor.cnn_linear, "cnn_linear", arrays),
+            "dir_linear": _layers(extractor.dir_linear, "dir_linear", arrays),
+        }
+    raise ValueError(f"Can't export a policy with a {kind}")
+
+
+def _fov_radius(features, observation_space):
+    """The FOV radius, from the observation layout (every encoding's cell
+    count is (2r+1)^2 - 1 for FLAT, (2r+1) per side for GRID)."""
+    if features["type"] == "snake_cnn":
+        side = observation_space["grid"].shape[-1] if features["grid_encoding"] == "standard" \
+            else observation_space["grid"].shape[0]
+    else:
+        n_cells = features["n_cells"] if features["type"] == "compact_flat" else len(features["nvec"]) - 2
+        side = int(round((n_cells + 1) ** 0.5))
+    return (side - 1) // 2
+
+
+def export_policy(model, path):
+    """
+    Write `model`'s (a loaded PPO/DQN, ApexDQN included) policy to `path`
+    (.npz): its layers' weights plus a JSON "spec" entry describing the
+    preprocessing, the layer order and the observation layout. Raises
+    ValueError for policies NumpyPolicy can't run.
+    """
+    from game.observations import observation_encoding
+
+    policy = model.policy
+    arrays = {}
+    if hasattr(policy, "q_net"):       # DQN
+        algo = "DQN"
+        features = _features(policy.q_net.features_extractor, model.observation_space, arrays)
+        head = _layers(policy.q_net.q_net, "head", arrays)
+    elif hasattr(policy, "action_net"):
+        algo = "PPO"
+        # pi_features_extractor is the shared extractor unless the policy was
+        # built with share_features_extractor=False
+        features = _features(policy.pi_features_extractor, model.observation_space, arrays)
+        head = _layers(policy.mlp_extractor.policy_net, "head", arrays)
+        head += _layers(policy.action_net, "action", arrays)
+    else:
+        raise ValueError(f"Can't export a {type(policy).__name__}")
+    spec = {
+        "format": FORMAT_VERSION,
+        "algo": algo,
+        "obs_mode": "grid" if features["type"] == "snake_cnn" else "flat",
+        "obs_encoding": observation_encoding(model.observation_space),
+        "snake_fov_radius": _fov_radius(features, model.observation_space),
+        "n_actions": int(model.action_space.n),
+        "num_timesteps": int(model.num_timesteps),
+        "exploration_rate": float(getattr(model, "exploration_rate", 0.0)),
+        "features": features,
+        "head": head,
+    }
+    # Written under a temporary name and renamed into place, so a reader
+    # never sees half an export
+    partial = path + ".partial.npz"
+    np.savez(partial, spec=np.array(json.dumps(spec)), **arrays)
+    os.replace(partial, path)
+
+
+def export_checkpoint(checkpoint_path) -> str:
+    """Load `checkpoint_path` (a PPO/DQN .zip) and export its policy to
+    npz_path(checkpoint_path). Returns that path."""
+    from stable_baselines3 import DQN, PPO
+    from stable_baselines3.common.save_util import load_from_zip_file
+    # Not referenced by name -- registers the "feature_extractors" alias old
+    # GRID checkpoints need (see rl/feature_extractors.py)
+    import rl.feature_extractors  # noqa: F401
+
+    # Which algorithm saved it: DQN checkpoints have an exploration schedule
+    data, _, _ = load_from_zip_file(checkpoint_path, load_data=True, device="cpu")
+    model_class = DQN if "exploration_rate" in data else PPO
+    model = model_class.load(checkpoint_path, device="cpu")
+    path = npz_path(checkpoint_path)
+    export_policy(model, path)
+    return path
+
+
+# --- NumPy forward pass ------------------------------------------------------
+
+def _one_hot(codes, nvec):
+    """SB3's MultiDiscrete preprocessing: each column one-hot encoded with
+    its own category count, all concatenated -- (B, k) -> (B, sum(nvec))."""
+    offsets = np.concatenate([[0], np.cumsum(nvec)[:-1]])
+    out = np.zeros((codes.shape[0], int(np.sum(nvec))), dtype=np.float32)
+    np.put_along_axis(out, codes.astype(np.int64) + offsets, 1.0, axis=1)
+    return out
+
+
+def _unpack_2bit(packed, n_values):
+    """Inverse of game.observations.pack_2bit(): (..., k) bytes -> (..., n_values) codes."""
+    codes = (packed[..., None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3
+    return codes.reshape(*packed.shape[:-1], -1)[..., :n_values]
+
+
+def _expand_grid(codes):
+    """Categorical (B, S, S) codes -> the "standard" one-hot grid, head
+    (center) cell all-zero (rl.feature_extractors.expand_grid()) -- channels-
+    last, (B, S, S, 4), as the convolutions here take it."""
+    side = codes.shape[-1]
+    one_hot = np.eye(4, dtype=np.float32)[codes.astype(np.int64)]
+    one_hot[:, side // 2, side // 2] = 0
+    return one_hot
+
+
+class _Conv2d:
+    """
+    Stride-1 convolution on channels-last (B, H, W, C) batches: the kh*kw
+    shifted views side by side along the channel axis, then one matrix
+    product. (Channels-first im2col over a sliding-window view was several
+    times slower: its reshape copies through a 6-D stride pattern.)
+    """
+
+    def __init__(self, weight, bias, padding):
+        out_channels, _, self.kh, self.kw = weight.shape
+        # (O, C, kh, kw) -> rows in (kh, kw, C) order, like the shifted views
+        self.matrix = np.ascontiguousarray(weight.transpose(2, 3, 1, 0).reshape(-1, out_channels))
+        self.bias = bias
+        self.padding = padding
+
+    def __call__(self, x):
+        p = self.padding
+        if p:
+            x = np.pad(x, ((0, 0), (p, p), (p, p), (0, 0)))
+        height, width = x.shape[1] - self.kh + 1, x.shape[2] - self.kw + 1
+        columns = np.concatenate([x[:, i:i + height, j:j + width] for i in range(self.kh) for j in range(self.kw)], axis=-1)
+        # As one 2-D product -- on the 4-D array, matmul would run one small
+        # product per (batch, row) instead
+        out = columns.reshape(-1, columns.shape[-1]) @ self.matrix + self.bias
+        return out.reshape(*columns.shape[:3], -1)
+
+
+def _build(layers, arrays):
+    """Layer specs -> a list of callables on float32 batches."""
+    ops = []
+    for layer in layers:
+        if layer["op"] == "linear":
+            weight_t = np.ascontiguousarray(arrays[f"{layer['key']}.weight"].T)
+            bias = arrays[f"{layer['key']}.bias"]
+            ops.append(lambda x, w=weight_t, b=bias: x @ w + b)
+        elif layer["op"] == "conv2d":
+            ops.append(_Conv2d(arrays[f"{layer['key']}.weight"], arrays[f"{layer['key']}.bias"], layer["padding"]))
+        elif layer["op"] == "relu":
+            ops.append(lambda x: np.maximum(x, 0))
+        elif layer["op"] == "tanh":
+            ops.append(np.tanh)
+        elif layer["op"] == "flatten":
+            # Convolutions run channels-last; torch flattens channels-first
+            ops.append(lambda x: (x.transpose(0, 3, 1, 2) if x.ndim == 4 else x).reshape(len(x), -1))
+    return ops
+
+
+def _run(ops, x):
+    for op in ops:
+        x = op(x)
+    return x
+
+
+class NumpyPolicy:
+    """
+    An exported policy (see export_policy()), run with NumPy only. Use
+    NumpyPolicy.load(path); predict() works like an SB3 model's.
+
+    Attributes: algo ("DQN"/"PPO"), obs_mode, obs_encoding, snake_fov_radius,
+    num_timesteps, exploration_rate (DQN), observation_space.
+    """
+
+    def __init__(self, spec, arrays, seed=None):
+        if spec.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported export format {spec.get('format')} (expected {FORMAT_VERSION})")
+        self.spec = spec
+        self.algo = spec["algo"]
+        self.obs_mode = spec["obs_mode"]
+        self.obs_encoding = spec["obs_encoding"]
+        self.snake_fov_radius = spec["snake_fov_radius"]
+        self.num_timesteps = spec["num_timesteps"]
+        self.exploration_rate = spec["exploration_rate"]
+        self.n_actions = spec["n_actions"]
+        self.rng = np.random.default_rng(seed)
+        self._observation_space = None
+
+        features = spec["features"]
+        self._features_type = features["type"]
+        if self._features_type == "one_hot":
+            self._nvec = np.array(features["nvec"])
+        elif self._features_type == "compact_flat":
+            self._n_cells, self._packed = features["n_cells"], features["packed"]
+        else:
+            self._grid_encoding = features["grid_encoding"]
+            self._dir_nvec = np.array(features["dir_nvec"])
+            self._cnn = _build(features["cnn"] + features["cnn_linear"], arrays)
+            self._dir = _build(features["dir_linear"], arrays)
+        self._head = _build(spec["head"], arrays)
+
+    @classmethod
+    def load(cls, path, seed=None) -> "NumpyPolicy":
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {key: data[key].astype(np.float32) for key in data.files if key != "spec"}
+            spec = json.loads(str(data["spec"]))
+        return cls(spec, arrays, seed)
+
+    @property
+    def observation_space(self):
+        """The gymnasium observation space the policy was trained on
+        (rebuilt from the export, for observation_encoding() and friends)."""
+        if self._observation_space is None:
+            from game.observations import observation_space
+            self._observation_space = observation_space(self.obs_mode, self.snake_fov_radius, self.obs_encoding)
+        return self._observation_space
+
+    def _feature_vector(self, obs):
+        if self._features_type == "one_hot":
+            return _one_hot(obs, self._nvec)
+        if self._features_type == "compact_flat":
+            codes = _unpack_2bit(obs, self._n_cells + 2) if self._packed else obs
+            codes = codes.astype(np.int64)
+            cells = np.eye(4, dtype=np.float32)[codes[:, :self._n_cells]].reshape(len(codes), -1)
+            apple_dir = np.eye(3, dtype=np.float32)[codes[:, self._n_cells:]].reshape(len(codes), -1)
+            return np.concatenate([cells, apple_dir], axis=1)
+        grid = obs["grid"]
+        if self._grid_encoding == "standard":
+            grid = grid.transpose(0, 2, 3, 1).astype(np.float32)
+        else:
+            if self._grid_encoding == "packed":
+                grid = _unpack_2bit(grid, grid.shape[-2])
+            grid = _expand_grid(grid)
+        apple_dir = _one_hot(obs["apple_dir"], self._dir_nvec)
+        return np.concatenate([_run(self._cnn, grid), _run(self._dir, apple_dir)], axis=1)
+
+    def forward(self, obs) -> np.ndarray:
+        """Q-values (DQN) or action logits (PPO) for a batch of observations."""
+        return _run(self._head, self._feature_vector(obs))
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=False):
+        """
+        Same contract as an SB3 model's predict(): one observation or a batch
+        of them (dict observations: a dict of arrays) -> (actions, None), a
+        scalar-shaped array for a single observation.
+        """
+        first = observation["grid"] if isinstance(observation, dict) else observation
+        space = self.observation_space["grid"] if isinstance(observation, dict) else self.observation_space
+        single = np.shape(first) == space.shape
+        if single:
+            observation = {key: np.asarray(value)[None] for key, value in observation.items()} \
+                if isinstance(observation, dict) else np.asarray(observation)[None]
+        batch = len(first) if not single else 1
+
+        if self.algo == "DQN" and not deterministic and self.rng.random() < self.exploration_rate:
+            # SB3's DQN.predict(): one draw decides for the whole batch
+            actions = self.rng.integers(0, self.n_actions, size=batch)
+        else:
+            out = self.forward(observation)
+            if deterministic or self.algo == "DQN":
+                actions = out.argmax(axis=1)
+            else:
+                probs = np.exp(out - out.max(axis=1, keepdims=True))
+                cumulative = np.cumsum(probs / probs.sum(axis=1, keepdims=True), axis=1)
+                actions = np.minimum((cumulative < self.rng.random((batch, 1))).sum(axis=1), self.n_actions - 1)
+        return (actions[0] if single else actions), None
+
+
+def export_all(force=False):
+    """Export every discovered checkpoint (best and last) whose .npz is
+    missing or older than the .zip. Returns [(checkpoint, exception)] for
+    the ones that failed."""
+    import glob
+
+    from ui.models import _discover_models
+
+    failures = []
+    for info in _discover_models():
+        for checkpoint in sorted(glob.glob(os.path.join(info["path"], "*_model_*.zip"))):
+            target = npz_path(checkpoint)
+            if not force and os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(checkpoint):
+                continue
+            try:
+                export_checkpoint(checkpoint)
+                print(f"  exported  {target}")
+            except Exception as exc:
+                print(f"  FAIL      {checkpoint}\n            {type(exc).__name__}: {exc}")
+                failures.append((checkpoint, exc))
+    return failures
+
+
+if __name__ == "__main__":
+    # python -m rl.numpy_policy [--force]
+    failures = export_all(force="--force" in sys.argv[1:])
+    if failures:
+        print(f"\n{len(failures)} checkpoint(s) failed to export.")
+        sys.exit(1)
@@ -5,12 +5,14 @@ Checkpoint directory convention:
     Training/SAVED_MODELS/{PPO,DQN}/{FLAT,GRID}/GRID_{w}_{h}/FOV_RADIUS_{r}/
         best_model_{timesteps}.zip
         last_model_{timesteps}.zip
+        best_model_{timesteps}.npz, last_model_{timesteps}.npz  (NumPy policy exports, see rl/numpy_policy.py)
         evaluation.json
         continue_markers.json
         best_score.json
         logs/tb_0/events.out.tfevents...       ("last" track -- the live, continuous one)
         logs/tb_best/events.out.tfevents...    (rebuilt snapshot of best_model's own history)
-        replay_buffer.pkl (DQN only)
+        replay_buffer/*.npy, replay_buffer/state.json (DQN only, see rl/replay_buffer.py)
+        replay_buffer.pkl (DQN only, legacy -- converted on the next continuation)
 """
 
 import os
@@ -74,14 +76,52 @@ def _write_best_score(path, mean_reward):
 
 
 def replay_buffer_path(path):
-    """Path to a DQN model's persisted replay buffer -- saved once at the end
-    of each successful run (rl.training.train_model()) and reloaded on
-    "Continue Existing" so continuing behaves like one uninterrupted run
-    instead of restarting with an empty buffer and a freshly-reset
-    exploration schedule."""
+    """Path to a DQN model's replay buffer as older versions persisted it --
+    one pickle written at the end of each successful run. No longer written;
+    train_model() converts it to replay_buffer_dir() on the next "Continue
+    Existing" and deletes it."""
     return os.path.join(path, "replay_buffer.pkl")
 
 
+def replay_buffer_dir(path):
+    """Folder of a DQN model's memory-mapped replay buffer (see
+    rl/replay_buffer.py) -- flushed at every PeriodicCheckpoint and at the
+    end of each successful run, and reopened on "Continue Existing" so
+    continuing behaves like one uninterrupted run instead of restarting
+    with an empty buffer and a freshly-reset exploration schedule."""
+    return os.path.join(path, "replay_buffer")
+
+
+def _backup_replay_buffer(path):
+    """Move an existing model's replay buffer aside before a "New Model" run
+    over the same folder starts its own, so a discarded run can put it back
+    (_restore_replay_buffer_backup) -- the same scheme as _backup_run_dir()."""
+    buffer_dir = replay_buffer_dir(path)
+    backup_dir = buffer_dir + ".bak"
+    if os.path.isdir(backup_dir):
+        shutil.rmtree(backup_dir)
+    if os.path.isdir(buffer_dir):
+        shutil.move(buffer_dir, backup_dir)
+
+
+def _restore_replay_buffer_backup(path):
+    """Undo _backup_replay_buffer(): delete the discarded run's buffer and
+    restore the previous one. Close the run's buffer (.close()) first."""
+    buffer_dir = replay_buffer_dir(path)
+    backup_dir = buffer_dir + ".bak"
+    if os.path.isdir(buffer_dir):
+        shutil.rmtree(buffer_dir)
+    if os.path.isdir(backup_dir):
+        shutil.move(backup_dir, buffer_dir)
+
+
+def _discard_replay_buffer_backup(path):
+    """Permanently discard a no-longer-needed buffer backup (the run succeeded)."""
+    backup_dir = replay_buffer_dir(path) + ".bak"
+    if os.path.isdir(backup_dir):
+        shutil.rmtree(backup_dir)
+
+
 def tb_run_dir(path):
     """The exact, deterministic tensorboard run directory model.learn()
     writes to for this model (see TB_RUN_NAME's docstring: always
@@ -230,12 +270,13 @@ def _finalize_checkpoint(path, prefix, total_timesteps):
     Rename path/{prefix}.zip (just written by model.save()/EvalCallback) to
     path/{prefix}_{total_timesteps}.zip, so the filename itself records how many
     timesteps the checkpoint was trained for. Replaces any stale checkpoint left
-    over from a previous training run under the same prefix.
+    over from a previous training run under the same prefix, and its NumPy
+    export (rl/numpy_policy.py) -- the new checkpoint gets its own.
     """
     plain_path = os.path.join(path, f"{prefix}.zip")
     if not os.path.exists(plain_path):
         return
-    for stale in glob.glob(os.path.join(path, f"{prefix}_*.zip")):
+    for stale in glob.glob(os.path.join(path, f"{prefix}_*.zip")) + glob.glob(os.path.join(path, f"{prefix}_*.npz")):
         os.remove(stale)
     os.rename(plain_path, os.path.join(path, f"{prefix}_{total_timesteps}.zip"))
 
@@ -0,0 +1,201 @@
+"""
+rl/placement.py - Pins the learner and the env workers to separate cores.
+
+Left alone, a training run's processes all compete for every core: torch
+sizes its intra-op thread pool to the whole machine, so each PPO/DQN update
+spreads over the cores the num_envs worker processes are stepping on, and
+the scheduler keeps preempting one for the other. CorePlacement splits the
+cores this process may use (os.sched_getaffinity(), so it stays inside a
+core set it was given, e.g. by rl/scheduler.py) into two disjoint sets:
+    learner: the training thread and the threads it starts from then on
+             (torch's pool included), with torch.set_num_threads() sized to it,
+    workers: the vec env's worker processes, one core each, round-robin.
+A "vector" env has no workers (every game is stepped in the learner's
+process), so the learner gets every core.
+
+It also measures how much the two sides still got in each other's way: the
+involuntary context switches (preempted while runnable) and the run-queue
+wait (runnable but not running) of the learner process's threads and of
+every worker, from /proc/<pid>/task/*/status and schedstat, between
+start() and stop(). train_model(cpu_placement="pin") prints that report
+and stores it in evaluation.json under "placement"; cpu_placement="measure"
+does the same without pinning anything, for a baseline to compare against.
+
+Linux only (sched_setaffinity and /proc); elsewhere nothing is pinned and
+the report is empty -- torch's thread count is still sized.
+
+Classes:
+    CorePlacement - Disjoint learner/worker core sets plus the contention report.
+"""
+
+import glob
+import os
+import time
+
+import torch
+
+
+def _available_cores():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _pin(pid, cores):
+    """Pin every thread of process `pid` to `cores` (a process's existing
+    threads don't follow a sched_setaffinity() of its main thread)."""
+    for task in glob.glob(f"/proc/{pid}/task/*"):
+        try:
+            os.sched_setaffinity(int(os.path.basename(task)), cores)
+        except (ProcessLookupError, PermissionError):
+            pass                       # Thread already gone
+
+
+def _sched_counters(pid):
+    """{thread id: {"involuntary", "voluntary" (context switches), "wait_ns"
+    (run-queue), "run_ns"}} for every thread of `pid`, or None if unreadable."""
+    tasks = glob.glob(f"/proc/{pid}/task/*")
+    if not tasks:
+        return None
+    counters = {}
+    for task in tasks:
+        stats = {"involuntary": 0, "voluntary": 0}
+        try:
+            with open(os.path.join(task, "status")) as file:
+                for line in file:
+                    if line.startswith("nonvoluntary_ctxt_switches:"):
+                        stats["involuntary"] = int(line.split()[1])
+                    elif line.startswith("voluntary_ctxt_switches:"):
+                        stats["voluntary"] = int(line.split()[1])
+            with open(os.path.join(task, "schedstat")) as file:
+                run_ns, wait_ns = file.read().split()[:2]
+        except (FileNotFoundError, ProcessLookupError, ValueError):
+            continue                   # Thread exited between listing and reading
+        stats["run_ns"], stats["wait_ns"] = int(run_ns), int(wait_ns)
+        counters[os.path.basename(task)] = stats
+    return counters
+
+
+def _delta(before, after):
+    """Summed per-thread growth between two _sched_counters() readings --
+    threads started in between count from zero (ones that exited in between
+    are lost with their counters)."""
+    if before is None or after is None:
+        return None
+    zero = {"involuntary": 0, "voluntary": 0, "run_ns": 0, "wait_ns": 0}
+    return {key: sum(stats[key] - before.get(tid, zero)[key] for tid, stats in after.items()) for key in zero}
+
+
+class CorePlacement:
+    """
+    Args:
+        num_envs:      Number of env worker processes (0 for a "vector" env).
+        learner_cores: Cores for the learner (default: what the workers leave,
+                       at least 1 -- all of them for num_envs=0).
+        pin:           If False, apply() changes nothing and only the
+                       contention is measured.
+    """
+
+    def __init__(self, num_envs, learner_cores=None, pin=True):
+        cores = _available_cores()
+        if num_envs == 0:
+            learner_count = len(cores)
+        else:
+            learner_count = learner_cores or max(1, len(cores) - num_envs)
+        learner_count = min(learner_count, len(cores))
+        self.learner_cores = cores[:learner_count]
+        # With a single core there's nothing to separate -- everyone shares it
+        self.worker_cores = cores[learner_count:] or cores
+        self.num_envs = num_envs
+        self.pin = pin
+        self.supported = hasattr(os, "sched_setaffinity") and os.path.isdir(f"/proc/{os.getpid()}/task")
+        self._worker_pids = []
+        self._saved = None             # (thread affinity, torch threads) to put back in restore()
+        self._start = None
+
+    def apply(self, vec_env=None):
+        """
+        Pin the calling (training) thread and, if given, `vec_env`'s worker
+        processes (its .processes), and size torch's thread pool to the
+        learner's cores. Call before training; restore() undoes it.
+        """
+        self._worker_pids = [process.pid for process in getattr(vec_env, "processes", [])]
+        if not self.pin:
+            return
+        self._saved = (os.sched_getaffinity(0) if self.supported else None, torch.get_num_threads())
+        torch.set_num_threads(len(self.learner_cores))
+        if not self.supported:
+            return
+        # Thread-level on Linux: only this thread and the ones it starts from
+        # now on (torch's pool included) move -- not e.g. the UI's threads
+        os.sched_setaffinity(0, self.learner_cores)
+        for index, pid in enumerate(self._worker_pids):
+            _pin(pid, [self.worker_cores[index % len(self.worker_cores)]])
+
+    def restore(self):
+        """Undo apply() for the calling thread (the worker processes go away
+        with their env anyway)."""
+        if self._saved is None:
+            return
+        affinity, torch_threads = self._saved
+        torch.set_num_threads(torch_threads)
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+        self._saved = None
+
+    def _snapshot(self):
+        return (time.perf_counter(), _sched_counters(os.getpid()),
+                [_sched_counters(pid) for pid in self._worker_pids])
+
+    def start(self):
+        """Begin measuring contention (after apply(), right before training)."""
+        self._start = self._snapshot() if self.supported else None
+
+    def stop(self) -> dict:
+        """
+        Contention since start() -- call while the worker processes are still
+        alive. Returns the placement ("pinned", core sets, "torch_threads")
+        plus "wall_time_s" and, per side ("learner", "workers"), involuntary/
+        voluntary context switches, run-queue wait and CPU time in seconds --
+        the learner's over all of this process's threads, the workers' summed
+        over all workers. Only the placement where /proc isn't available.
+        """
+        if self.pin:
+            report = {"pinned": True, "learner_cores": self.learner_cores,
+                      "worker_cores": self.worker_cores if self.num_envs else [], "torch_threads": len(self.learner_cores)}
+        else:
+            report = {"pinned": False, "torch_threads": torch.get_num_threads()}
+        if self._start is None:
+            return report
+        started, learner_before, workers_before = self._start
+        ended, learner_after, workers_after = self._snapshot()
+
+        def _side(delta):
+            if delta is None:
+                return None
+            return {"involuntary_ctx_switches": delta["involuntary"], "voluntary_ctx_switches": delta["voluntary"],
+                    "run_queue_wait_s": round(delta["wait_ns"] / 1e9, 3), "cpu_time_s": round(delta["run_ns"] / 1e9, 3)}
+
+        report["wall_time_s"] = round(ended - started, 3)
+        report["learner"] = _side(_delta(learner_before, learner_after))
+        worker_deltas = [d for d in map(_delta, workers_before, workers_after) if d is not None]
+        if worker_deltas:
+            report["workers"] = _side({key: sum(d[key] for d in worker_deltas) for key in worker_deltas[0]})
+        self._start = None
+        return report
+
+    @staticmethod
+    def format_report(report) -> str:
+        """One line per side, for the training log."""
+        if report["pinned"]:
+            lines = [f"Core placement: learner on {report['learner_cores']} ({report['torch_threads']} torch threads)"
+                     + (f", workers on {report['worker_cores']}" if report["worker_cores"] else "")]
+        else:
+            lines = [f"Core placement: not pinned ({report['torch_threads']} torch threads)"]
+        for side in ("learner", "workers"):
+            stats = report.get(side)
+            if stats:
+                lines.append(f"  {side}: {stats['involuntary_ctx_switches']:,} involuntary context switches, "
+                             f"{stats['run_queue_wait_s']:.2f}s run-queue wait, {stats['cpu_time_s']:.2f}s CPU "
+                             f"over {report['wall_time_s']:.1f}s")
+        return "\n".join(lines)
@@ -0,0 +1,276 @@
+"""
+rl/planning.py - Search on top of a trained policy, for watching it play.
+
+Planner picks each move by searching ahead from the live game instead of
+taking the policy's action as is. It runs the search on its own headless
+SnakeGameEnvironment copies, moved to the live game's state with
+SnakeGameEnvironment.snapshot()/restore() (an O(length) copy of a few
+hundred bytes). It never re-creates or deep-copies a game. Two modes:
+
+    "lookahead" - Try every legal move, then let the policy play on
+                  greedily for up to `depth` steps in each branch. All
+                  branches step in lockstep with one batched forward pass
+                  per ply. Score each branch by its discounted apples, a
+                  death penalty, and the model's value estimate at the
+                  end. Take the best.
+    "mcts"      - PUCT Monte Carlo tree search. The model's policy is the
+                  prior (a softmax over Q-values for DQN) and its value
+                  estimate scores the leaves. Each round descends
+                  `mcts_batch` paths at once, kept apart by a virtual loss.
+                  It then expands every leaf reached: all their legal
+                  moves are stepped and evaluated in one batched forward
+                  pass. On CPU a batch costs about the same as a single
+                  observation. Tree depth is capped at `depth`. Take the
+                  most visited root move.
+
+Both stop when the per-move time budget runs out. Whatever they have by
+then decides the move, and with no finished search that falls back to the
+policy's own choice. That keeps search-augmented playback at the chosen
+fps. The global `random` (which places apples) is swapped for a
+planner-owned seed during search. The search can't peek at where the live
+game's next apple will land, and the live game's apple sequence stays
+untouched.
+
+Classes:
+    Planner - Lookahead / MCTS action selection over a trained SB3 model.
+"""
+
+import math
+import random
+import time
+
+import numpy as np
+import torch
+from stable_baselines3 import DQN
+
+from game.environment import SnakeGameEnvironment
+from game.snake_core import Direction
+
+PLANNING_MODES = ("lookahead", "mcts")
+
+# Action index -> Direction, as in SnakeGameEnvironment.action_to_direction
+_ACTIONS = (Direction.RIGHT, Direction.DOWN, Direction.LEFT, Direction.UP)
+
+
+def _legal_mask(direction):
+    """The env ignores a 180-degree reversal (it keeps going straight), so
+    that action is just a duplicate of "forward" -- masked out of the search."""
+    return np.array([a != direction.opposite() for a in _ACTIONS])
+
+
+def _stack(observations):
+    if isinstance(observations[0], dict):
+        return {key: np.stack([obs[key] for obs in observations]) for key in observations[0]}
+    return np.stack(observations)
+
+
+class _Node:
+    """MCTS node: one game state, its (masked) priors and per-action stats."""
+
+    __slots__ = ("snapshot", "priors", "value", "visits", "value_sum", "children", "rewards", "expanded")
+
+    def __init__(self, snapshot, priors, value):
+        self.snapshot = snapshot       # None for a terminal (dead) state
+        self.priors = priors
+        self.value = value
+        self.visits = np.zeros(4)
+        self.value_sum = np.zeros(4)
+        self.children = {}
+        self.rewards = {}
+        self.expanded = False
+
+
+class Planner:
+    """
+    Args:
+        model:          Trained PPO or DQN model (SB3).
+        env:            The live environment being watched (any wrapper).
+        mode:           "lookahead" or "mcts" (see module docstring).
+        depth:          Lookahead rollout length / maximum MCTS tree depth.
+        time_budget_ms: Search time per move.
+        death_value:    Return assigned to dying (the eval env gives no
+                        death penalty of its own).
+        c_puct:         MCTS exploration constant.
+        mcts_batch:     MCTS paths descended (and leaves expanded) per forward pass.
+        dqn_temperature: Softmax temperature turning DQN Q-values into priors.
+        seed:           Seed for the apples placed inside the search.
+    """
+
+    def __init__(self, model, env, mode="mcts", depth=8, time_budget_ms=15.0, death_value=-10.0,
+                 c_puct=1.5, mcts_batch=4, dqn_temperature=0.1, seed=None):
+        assert mode in PLANNING_MODES
+        self.model = model
+        self.mode = mode
+        self.depth = depth
+        self.time_budget = time_budget_ms / 1000.0
+        self.death_value = death_value
+        self.c_puct = c_puct
+        self.mcts_batch = mcts_batch
+        self.dqn_temperature = dqn_temperature
+        self.gamma = float(getattr(model, "gamma", 0.99))
+        self._rng = random.Random(seed)
+
+        base = env.unwrapped
+        # One headless search env per lookahead branch (at most 3 legal moves)
+        self.sims = [
+            SnakeGameEnvironment(base.grid_size, base.grid_width, base.grid_height, base.snake_fov_radius,
+                                 training=False, obs_mode=base.obs_mode, obs_encoding=base.obs_encoding)
+            for _ in range(3 if mode == "lookahead" else 1)
+        ]
+        for sim in self.sims:
+            sim.reset()
+
+        self.last_stats = {}           # What the last plan() call got done, for display/debugging
+
+    # --- Model queries -------------------------------------------------------
+
+    def _evaluate(self, observations):
+        """(priors (B, 4), values (B,)) for a list of observations, in one
+        forward pass."""
+        policy = self.model.policy
+        obs_tensor, _ = policy.obs_to_tensor(_stack(observations))
+        with torch.no_grad():
+            if isinstance(self.model, DQN):
+                q_values = policy.q_net(obs_tensor)
+                priors = torch.softmax(q_values / self.dqn_temperature, dim=1)
+                values = q_values.max(dim=1).values
+            else:
+                priors = policy.get_distribution(obs_tensor).distribution.probs
+                values = policy.predict_values(obs_tensor).flatten()
+        return priors.cpu().numpy(), values.cpu().numpy()
+
+    # --- Entry point ---------------------------------------------------------
+
+    def plan(self, env, observation) -> int:
+        """
+        Pick an action for the live env's current state.
+
+        Args:
+            env:         The live environment (any wrapper); only read.
+            observation: Its current observation (what model.predict() would get).
+        """
+        base = env.unwrapped
+        root = base.snapshot()
+        deadline = time.perf_counter() + self.time_budget
+
+        live_random = random.getstate()
+        random.seed(self._rng.getrandbits(64))
+        try:
+            priors, value = self._evaluate([observation])
+            if self.mode == "lookahead":
+                return self._lookahead(root, priors[0], deadline)
+            return self._mcts(root, priors[0], value[0], deadline)
+        finally:
+            random.setstate(live_random)
+
+    # --- N-step lookahead ----------------------------------------------------
+
+    def _lookahead(self, root, root_priors, deadline):
+        actions = np.flatnonzero(_legal_mask(root.dir))
+        returns = np.zeros(len(actions))
+        alive = np.ones(len(actions), dtype=bool)
+        observations = [None] * len(actions)
+
+        for i, action in enumerate(actions):
+            sim = self.sims[i]
+            sim.restore(root)
+            observations[i], reward, terminated, _, _ = sim.step(np.array(action))
+            returns[i] += reward
+            if terminated:
+                returns[i] += self.death_value
+                alive[i] = False
+
+        discount, plies = 1.0, 1
+        while plies < self.depth and alive.any() and time.perf_counter() < deadline:
+            live = np.flatnonzero(alive)
+            priors, _ = self._evaluate([observations[i] for i in live])
+            discount *= self.gamma
+            for i, probs in zip(live, priors):
+                sim = self.sims[i]
+                action = int(np.argmax(np.where(_legal_mask(sim.dir), probs, -1.0)))
+                observations[i], reward, terminated, _, _ = sim.step(np.array(action))
+                returns[i] += discount * reward
+                if terminated:
+                    returns[i] += discount * self.death_value
+                    alive[i] = False
+            plies += 1
+
+        live = np.flatnonzero(alive)
+        if len(live):
+            _, values = self._evaluate([observations[i] for i in live])
+            returns[live] += discount * self.gamma * values
+
+        self.last_stats = {"plies": plies, "returns": dict(zip(actions.tolist(), returns.tolist()))}
+        # Ties (e.g. every branch dies) go to the policy's own preference
+        best = max(range(len(actions)), key=lambda i: (returns[i], root_priors[actions[i]]))
+        return int(actions[best])
+
+    # --- MCTS ----------------------------------------------------------------
+
+    def _masked(self, priors, direction):
+        priors = np.where(_legal_mask(direction), priors, 0.0)
+        total = priors.sum()
+        return priors / total if total > 0 else _legal_mask(direction) / 3.0
+
+    def _select(self, node):
+        n_total = node.visits.sum()
+        q = np.where(node.visits > 0, node.value_sum / np.maximum(node.visits, 1), node.value)
+        scores = q + self.c_puct * node.priors * math.sqrt(n_total + 1) / (1 + node.visits)
+        scores[node.priors == 0] = -np.inf
+        return int(np.argmax(scores))
+
+    def _expand(self, nodes):
+        """Create every legal child of each node: one env step each from the
+        node's snapshot, then a single batched evaluation of all survivors."""
+        sim = self.sims[0]
+        pending, observations = [], []
+        for node in nodes:
+            for action in np.flatnonzero(node.priors > 0).tolist():
+                sim.restore(node.snapshot)
+                observation, reward, terminated, _, _ = sim.step(np.array(action))
+                if terminated:
+                    node.children[action] = _Node(None, None, 0.0)
+                    node.rewards[action] = reward + self.death_value
+                else:
+                    pending.append((node, action, reward, sim.snapshot()))
+                    observations.append(observation)
+            node.expanded = True
+        if observations:
+            priors, values = self._evaluate(observations)
+            for (node, action, reward, snapshot), probs, value in zip(pending, priors, values):
+                node.children[action] = _Node(snapshot, self._masked(probs, snapshot.dir), float(value))
+                node.rewards[action] = reward
+
+    def _mcts(self, root_state, root_priors, root_value, deadline):
+        root = _Node(root_state, self._masked(root_priors, root_state.dir), float(root_value))
+        simulations = 0
+
+        while time.perf_counter() < deadline:
+            paths, leaves = [], {}
+            for _ in range(self.mcts_batch):
+                node, path = root, []
+                while node.expanded and node.snapshot is not None and len(path) < self.depth:
+                    action = self._select(node)
+                    path.append((node, action))
+                    # Virtual loss: the next descent of this round sees this
+                    # edge as visited and bad, so it tries another path
+                    node.visits[action] += 1
+                    node.value_sum[action] -= 1.0
+                    node = node.children[action]
+                if not node.expanded and node.snapshot is not None and len(path) < self.depth:
+                    leaves[id(node)] = node
+                paths.append((path, node))
+            self._expand(list(leaves.values()))
+
+            for path, leaf in paths:
+                leaf_value = leaf.value
+                for parent, action in reversed(path):
+                    leaf_value = parent.rewards[action] + self.gamma * leaf_value
+                    parent.value_sum[action] += 1.0 + leaf_value     # undo the virtual loss, add the real return
+                simulations += 1
+
+        self.last_stats = {"simulations": simulations, "visits": root.visits.tolist()}
+        if not root.visits.any():
+            return int(np.argmax(root.priors))
+        # Most visited, ties broken by prior
+        return int(max(range(4), key=lambda a: (root.visits[a], root.priors[a])))
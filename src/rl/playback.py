@@ -3,27 +3,45 @@ rl/playback.py - Playing/watching the Snake game (human play and trained-model p
 
 Functions:
     play_game():          Play Snake yourself with WASD controls.
-    test_model():          Load a saved model and watch it play visually.
+    test_model():          Load a saved model and watch it play visually (optionally
+                           with lookahead/MCTS search on top, see rl/planning.py),
+                           through its NumPy export when there is one (no torch),
+                           or through an int8-quantized policy.
     test_environment():    Manually play the environment via terminal input (debugging tool).
 """
 
 import os
+from functools import lru_cache
+
 import numpy as np
 
-from game.snake_game import SnakeGame, Direction, draw_hud, COLOR_BACKGROUND, COLOR_SCORE_TEXT, COLOR_SCORE_PANEL
+from game.snake_game import SnakeGame, Direction, hud_sprites, COLOR_BACKGROUND, COLOR_SCORE_TEXT, COLOR_SCORE_PANEL
+from game.dirty_rects import DirtyRectRenderer
+from game import render_cache
 from game.environment import make_snake_env
+from game.observations import observation_encoding
 from game.game_over import run_game_over
 from rl.paths import GRID_SIZE, PPO_PATH, DQN_PATH, _find_checkpoint
-# Not referenced by name below -- importing it registers the "feature_extractors"
-# sys.modules alias (see rl/feature_extractors.py) needed to unpickle GRID-mode
-# checkpoints saved before the package refactor, before any PPO/DQN.load() runs.
-import rl.feature_extractors  # noqa: F401
+from rl.numpy_policy import NumpyPolicy, npz_path
 
 import pygame
-from stable_baselines3 import PPO, DQN
 
 
-def test_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius=1, use_cnn=False, fps=None, deterministic=True):
+def _load_sb3_model(model_name, load_path):
+    """The full SB3 model -- imported here, not at the top, so playback
+    through a NumPy export never imports torch."""
+    from stable_baselines3 import PPO, DQN
+    # Not referenced by name below -- importing it registers the "feature_extractors"
+    # sys.modules alias (see rl/feature_extractors.py) needed to unpickle GRID-mode
+    # checkpoints saved before the package refactor, before any PPO/DQN.load() runs.
+    import rl.feature_extractors  # noqa: F401
+
+    model_class = DQN if model_name == "DQN" else PPO
+    return model_class.load(load_path, device="cpu")
+
+
+def test_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius=1, use_cnn=False, fps=None, deterministic=True, dirty_rects=True,
+               planning=None, planning_depth=8, planning_budget_ms=None, runtime="auto"):
     """
     Load a trained model and watch it play in a Pygame window.
 
@@ -39,6 +57,24 @@ def test_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius
         deterministic:    If True (default), always pick the greedy action. If False,
                           sample from the policy's action distribution instead (matches
                           the "stochastic" evaluation mode in evaluate_model_performance()).
+        dirty_rects:      Update only the changed parts of the window each redraw
+                          (see game/dirty_rects.py) instead of redrawing and
+                          flipping all of it. Looks the same; far cheaper on big
+                          boards at high fps.
+        planning:         None (default) plays the policy's own actions. "lookahead"
+                          or "mcts" picks each move by searching ahead from the
+                          live game over the policy's priors/values instead (see
+                          rl/planning.py); `deterministic` is ignored then.
+        planning_depth:   Lookahead rollout length / maximum MCTS tree depth.
+        planning_budget_ms: Search time per move. Defaults to half a frame
+                          (500/fps ms), so playback keeps roughly its speed.
+        runtime:          "auto" (default) plays through the checkpoint's NumPy
+                          export (best_model_<t>.npz, see rl/numpy_policy.py) if
+                          there is one and no planning is asked for, else loads
+                          the SB3 model; "numpy" requires the export, "torch"
+                          always loads the SB3 model, "int8" loads it and plays
+                          through an int8 copy of its policy (see
+                          rl/quantization.py).
 
     Controls while watching: 'f' toggles a debug overlay showing the FOV the
     model observes and an arrow for the apple-direction observation. When the
@@ -48,22 +84,40 @@ def test_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius
     obs_mode = "grid" if use_cnn else "flat"
     obs_mode_dir = "GRID" if use_cnn else "FLAT"
 
-    # Create environment with human rendering (opens Pygame window)
-    env = make_snake_env(GRID_SIZE, grid_width, grid_height, snake_fov_radius, "human", training=False, obs_mode=obs_mode, render_fps=fps)()
-
-    model_class = DQN if model_name == "DQN" else PPO
+    assert runtime in ("auto", "numpy", "torch", "int8")
     base_path = DQN_PATH if model_name == "DQN" else PPO_PATH
     checkpoint_dir = os.path.join(base_path, obs_mode_dir, f"GRID_{grid_width}_{grid_height}", f"FOV_RADIUS_{snake_fov_radius}")
     load_path = _find_checkpoint(checkpoint_dir, "best_model")
+    # The planner searches with the policy's values and priors -- SB3 only
+    use_numpy = runtime == "numpy" or (runtime == "auto" and planning is None and os.path.exists(npz_path(load_path)))
+    if use_numpy:
+        if planning is not None:
+            raise ValueError("planning needs the SB3 model (runtime=\"torch\" or \"auto\")")
+        load_path = npz_path(load_path)
+        if not os.path.exists(load_path):
+            raise FileNotFoundError(f"No NumPy export {load_path} -- run python -m rl.numpy_policy to create it")
     try:
-        model = model_class.load(load_path, env, device="cpu")
+        model = NumpyPolicy.load(load_path) if use_numpy else _load_sb3_model(model_name, load_path)
     except Exception as exc:
         # Bare exceptions from .load() (e.g. a ModuleNotFoundError from an old
         # checkpoint's pickled class references -- see rl/feature_extractors.py)
         # give no clue *which* checkpoint failed once this reaches the UI's log
         # box (SubScreen._start_background just prints str(exc)) -- add the path.
         raise RuntimeError(f"Failed to load checkpoint {load_path}: {exc}") from exc
-    if model_name == "PPO":
+    if runtime == "int8":
+        from rl.quantization import quantize_model
+        model = quantize_model(model)
+    # Create environment with human rendering (opens Pygame window), in
+    # whichever observation encoding the model was trained on.
+    env = make_snake_env(GRID_SIZE, grid_width, grid_height, snake_fov_radius, "human", training=False, obs_mode=obs_mode,
+                         render_fps=fps, obs_encoding=observation_encoding(model.observation_space),
+                         dirty_rects=dirty_rects)()
+
+    if use_numpy:
+        print(f"Successfully loaded {model_name} Model ({model.num_timesteps} timesteps, NumPy runtime)\n[from Path: {load_path}]")
+    elif runtime == "int8":
+        print(f"Successfully loaded {model_name} Model ({model.num_timesteps} timesteps, int8 policy)\n[from Path: {load_path}]")
+    elif model_name == "PPO":
         print(f"Successfully loaded PPO Model ({model._total_timesteps} total_timesteps)\n[from Path: {load_path}]")
 
     # Monitor -> SnakeGameEnvironment: the base env owns screen/clock/snakeGame,
@@ -71,13 +125,22 @@ def test_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius
     base = env.unwrapped
     final_score = 0
 
+    planner = None
+    if planning is not None:
+        from rl.planning import Planner
+        budget_ms = planning_budget_ms if planning_budget_ms is not None else 500.0 / base.render_fps
+        planner = Planner(model, env, mode=planning, depth=planning_depth, time_budget_ms=budget_ms)
+
     try:
         while True:  # restart loop -- exits via break, either branch below
             obs, info = env.reset()
             done = False
             try:
                 while not done:
-                    action, _ = model.predict(obs, deterministic=deterministic)
+                    if planner is not None:
+                        action = np.array(planner.plan(env, obs))
+                    else:
+                        action, _ = model.predict(obs, deterministic=deterministic)
                     obs, reward, terminated, truncated, info = env.step(action)
                     done = terminated or truncated
             except SystemExit:
@@ -131,27 +194,34 @@ def test_environment(grid_width=30, grid_height=20, snake_fov_radius=1):
         env.close()
 
 
-def _draw_press_to_start(screen, font):
+@lru_cache(maxsize=4)
+def _press_to_start_surfaces(font):
+    text = font.render("Press W / A / S / D to start", True, COLOR_SCORE_TEXT)
+    padding = 16
+    panel = pygame.Surface((text.get_width() + 2 * padding, text.get_height() + 2 * padding), pygame.SRCALPHA)
+    r, g, b, _ = COLOR_SCORE_PANEL
+    pygame.draw.rect(panel, pygame.Color(r, g, b, 210), panel.get_rect(), border_radius=12)
+    return panel, text, padding
+
+
+def _press_to_start_sprites(screen, font):
     """
     Overlay shown until the first WASD press. Without this, the snake started
     moving RIGHT the instant the window opened -- a player who hadn't even
     located the window yet could lose a life to the wall before ever pressing
     a key. Styled like draw_hud()'s score panel for visual consistency.
+    Returned as (key, surface, topleft) sprites like hud_sprites(), built once
+    per font.
     """
-    text = font.render("Press W / A / S / D to start", True, COLOR_SCORE_TEXT)
-    padding = 16
-    panel_rect = pygame.Rect(0, 0, text.get_width() + 2 * padding, text.get_height() + 2 * padding)
-    panel_rect.center = screen.get_rect().center
+    panel, text, padding = _press_to_start_surfaces(font)
+    panel_rect = panel.get_rect(center=screen.get_rect().center)
+    return [
+        (("press_to_start_panel",), panel, panel_rect.topleft),
+        (("press_to_start_text",), text, (panel_rect.x + padding, panel_rect.y + padding)),
+    ]
 
-    panel = pygame.Surface(panel_rect.size, pygame.SRCALPHA)
-    r, g, b, _ = COLOR_SCORE_PANEL
-    pygame.draw.rect(panel, pygame.Color(r, g, b, 210), panel.get_rect(), border_radius=12)
 
-    screen.blit(panel, panel_rect.topleft)
-    screen.blit(text, (panel_rect.x + padding, panel_rect.y + padding))
-
-
-def play_game(grid_width=30, grid_height=20, fps=10):
+def play_game(grid_width=30, grid_height=20, fps=10, dirty_rects=True):
     """
     Play Snake yourself in a Pygame window.
 
@@ -159,11 +229,15 @@ def play_game(grid_width=30, grid_height=20, fps=10):
     (with a "press to start" prompt) until the first directional key is
     pressed. When it dies, a game-over overlay offers Restart (a fresh game
     in the same window) or Quit; ESC or closing the window quits directly.
+
+    With dirty_rects (default), each redraw only repaints and updates the
+    parts of the window that changed (see game/dirty_rects.py).
     """
     pygame.init()
     font = pygame.font.Font(None, 45)
     screen = pygame.display.set_mode((GRID_SIZE * grid_width, GRID_SIZE * grid_height))
     clock = pygame.time.Clock()
+    renderer = DirtyRectRenderer(screen, GRID_SIZE, grid_width, grid_height) if dirty_rects else None
 
     def _poll_quit():
         """Handle quit events (window close or ESC key). Returns True if the
@@ -176,17 +250,24 @@ def play_game(grid_width=30, grid_height=20, fps=10):
         return False
 
     def _draw_frame(game, started):
+        overlays = hud_sprites(font, game.score)
+        if not started:
+            overlays += _press_to_start_sprites(screen, font)
+        if renderer is not None:
+            pygame.display.update(renderer.draw(game, overlays))
+            return
         screen.fill(COLOR_BACKGROUND)
         game.draw(screen)
-        draw_hud(screen, font, game.score)
-        if not started:
-            _draw_press_to_start(screen, font)
+        for _, sprite, topleft in overlays:
+            screen.blit(sprite, topleft)
         pygame.display.flip()
 
     final_score = 0
     while True:  # restart loop -- exits via break, either branch below
         direction = Direction.RIGHT
         game = SnakeGame(GRID_SIZE, grid_width, grid_height)
+        if renderer is not None:
+            renderer.invalidate()      # new game; the game-over overlay is still on screen
         started = False
         died = False
         user_quit = False
@@ -258,4 +339,5 @@ def play_game(grid_width=30, grid_height=20, fps=10):
         # else "restart": loop continues, a fresh game starts in the same window
 
     pygame.quit()
+    render_cache.clear()
     print(f"Ended with Score: {final_score}")
@@ -0,0 +1,200 @@
+"""
+rl/quantization.py - Dynamic int8 quantization of loaded policies, and how far to trust it.
+
+Scoring many checkpoints is mostly CPU inference: one policy forward pass
+per evaluation tick. quantize_model() gives a loaded DQN/PPO model a copy of
+its policy with every nn.Linear swapped for torch's dynamically quantized
+int8 version (weights stored as int8, activations quantized on the fly per
+call): the MLP layers of FLAT policies, and SnakeCombinedExtractor's
+cnn_linear/dir_linear plus the heads on top of it for GRID ones.
+SnakeCombinedExtractor's two Conv2d layers stay float -- torch's dynamic
+quantization only covers Linear (and recurrent) layers; quantizing the convs
+would need static quantization with calibration data. The original model is
+left untouched.
+
+Int8 rounding can flip the odd near-tie between two actions, and one flipped
+action early in an episode sends the rest of it somewhere else, so a
+quantized model's scores are only worth using after checking them against
+the float model's. agreement_report() does that over a fixed set of seeds
+(each seed = one set of games with the same apple sequence for both):
+    - action match: how often the int8 policy picks the float policy's
+      deterministic action, over every observation the float policy sees,
+    - score delta: int8 minus float mean deterministic score, per seed and
+      overall (the int8 games are replayed on their own from the same seeds),
+    - the mean predict() time of each, at the evaluation's batch size.
+Whether int8 is actually faster depends on the CPU and the layer sizes --
+for the small default MLPs, quantizing the activations each call can cost
+more than the int8 matmul saves -- which is why the report measures it
+instead of assuming it. (Recent torch versions warn once that their
+quantized tensor types are deprecated; they still work.)
+
+evaluate_model_performance(quantized=True) and test_model(runtime="int8")
+use quantize_model(). For every discovered checkpoint at once (from src/):
+    python -m rl.quantization [episodes_per_seed]
+
+Functions:
+    quantize_model()          - Copy of a loaded model with an int8 policy.
+    agreement_report()        - Action match, score delta and latency, int8 vs. float.
+    report_all()              - agreement_report() for every discovered checkpoint.
+    format_agreement_report() - One line summarizing a report.
+"""
+
+import copy
+import sys
+import time
+
+import numpy as np
+import torch
+from torch import nn
+
+from game.observations import observation_encoding
+from rl.evaluation import make_eval_vec_env, play_batched
+
+# Fixed, so reports from different runs/checkpoints are over the same games
+DEFAULT_SEEDS = (0, 1, 2, 3, 4)
+
+
+def quantize_model(model):
+    """
+    A shallow copy of the loaded SB3 `model` whose policy is a dynamically
+    int8-quantized deep copy of model.policy (nn.Linear layers only -- see
+    the module docstring). predict() keeps working as before, including
+    DQN's epsilon-greedy exploration for deterministic=False. Inference only:
+    the copy can't be trained further.
+    """
+    if not hasattr(model, "policy"):
+        raise TypeError(f"Can only quantize a loaded SB3 model, not {type(model).__name__}")
+    policy = copy.deepcopy(model.policy)
+    policy.set_training_mode(False)
+    torch.ao.quantization.quantize_dynamic(policy, {nn.Linear}, dtype=torch.qint8, inplace=True)
+    quantized = copy.copy(model)
+    quantized.policy = policy
+    if hasattr(policy, "q_net"):
+        # DQN keeps its own references to the policy's networks
+        quantized.q_net, quantized.q_net_target = policy.q_net, policy.q_net_target
+    return quantized
+
+
+class _PairedPolicy:
+    """predict() returning the float model's deterministic actions, while
+    recording whether the int8 model would have picked the same ones, and
+    how long each took."""
+
+    def __init__(self, model, quantized):
+        self.model = model
+        self.quantized = quantized
+        self.matches = 0
+        self.decisions = 0
+        self.calls = 0
+        self.model_s = 0.0
+        self.quantized_s = 0.0
+
+    def predict(self, observation, state=None, episode_start=None, deterministic=True):
+        start = time.perf_counter()
+        actions, _ = self.model.predict(observation, deterministic=True)
+        middle = time.perf_counter()
+        quantized_actions, _ = self.quantized.predict(observation, deterministic=True)
+        self.model_s += middle - start
+        self.quantized_s += time.perf_counter() - middle
+        self.matches += int(np.sum(actions == quantized_actions))
+        self.decisions += len(actions)
+        self.calls += 1
+        return actions, None
+
+
+def agreement_report(model, grid_width, grid_height, snake_fov_radius, obs_mode="flat", quantized=None,
+                     seeds=DEFAULT_SEEDS, n_episodes=16) -> dict:
+    """
+    Compare `quantized` (default: quantize_model(model)) with the float
+    `model` over n_episodes deterministic episodes per seed in `seeds`.
+
+    Returns:
+        {"action_match": share of the float policy's decisions the int8 one
+         agrees with, "decisions": how many, "float_mean_score",
+         "int8_mean_score", "score_delta": int8 - float, "per_seed": [{"seed",
+         "float_mean_score", "int8_mean_score", "score_delta"}, ...],
+         "float_predict_ms", "int8_predict_ms": mean predict() time at batch
+         size n_episodes}
+    """
+    if quantized is None:
+        quantized = quantize_model(model)
+    encoding = observation_encoding(model.observation_space)
+    paired = _PairedPolicy(model, quantized)
+    per_seed = []
+    for seed in seeds:
+        # The float games (with the int8 policy shadowing every decision) and
+        # the int8 games start from the same seed, i.e. the same apples
+        env = make_eval_vec_env(n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode,
+                                obs_encoding=encoding, seed=seed)
+        float_scores, _ = play_batched(paired, env, n_episodes, deterministic=True)
+        env.close()
+        env = make_eval_vec_env(n_episodes, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode,
+                                obs_encoding=encoding, seed=seed)
+        int8_scores, _ = play_batched(quantized, env, n_episodes, deterministic=True)
+        env.close()
+        per_seed.append({"seed": seed, "float_mean_score": float(np.mean(float_scores)),
+                         "int8_mean_score": float(np.mean(int8_scores)),
+                         "score_delta": float(np.mean(int8_scores) - np.mean(float_scores))})
+
+    float_mean = float(np.mean([entry["float_mean_score"] for entry in per_seed]))
+    int8_mean = float(np.mean([entry["int8_mean_score"] for entry in per_seed]))
+    return {
+        "action_match": paired.matches / max(paired.decisions, 1),
+        "decisions": paired.decisions,
+        "float_mean_score": float_mean,
+        "int8_mean_score": int8_mean,
+        "score_delta": int8_mean - float_mean,
+        "per_seed": per_seed,
+        "float_predict_ms": paired.model_s / max(paired.calls, 1) * 1000,
+        "int8_predict_ms": paired.quantized_s / max(paired.calls, 1) * 1000,
+    }
+
+
+def format_agreement_report(report) -> str:
+    """One line, e.g. for the check's console output."""
+    worst = min(report["per_seed"], key=lambda entry: entry["score_delta"])
+    return (f"action match {report['action_match']:.2%} over {report['decisions']:,} decisions, "
+            f"mean score {report['float_mean_score']:.2f} -> {report['int8_mean_score']:.2f} "
+            f"({report['score_delta']:+.2f}; worst seed {worst['seed']}: {worst['score_delta']:+.2f}), "
+            f"predict {report['float_predict_ms']:.2f} -> {report['int8_predict_ms']:.2f} ms")
+
+
+def report_all(n_episodes=16, seeds=DEFAULT_SEEDS) -> list:
+    """
+    agreement_report() for every checkpoint _discover_models() finds (its
+    best checkpoint if one exists, else its last), printed as it goes.
+    Returns [(info, checkpoint_path, report)]; a checkpoint that fails to
+    load is printed and skipped (see rl/check_models.py for those).
+    """
+    from stable_baselines3 import DQN, PPO
+
+    from ui.models import _discover_models
+    from rl.paths import _find_checkpoint
+    # Not referenced by name below -- importing it registers the "feature_extractors"
+    # sys.modules alias (see rl/feature_extractors.py) needed to unpickle GRID-mode
+    # checkpoints saved before the package refactor, before any .load() runs.
+    import rl.feature_extractors  # noqa: F401
+
+    models = _discover_models()
+    print(f"Comparing int8 against float for {len(models)} discovered model configuration(s), "
+          f"{n_episodes} episodes x seeds {list(seeds)}...")
+    results = []
+    for info in models:
+        prefix = "best_model" if info["best_timesteps"] is not None else "last_model"
+        label = f"{info['algo']} {info['obs_mode']} {info['grid_width']}x{info['grid_height']} FOV{info['fov']} ({prefix})"
+        checkpoint_path = _find_checkpoint(info["path"], prefix)
+        try:
+            model = (DQN if info["algo"] == "DQN" else PPO).load(checkpoint_path, device="cpu")
+        except Exception as exc:
+            print(f"  SKIP  {label}: {type(exc).__name__}: {exc}")
+            continue
+        report = agreement_report(model, info["grid_width"], info["grid_height"], info["fov"],
+                                  obs_mode="grid" if info["obs_mode"] == "GRID" else "flat",
+                                  seeds=seeds, n_episodes=n_episodes)
+        print(f"  {label}: {format_agreement_report(report)}")
+        results.append((info, checkpoint_path, report))
+    return results
+
+
+if __name__ == "__main__":
+    report_all(int(sys.argv[1]) if len(sys.argv) > 1 else 16)
@@ -0,0 +1,450 @@
+"""
+rl/replay_buffer.py - DQN replay buffer stored in memory-mapped files in the model folder.
+
+SB3's ReplayBuffer keeps its arrays in RAM, and the only way to persist it
+is model.save_replay_buffer(): one pickle of the whole thing (~1.5-2GB for
+the default 2M transitions). That was too slow to do from
+PeriodicCheckpoint, so it only happened at the natural end of a run -- a
+crash always lost the buffer -- and every "Continue Existing" had to
+unpickle the whole file again before training could start.
+
+Here the buffer's arrays are np.memmap views of .npy files in
+replay_buffer_dir(path) (one file per array, plus state.json with the
+write position). Writing a transition is an ordinary array assignment, as
+before; flush() then syncs only the rows added since the previous flush to
+disk and records the position, which costs about as much as writing those
+rows -- cheap enough to do at every PeriodicCheckpoint. Continuing a model
+just maps the files again, without reading them.
+
+state.json is replaced (atomically) only after its rows are on disk, so a
+crash leaves the buffer as of the last flush: the rows it counts are valid.
+Rows written after that flush may already have reached the files too --
+past the recorded position they are simply overwritten again; in a full
+buffer they replaced older transitions, which only makes those slots a
+little newer than the checkpoint. That holds because each of these rows is
+a whole transition on its own. TrajectoryReplayBuffer's aren't (see below),
+so it also stamps every row with a serial number that tells which opening
+of the files wrote it, and when.
+
+The buffer isn't set through DQN(replay_buffer_class=...): that class and
+its arguments would be saved into the checkpoint, and every later
+DQN.load() (test_model, playback, ...) would open the buffer files too.
+train_model() swaps it in with attach_memmap_replay_buffer() instead, so
+checkpoints still record SB3's plain ReplayBuffer.
+
+TrajectoryReplayBuffer (same storage) doesn't store observations at all.
+A FOV observation is a function of the game state, and consecutive steps
+of a game share almost all of theirs: the body is just the path the head
+took. So each transition keeps only the head cell, apple cell, occupied
+cell count and step-in-episode of the states before and after it (plus
+action/reward/done): ~25 bytes whatever the FOV radius (plus an 8-byte
+serial per row of n_envs transitions), against ~2KB for
+a FOV-5 "standard" FLAT transition (122 int64 values, twice). sample()
+rebuilds the body of every sampled state from the head cells of the rows
+before it in the same env column (the starting snake's cells before the
+episode's first step), and game.vector_engine.VectorSnakeEngine.observe_states()
+turns the batch into observations in one scatter/gather pass. The states
+come from the training env itself (SnakeVecEnv.record_states), so this
+needs train_model(vec_env="vector").
+
+Those rows only describe the body if they really are the steps before it
+in the same game. After a crash, or revert() of a discarded run, the buffer
+goes back to an older write position, while rows written past it stay in
+the files and the next run overwrites only some of them. Their neighbours
+may then come from another run, and the position alone can't show it. So
+every row gets a serial number: the files' generation (state.json counts
+how often they were opened) in the high bits, the add() count within that
+generation in the low bits. A transition is only sampled if each row
+k steps back along its body has exactly its own serial minus k. That also
+covers history already overwritten by the ring. check_replay_buffer.py
+replays that scenario.
+
+Classes:
+    MemmapReplayBuffer     - ReplayBuffer (flat observations) over memory-mapped .npy files.
+    MemmapDictReplayBuffer - DictReplayBuffer (grid + apple_dir observations), same storage.
+    TrajectoryReplayBuffer - Compact game states per transition, observations rebuilt on sample.
+
+Functions:
+    attach_memmap_replay_buffer() - Replace a DQN model's in-RAM buffer with a memory-mapped one.
+"""
+
+import json
+import mmap
+import os
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.buffers import BaseBuffer, DictReplayBuffer, ReplayBuffer
+from stable_baselines3.common.type_aliases import DictReplayBufferSamples, ReplayBufferSamples
+
+STATE_FILE = "state.json"
+
+# The buffer arrays SB3 allocates (next_observations is None with
+# optimize_memory_usage); dict observations get one file per key
+_ARRAYS = ("observations", "next_observations", "actions", "rewards", "dones", "timeouts")
+# TrajectoryReplayBuffer's: the state before (head, apple, occupied cells,
+# steps into the episode) and after each transition, action, reward, flags
+_TRAJECTORY_ARRAYS = ("heads", "apples", "n_body", "steps", "next_heads", "next_apples", "next_n_body",
+                      "actions", "rewards", "dones", "timeouts", "serials")
+# A row's serial: (generation << _SERIAL_BITS) + its add() count in that generation
+_SERIAL_BITS = 40
+
+
+def _get_array(buffer, name):
+    attribute, _, key = name.partition(".")
+    value = getattr(buffer, attribute)
+    return value[key] if key else value
+
+
+def _flush_rows(array, start, stop):
+    """Sync rows [start, stop) of a memmap to disk (msync of just that byte
+    range, page-aligned as mmap.flush() requires)."""
+    mapped = getattr(array, "_mmap", None)
+    if mapped is None:                 # Not file-backed the usual way -- sync it all
+        array.flush()
+        return
+    row_bytes = array.strides[0]
+    data_start = array.offset % mmap.ALLOCATIONGRANULARITY   # np.memmap maps from an aligned offset before the data
+    begin = data_start + start * row_bytes
+    end = data_start + stop * row_bytes
+    aligned = begin - begin % mmap.PAGESIZE
+    mapped.flush(aligned, end - aligned)
+
+
+class _MemmapStorage:
+    """
+    The memmap handling shared by the buffer classes below (listed first in their
+    bases, so add() here wraps SB3's). Their __init__ lets SB3 build the
+    buffer as usual -- its np.zeros() arrays are never touched, so the OS
+    doesn't actually commit memory for them -- and then calls _attach().
+    _memmap_arrays names the array attributes to keep in files.
+    """
+
+    _memmap_arrays = _ARRAYS
+
+    def _attach(self, storage_dir):
+        self.storage_dir = storage_dir
+        self._dirty_rows = 0           # add() calls since the last flush()
+        os.makedirs(storage_dir, exist_ok=True)
+
+        state = self._read_state()
+        arrays = self._open(resume=state is not None)
+        if arrays is None:
+            # Missing or from another configuration (e.g. a different
+            # num_envs reshapes every array) -- start empty, like SB3 would
+            if state is not None:
+                print(f"Replay buffer in {storage_dir} doesn't match this model's configuration -- starting with an empty buffer.")
+            state = None
+            arrays = self._open(resume=False)
+            # Files of a different buffer kind that used this folder before
+            for name in os.listdir(storage_dir):
+                if name.endswith(".npy") and name[:-len(".npy")] not in arrays:
+                    os.remove(os.path.join(storage_dir, name))
+        # The buffer code indexes plain ndarray views (np.memmap's own
+        # __getitem__ adds Python overhead to every sample()); flush() needs
+        # the memmaps themselves
+        self._memmaps = arrays
+        for name, array in arrays.items():
+            self._set_array(name, array.view(np.ndarray))
+
+        # Every opening of the files is a new generation, recorded before
+        # anything is written, so rows of a run that crashed before its
+        # first flush can't share a generation with the next run's
+        self.generation = (state or {}).get("generation", 0) + 1
+        self._serial = self.generation << _SERIAL_BITS
+        if state is None:
+            self.pos, self.full = 0, False
+            self._write_state(timestep=0)
+            state = self._read_state()
+        else:
+            self.pos, self.full = state["pos"], state["full"]
+            self._write_state(state=dict(state, generation=self.generation))
+        self._opened_state = state
+
+    def _names(self):
+        for attribute in self._memmap_arrays:
+            value = getattr(self, attribute)
+            if isinstance(value, dict):
+                yield from (f"{attribute}.{key}" for key in value)
+            elif value is not None:
+                yield attribute
+
+    def _set_array(self, name, array):
+        attribute, _, key = name.partition(".")
+        if key:
+            getattr(self, attribute)[key] = array
+        else:
+            setattr(self, attribute, array)
+
+    def _open(self, resume):
+        """{name: memmap} for every buffer array -- the existing files when
+        resuming (None if any is missing or has the wrong shape/dtype),
+        otherwise new zero-filled (sparse) files."""
+        arrays = {}
+        for name in self._names():
+            template = _get_array(self, name)
+            file = os.path.join(self.storage_dir, f"{name}.npy")
+            if resume:
+                if not os.path.exists(file):
+                    return None
+                array = np.lib.format.open_memmap(file, mode="r+")
+                if array.shape != template.shape or array.dtype != template.dtype:
+                    return None
+            else:
+                array = np.lib.format.open_memmap(file, mode="w+", dtype=template.dtype, shape=template.shape)
+            arrays[name] = array
+        return arrays
+
+    def _read_state(self):
+        state_path = os.path.join(self.storage_dir, STATE_FILE)
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path) as file:
+            return json.load(file)
+
+    def _state(self, timestep=None):
+        return {"pos": int(self.pos), "full": bool(self.full), "transitions": int(self.size() * self.n_envs), "timestep": timestep,
+                "generation": self.generation}
+
+    def _write_state(self, timestep=None, state=None):
+        if state is None:
+            state = self._state(timestep)
+        state_path = os.path.join(self.storage_dir, STATE_FILE)
+        with open(state_path + ".tmp", "w") as file:
+            json.dump(state, file)
+        os.replace(state_path + ".tmp", state_path)
+
+    def add(self, *args, **kwargs) -> None:
+        super().add(*args, **kwargs)
+        self._dirty_rows += 1
+
+    def flush(self, timestep=None, record=True):
+        """Sync the rows added since the last flush to disk, then record the
+        write position (and `timestep`, the model's num_timesteps, for
+        reference). With record=False the position is only returned, for
+        record_state() to write once something else that has to be on disk
+        first is (PeriodicCheckpoint: the checkpoint it goes with)."""
+        rows = min(self._dirty_rows, self.buffer_size)
+        if rows:
+            start = (self.pos - rows) % self.buffer_size
+            if start + rows <= self.buffer_size:
+                spans = [(start, start + rows)]
+            else:                      # Wrapped around the end of the ring
+                spans = [(start, self.buffer_size), (0, self.pos)]
+            for array in self._memmaps.values():
+                for lo, hi in spans:
+                    _flush_rows(array, lo, hi)
+        self._dirty_rows = 0
+        state = self._state(timestep)
+        if record:
+            self._write_state(state=state)
+        return state
+
+    def record_state(self, state):
+        """Record a position flush(record=False) returned. Only touches
+        state.json, so it can run on another thread (CheckpointWriter's)
+        while training goes on."""
+        self._write_state(state=state)
+
+    def adopt(self, other) -> bool:
+        """Copy a same-shaped in-RAM buffer (a legacy replay_buffer.pkl,
+        see rl.paths.replay_buffer_path()) into the files and flush it.
+        Returns False, copying nothing, if the shapes don't match."""
+        if any(getattr(other, name.partition(".")[0], None) is None for name in self._names()):
+            return False
+        if any(_get_array(other, name).shape != _get_array(self, name).shape for name in self._names()):
+            return False
+        for name in self._names():
+            _get_array(self, name)[:] = _get_array(other, name)
+        self.pos, self.full = other.pos, other.full
+        self._dirty_rows = self.buffer_size
+        self.flush()
+        return True
+
+    def revert(self):
+        """Put state.json back to how it was when the buffer was opened, for
+        a discarded run. Transitions the run wrote into a full buffer stay
+        (overwriting them back isn't possible without a copy of the whole
+        buffer); in a buffer that wasn't full yet, they're past the restored
+        position and will just be overwritten. The generation isn't put
+        back: the next opening must not reuse this run's."""
+        self._write_state(state=dict(self._opened_state, generation=self.generation))
+
+    def close(self):
+        """Drop the memory maps (e.g. before deleting the files)."""
+        for name in list(self._names()):
+            self._set_array(name, None)
+        self._memmaps = {}
+
+
+class MemmapReplayBuffer(_MemmapStorage, ReplayBuffer):
+    """ReplayBuffer whose arrays live in storage_dir (see the module docstring)."""
+
+    def __init__(self, storage_dir, buffer_size, observation_space, action_space, device="auto", n_envs=1,
+                 optimize_memory_usage=False, handle_timeout_termination=True):
+        super().__init__(buffer_size, observation_space, action_space, device=device, n_envs=n_envs,
+                         optimize_memory_usage=optimize_memory_usage, handle_timeout_termination=handle_timeout_termination)
+        self._attach(storage_dir)
+
+
+class MemmapDictReplayBuffer(_MemmapStorage, DictReplayBuffer):
+    """DictReplayBuffer whose arrays live in storage_dir (see the module docstring)."""
+
+    def __init__(self, storage_dir, buffer_size, observation_space, action_space, device="auto", n_envs=1,
+                 optimize_memory_usage=False, handle_timeout_termination=True):
+        super().__init__(buffer_size, observation_space, action_space, device=device, n_envs=n_envs,
+                         optimize_memory_usage=optimize_memory_usage, handle_timeout_termination=handle_timeout_termination)
+        self._attach(storage_dir)
+
+
+class _TrajectoryBuffer(BaseBuffer):
+    """TrajectoryReplayBuffer's add()/sample() over in-RAM arrays (see the
+    module docstring); the class below adds the file storage."""
+
+    def __init__(self, buffer_size, observation_space, action_space, vec_env, device="auto", n_envs=1,
+                 handle_timeout_termination=True):
+        super().__init__(max(buffer_size // n_envs, 1), observation_space, action_space, device=device, n_envs=n_envs)
+        self.handle_timeout_termination = handle_timeout_termination
+        self.engine = vec_env.engine
+        self._vec_env = vec_env
+        vec_env.record_states = True
+        # The starting snake's cells behind its head, nearest first: the body
+        # "path" before an episode's first step
+        self._start_path = self.engine.start_body[-2::-1]
+
+        cell = np.int16 if self.engine.cells.shape[1] < 2**15 else np.int32
+        shape = (self.buffer_size, self.n_envs)
+        for name in ("heads", "apples", "next_heads", "next_apples"):
+            setattr(self, name, np.zeros(shape, dtype=cell))
+        self.n_body = np.zeros(shape, dtype=np.uint16)
+        self.next_n_body = np.zeros(shape, dtype=np.uint16)
+        self.steps = np.zeros(shape, dtype=np.uint32)
+        self.actions = np.zeros(shape, dtype=np.uint8)
+        self.rewards = np.zeros(shape, dtype=np.float32)
+        self.dones = np.zeros(shape, dtype=np.uint8)
+        self.timeouts = np.zeros(shape, dtype=np.uint8)
+        # Which run wrote each row, and when (see the module docstring); 0 =
+        # never written
+        self.serials = np.zeros(self.buffer_size, dtype=np.uint64)
+        self._serial = 1 << _SERIAL_BITS
+
+    def add(self, obs, next_obs, action, reward, done, infos) -> None:
+        # obs/next_obs aren't stored: the env's states describe them
+        prev, after = self._vec_env.prev_states, self._vec_env.next_states
+        pos = self.pos
+        self.heads[pos], self.apples[pos], self.n_body[pos], self.steps[pos] = prev
+        self.next_heads[pos], self.next_apples[pos], self.next_n_body[pos] = after[:3]
+        self.actions[pos] = np.asarray(action).reshape(self.n_envs)
+        self.rewards[pos] = reward
+        self.dones[pos] = done
+        if self.handle_timeout_termination:
+            self.timeouts[pos] = [info.get("TimeLimit.truncated", False) for info in infos]
+        self.serials[pos] = self._serial
+        self._serial += 1
+        self.pos += 1
+        if self.pos == self.buffer_size:
+            self.full = True
+            self.pos = 0
+
+    def _history_ok(self, rows, envs) -> np.ndarray:
+        """Whether every row a transition's bodies need (the head path back
+        to its episode's start or its tail, whichever is nearer) is still the
+        one written right before it: not overwritten by newer rows of the
+        ring, nor left over from another run (see the module docstring)."""
+        steps = self.steps[rows, envs].astype(np.int64)
+        depth = np.maximum(
+            np.minimum(self.n_body[rows, envs].astype(np.int64) - 1, steps),            # rows r-1, r-2, ...
+            np.minimum(self.next_n_body[rows, envs].astype(np.int64) - 1, steps + 1) - 1,  # rows r, r-1, ...
+        )
+        serials = self.serials[rows].astype(np.int64)
+        ok = serials != 0
+        k = np.arange(1, max(int(depth.max(initial=0)), 0) + 1)
+        if len(k):
+            back = self.serials[(rows[:, None] - k) % self.buffer_size].astype(np.int64)
+            ok &= ((back == serials[:, None] - k) | (k > depth[:, None])).all(axis=1)
+        return ok
+
+    def sample(self, batch_size, env=None):
+        upper_bound = self.buffer_size if self.full else self.pos
+        rows = np.random.randint(0, upper_bound, size=batch_size)
+        envs = np.random.randint(0, self.n_envs, size=batch_size)
+        # Redraw the (few) transitions right after the ring's write position
+        # whose body history has been overwritten
+        redraw = ~self._history_ok(rows, envs)
+        while redraw.any():
+            rows[redraw] = np.random.randint(0, upper_bound, size=int(redraw.sum()))
+            envs[redraw] = np.random.randint(0, self.n_envs, size=int(redraw.sum()))
+            redraw[redraw] = ~self._history_ok(rows[redraw], envs[redraw])
+        return self._get_samples(rows, envs)
+
+    def _get_samples(self, rows, envs, env=None):
+        # Both states of every transition in one batch: the state before it
+        # continues from row r-1's head backwards, the one after from row r's
+        steps = self.steps[rows, envs].astype(np.int64)
+        heads = np.concatenate([self.heads[rows, envs], self.next_heads[rows, envs]]).astype(np.int64)
+        apples = np.concatenate([self.apples[rows, envs], self.next_apples[rows, envs]]).astype(np.int64)
+        n_rest = np.concatenate([self.n_body[rows, envs], self.next_n_body[rows, envs]]).astype(np.int64) - 1
+        last_row = np.concatenate([rows - 1, rows])
+        path_steps = np.concatenate([steps, steps + 1])
+        envs2 = np.concatenate([envs, envs])
+
+        k = np.arange(max(int(n_rest.max()), 1))[None, :]
+        path = self.heads[(last_row[:, None] - k) % self.buffer_size, envs2[:, None]]
+        start = self._start_path[np.clip(k - path_steps[:, None], 0, len(self._start_path) - 1)]
+        segments = np.where(k < path_steps[:, None], path, start).astype(np.int64)
+        obs = self.engine.observe_states(heads, apples, segments, n_rest)
+
+        n = len(rows)
+        if isinstance(obs, dict):
+            space = self.observation_space
+            observations = {key: self.to_torch(value[:n].astype(space[key].dtype)) for key, value in obs.items()}
+            next_observations = {key: self.to_torch(value[n:].astype(space[key].dtype)) for key, value in obs.items()}
+            samples_class = DictReplayBufferSamples
+        else:
+            obs = obs.astype(self.observation_space.dtype)
+            observations, next_observations = self.to_torch(obs[:n]), self.to_torch(obs[n:])
+            samples_class = ReplayBufferSamples
+        actions = self.to_torch(self.actions[rows, envs].astype(np.int64).reshape(-1, 1))
+        dones = self.to_torch((self.dones[rows, envs] * (1 - self.timeouts[rows, envs])).astype(np.float32).reshape(-1, 1))
+        rewards = self.to_torch(self.rewards[rows, envs].reshape(-1, 1))
+        return samples_class(observations, actions, next_observations, dones, rewards)
+
+
+class TrajectoryReplayBuffer(_MemmapStorage, _TrajectoryBuffer):
+    """
+    Replay buffer of compact game states, observations regenerated on
+    sample() (see the module docstring). `vec_env` must be the training
+    rl.vec_env.SnakeVecEnv: the buffer reads each step's states from it.
+    """
+
+    _memmap_arrays = _TRAJECTORY_ARRAYS
+
+    def __init__(self, storage_dir, buffer_size, observation_space, action_space, vec_env, device="auto", n_envs=1,
+                 handle_timeout_termination=True):
+        super().__init__(buffer_size, observation_space, action_space, vec_env, device=device, n_envs=n_envs,
+                         handle_timeout_termination=handle_timeout_termination)
+        self._attach(storage_dir)
+
+
+def attach_memmap_replay_buffer(model, storage_dir, trajectories=False):
+    """
+    Give a DQN model (freshly built or just loaded) a memory-mapped replay
+    buffer in storage_dir, with the same size/spaces/n_envs/options as the
+    in-RAM one SB3 set up -- a TrajectoryReplayBuffer with `trajectories`
+    (model.env must then be a SnakeVecEnv). Existing files that match are
+    resumed as they were at their last flush -- check .size() to tell.
+    Returns the buffer.
+    """
+    if trajectories:
+        model.replay_buffer = TrajectoryReplayBuffer(
+            storage_dir, model.buffer_size, model.observation_space, model.action_space, model.env,
+            device=model.device, n_envs=model.n_envs,
+            handle_timeout_termination=(model.replay_buffer_kwargs or {}).get("handle_timeout_termination", True),
+        )
+        return model.replay_buffer
+    buffer_class = MemmapDictReplayBuffer if isinstance(model.observation_space, spaces.Dict) else MemmapReplayBuffer
+    model.replay_buffer = buffer_class(
+        storage_dir, model.buffer_size, model.observation_space, model.action_space, device=model.device,
+        n_envs=model.n_envs, optimize_memory_usage=model.optimize_memory_usage, **(model.replay_buffer_kwargs or {}),
+    )
+    return model.replay_buffer
@@ -0,0 +1,541 @@
+"""
+rl/scheduler.py - Headless queue of training runs, several at a time.
+
+train_model() trains one configuration (algorithm, obs mode, grid, FOV) and
+the UI runs one of them at a time. This module takes a queue of them and
+runs as many at once as a global CPU-core budget allows, each in its own
+process, writing into the usual
+Training/SAVED_MODELS/{ALGO}/{OBS}/GRID_w_h/FOV_RADIUS_r folders -- so the
+Models/Test Model screens list the results like any UI-trained model.
+
+Core budget:
+    Every job takes `cores` cores of the budget while it runs (its own
+    setting, or a default derived from num_envs/vec_env -- see _plan()). For
+    the process-based vec envs ("subproc"/"shared") they're split between
+    the env workers and the learner's torch threads (num_envs = cores - 1
+    unless given, torch threads = whatever num_envs leaves, at least 1); a
+    "vector" env steps every game in the learner's process, so all of them
+    go to torch. With apex_actors (rl/apex.py) every actor process takes a
+    core and the learner the rest. async_eval's evaluator process counts as
+    one more core.
+    On Linux, when the budget fits the cores this process may use, each job
+    process is also pinned to its own `cores` of them, so jobs don't share
+    cores either (and a job with cpu_placement="pin", see rl/placement.py,
+    splits its learner/worker cores within that set).
+    Jobs start in queue order; a job that doesn't fit yet lets smaller ones
+    behind it start first. Two jobs writing into the same model folder never
+    run at once, and always run in queue order (e.g. "new" before a
+    "continue" of it).
+
+Queue state:
+    The queue is one JSON file (default Training/SCHEDULER/queue.json),
+    rewritten atomically whenever a job changes state. Every change to it
+    (`add`, `retry`, each scheduling pass of `run`) is one read-modify-write
+    under an exclusive lock on queue.json.lock, so none of them can
+    overwrite another's. Ctrl+C stops every
+    running job the way the UI's "Cancel & Save Last Model" does (its last
+    model is saved and evaluated), records how many timesteps it got
+    through, and leaves it queued -- the next `run` continues it from its
+    last model for the timesteps it still had left. A job whose process
+    died without getting that far (killed, power loss) is simply started
+    over from the checkpoint it started from the first time. Jobs `add`ed,
+    and failed jobs `retry`d, while `run` is going are picked up.
+
+Each attempt's output goes to Training/SCHEDULER/logs/job_{id}.log.
+
+Usage:
+    python -m rl.scheduler add DQN FLAT 30x20 3 --timesteps 3000000 [--cores 4] [--continue last] ...
+    python -m rl.scheduler add --file jobs.json     (a list of train_model() keyword dicts)
+    python -m rl.scheduler run [--cores N]
+    python -m rl.scheduler status
+    python -m rl.scheduler retry                    (failed jobs back to pending)
+
+Functions:
+    add_jobs():  Append job configurations to a queue file.
+    run_queue(): Run a queue file's pending jobs under a core budget.
+"""
+
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing as mp
+import os
+import re
+import signal
+import sys
+import time
+from datetime import datetime
+
+from rl.paths import PPO_PATH, DQN_PATH, best_score_path
+
+try:
+    import fcntl
+except ImportError:                    # Windows
+    fcntl = None
+    import msvcrt
+
+SCHEDULER_PATH = os.path.join("Training", "SCHEDULER")
+QUEUE_PATH = os.path.join(SCHEDULER_PATH, "queue.json")
+
+# The train_model() arguments a job may set (everything else is UI-only:
+# callbacks, events, live frames)
+JOB_ARGS = ("model_name", "grid_width", "grid_height", "snake_fov_radius", "timesteps", "num_envs", "new", "best",
+            "params", "use_tuned_params", "use_cnn", "vec_env", "obs_encoding", "detect_cycles", "async_eval",
+            "trajectory_replay", "async_checkpoints", "cpu_placement", "learner_cores",
+            "apex_actors", "plateau_min_improvement")
+
+# A job's cores when it sets neither `cores` nor `num_envs`
+DEFAULT_JOB_CORES = 4
+
+# Seconds between scheduling passes
+POLL_INTERVAL = 1.0
+
+
+def _model_dir(config):
+    """The checkpoint folder a job trains into (same layout as train_model())."""
+    base = DQN_PATH if config["model_name"] == "DQN" else PPO_PATH
+    return os.path.join(base, "GRID" if config.get("use_cnn") else "FLAT",
+                        f"GRID_{config['grid_width']}_{config['grid_height']}", f"FOV_RADIUS_{config['snake_fov_radius']}")
+
+
+def _checkpoint_timesteps(path, prefix):
+    """Timestep count baked into path/{prefix}_{timesteps}.zip, or None."""
+    for match in glob.glob(os.path.join(path, f"{prefix}_*.zip")):
+        found = re.match(rf"{prefix}_(\d+)\.zip$", os.path.basename(match))
+        if found:
+            return int(found.group(1))
+    return None
+
+
+def _plan(config, budget):
+    """
+    (cores, num_envs, torch_threads) for a job -- how much of the budget it
+    takes and how train_model() should use it (see the module docstring).
+    """
+    vec_env = config.get("vec_env", "subproc")
+    extra = 1 if config.get("async_eval") else 0
+    num_envs = config.get("num_envs")
+    cores = config.get("cores")
+    actors = config.get("apex_actors") or 0
+    if actors:
+        cores = max(1, min(cores or actors + 1 + extra, budget))
+        return cores, num_envs or 4 * actors, max(1, cores - actors - extra)
+    if cores is None:
+        cores = DEFAULT_JOB_CORES if num_envs is None or vec_env == "vector" else num_envs + 1 + extra
+    cores = max(1, min(cores, budget))
+    if vec_env == "vector":
+        return cores, num_envs or 4, max(1, cores - extra)
+    if num_envs is None:
+        num_envs = max(1, cores - 1 - extra)
+    return cores, num_envs, max(1, cores - num_envs - extra)
+
+
+def _describe(job):
+    config = job["config"]
+    obs = "GRID" if config.get("use_cnn") else "FLAT"
+    mode = "new" if config.get("new", True) else f"continue {'best' if config.get('best', True) else 'last'}"
+    return (f"#{job['id']} {config['model_name']} {obs} {config['grid_width']}x{config['grid_height']} "
+            f"FOV{config['snake_fov_radius']} {config['timesteps']:,} steps ({mode})")
+
+
+# --- Queue file -------------------------------------------------------------
+
+def _read_queue(queue_path):
+    if not os.path.exists(queue_path):
+        return {"next_id": 1, "jobs": []}
+    with open(queue_path) as file:
+        return json.load(file)
+
+
+def _write_queue(queue_path, queue):
+    # Write-then-rename, so an interrupted write never leaves a truncated queue
+    os.makedirs(os.path.dirname(queue_path) or ".", exist_ok=True)
+    tmp_path = queue_path + ".tmp"
+    with open(tmp_path, "w") as file:
+        json.dump(queue, file, indent=4)
+    os.replace(tmp_path, queue_path)
+
+
+@contextlib.contextmanager
+def _locked(queue_path):
+    """
+    Exclusive access to the queue file for one read-modify-write. The lock is
+    on a separate queue.json.lock: _write_queue() replaces queue.json itself,
+    and a lock on the replaced file would no longer exclude anyone.
+    """
+    os.makedirs(os.path.dirname(queue_path) or ".", exist_ok=True)
+    with open(queue_path + ".lock", "a+") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            lock.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:        # LK_LOCK gives up after ~10s -- keep waiting
+                    pass
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            else:
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def add_jobs(configs, queue_path=QUEUE_PATH):
+    """
+    Append jobs to the queue file (created if missing). Each config is a dict
+    of train_model() keyword arguments (JOB_ARGS; model_name, grid_width,
+    grid_height, snake_fov_radius and timesteps required), optionally with
+    "cores". Returns the new jobs' ids.
+    """
+    for config in configs:
+        unknown = set(config) - set(JOB_ARGS) - {"cores"}
+        if unknown:
+            raise ValueError(f"Unknown job setting(s): {', '.join(sorted(unknown))}")
+        missing = {"model_name", "grid_width", "grid_height", "snake_fov_radius", "timesteps"} - set(config)
+        if missing:
+            raise ValueError(f"Job is missing: {', '.join(sorted(missing))}")
+        if config["model_name"] not in ("DQN", "PPO"):
+            raise ValueError(f"model_name must be DQN or PPO, not {config['model_name']!r}")
+    with _locked(queue_path):
+        queue = _read_queue(queue_path)
+        ids = [_append_job(queue, config) for config in configs]
+        _write_queue(queue_path, queue)
+    return ids
+
+
+def _append_job(queue, config):
+    """Add one (validated) job to the in-memory `queue`; returns its id."""
+    job = {
+        "id": queue["next_id"],
+        "config": dict(config),
+        "status": "pending",           # pending | running | done | failed
+        "trained": 0,                  # Timesteps completed by interrupted attempts
+        "resume": False,               # Next attempt continues from this job's own last model
+        "attempts": 0,
+        "error": None,
+        "result": None,
+    }
+    queue["next_id"] += 1
+    queue["jobs"].append(job)
+    return job["id"]
+
+
+# --- Job process ------------------------------------------------------------
+
+def _run_job(config, num_envs, torch_threads, core_ids, log_path, cancel_event, results):
+    """
+    Job process: train_model() with its output going to log_path, then send
+    (status, timesteps trained, result or error) to `results`. Ctrl+C is left
+    to the scheduler, which cancels jobs through cancel_event instead.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(os, "setpgrp"):
+        # Out of the terminal's process group, so a Ctrl+C doesn't also reach
+        # this job's env worker processes (which don't ignore it)
+        os.setpgrp()
+    if core_ids:
+        # Inherited by everything this job starts (env workers, evaluator)
+        os.sched_setaffinity(0, core_ids)
+    # Before torch is imported (train_model() imports it), so its OpenMP pool
+    # is sized to this job's share too
+    os.environ["OMP_NUM_THREADS"] = str(torch_threads)
+    log = open(log_path, "a", buffering=1)
+    sys.stdout = sys.stderr = log
+    print(f"\n=== {datetime.now():%Y-%m-%d %H:%M:%S}: {num_envs} envs, {torch_threads} torch thread(s)"
+          + (f", cores {core_ids}" if core_ids else "") + " ===")
+
+    path = _model_dir(config)
+    new = config.get("new", True)
+    # The timestep count this attempt's model starts from -- what train_model()
+    # has added on top of it afterwards is what this attempt trained
+    start = 0 if new else _checkpoint_timesteps(path, "best_model" if config.get("best", True) else "last_model") or 0
+    try:
+        import torch
+        from rl.training import train_model
+        torch.set_num_threads(torch_threads)
+        kwargs = {key: value for key, value in config.items() if key in JOB_ARGS}
+        kwargs["num_envs"] = num_envs
+        train_model(cancel_event=cancel_event, **kwargs)
+    except BaseException as exc:
+        print(f"Job failed: {exc!r}")
+        results.put(("failed", 0, f"{type(exc).__name__}: {exc}"))
+        return
+    finally:
+        sys.stdout.flush()
+
+    trained = (_checkpoint_timesteps(path, "last_model") or 0) - start
+    result = {"best_score": None, "timesteps": _checkpoint_timesteps(path, "last_model")}
+    if os.path.exists(best_score_path(path)):
+        with open(best_score_path(path)) as file:
+            result["best_score"] = json.load(file).get("mean_reward")
+    results.put(("cancelled" if cancel_event.is_set() else "done", trained, result))
+
+
+class _RunningJob:
+    def __init__(self, job, ctx, cores, num_envs, torch_threads, core_ids, log_path):
+        self.job = job
+        self.cores = cores
+        self.core_ids = core_ids
+        self.cancel_event = ctx.Event()
+        self.results = ctx.Queue()
+        attempt_config = dict(job["config"])
+        if job["resume"]:
+            # An earlier attempt was interrupted after saving -- pick up from
+            # its last model for the timesteps still left
+            attempt_config.update(new=False, best=False, timesteps=job["config"]["timesteps"] - job["trained"])
+        self.process = ctx.Process(target=_run_job, name=f"job-{job['id']}",
+                                   args=(attempt_config, num_envs, torch_threads, core_ids, log_path, self.cancel_event,
+                                         self.results))
+        self.process.start()
+
+    def poll(self):
+        """(status, trained, result) once the job process has reported, else None."""
+        if self.results.empty():
+            if self.process.is_alive():
+                return None
+            self.process.join(timeout=1)
+            if not self.results.empty():
+                return self.results.get()
+            return "failed", 0, f"Job process exited with code {self.process.exitcode}"
+        report = self.results.get()
+        self.process.join()
+        return report
+
+
+# --- Scheduler loop ---------------------------------------------------------
+
+def _ready(queue, running, budget, used):
+    """Pending jobs to start now, in queue order (see the module docstring)."""
+    busy_dirs = {_model_dir(job["config"]) for job in queue["jobs"] if job["id"] in running}
+    blocked_dirs = set(busy_dirs)
+    start = []
+    for job in queue["jobs"]:
+        if job["status"] != "pending":
+            continue
+        model_dir = _model_dir(job["config"])
+        cores = _plan(job["config"], budget)[0]
+        if model_dir not in blocked_dirs and used + cores <= budget:
+            start.append(job)
+            used += cores
+        # Later jobs on the same folder wait for this one either way
+        blocked_dirs.add(model_dir)
+    return start
+
+
+def run_queue(queue_path=QUEUE_PATH, cores=None, start_method=None):
+    """
+    Run every pending job in the queue file, at most `cores` cores' worth at
+    once (default: all of this machine's), until none are left. Returns the
+    number of jobs that failed. Ctrl+C cancels running jobs gracefully (a
+    second Ctrl+C kills them) -- see the module docstring.
+    """
+    budget = cores or os.cpu_count() or 1
+    if start_method is None:
+        start_method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    ctx = mp.get_context(start_method)
+    logs_dir = os.path.join(os.path.dirname(queue_path) or ".", "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+
+    with _locked(queue_path):
+        queue = _read_queue(queue_path)
+        for job in queue["jobs"]:
+            if job["status"] == "running":
+                # Left over from a scheduler that died without cancelling it --
+                # nothing past job["trained"] was recorded, so run it again
+                print(f"[scheduler] {_describe(job)} was interrupted -- requeued")
+                job["status"] = "pending"
+        _write_queue(queue_path, queue)
+
+    running = {}                           # job id -> _RunningJob
+    # Core ids not taken by a running job -- None if jobs can't be pinned
+    free_core_ids = None
+    if hasattr(os, "sched_setaffinity") and len(os.sched_getaffinity(0)) >= budget:
+        free_core_ids = sorted(os.sched_getaffinity(0))[:budget]
+    stopping = False
+    print(f"[scheduler] Core budget: {budget}")
+    try:
+        while True:
+            try:
+                # The file is the queue: each pass re-reads it (with any jobs
+                # `add`ed or `retry`d since the last one) and writes its own
+                # changes back within the same lock
+                with _locked(queue_path):
+                    queue = _read_queue(queue_path)
+                    jobs = {job["id"]: job for job in queue["jobs"]}
+                    changed = False
+                    for job_id, handle in list(running.items()):
+                        report = handle.poll()
+                        if report is None:
+                            continue
+                        del running[job_id]
+                        if free_core_ids is not None:
+                            free_core_ids = sorted(free_core_ids + handle.core_ids)
+                        _record(jobs.get(job_id, handle.job), *report)
+                        changed = True
+
+                    if not stopping:
+                        used = sum(handle.cores for handle in running.values())
+                        for job in _ready(queue, running, budget, used):
+                            job_cores, num_envs, torch_threads = _plan(job["config"], budget)
+                            job["status"] = "running"
+                            job["attempts"] += 1
+                            job["started_at"] = datetime.now().isoformat(timespec="seconds")
+                            log_path = os.path.join(logs_dir, f"job_{job['id']}.log")
+                            core_ids = []
+                            if free_core_ids is not None:
+                                core_ids, free_core_ids = free_core_ids[:job_cores], free_core_ids[job_cores:]
+                            running[job["id"]] = _RunningJob(job, ctx, job_cores, num_envs, torch_threads, core_ids, log_path)
+                            print(f"[scheduler] Started {_describe(job)}: {job_cores} core(s) -- {num_envs} envs, "
+                                  f"{torch_threads} torch thread(s), log {log_path}")
+                            changed = True
+                    if changed:
+                        _write_queue(queue_path, queue)
+                if not running and (stopping or not any(job["status"] == "pending" for job in queue["jobs"])):
+                    break
+                time.sleep(POLL_INTERVAL)
+            except KeyboardInterrupt:
+                if stopping:
+                    raise
+                stopping = True
+                print(f"\n[scheduler] Stopping: cancelling {len(running)} running job(s) -- each saves its last "
+                      "model first (Ctrl+C again to kill them)")
+                for handle in running.values():
+                    handle.cancel_event.set()
+    except KeyboardInterrupt:
+        for handle in running.values():
+            handle.process.terminate()
+            handle.process.join()
+        with _locked(queue_path):
+            queue = _read_queue(queue_path)
+            for job in queue["jobs"]:
+                if job["id"] in running:
+                    job["status"] = "pending"
+            _write_queue(queue_path, queue)
+        print("[scheduler] Killed the running jobs; they start over on the next run")
+        return sum(job["status"] == "failed" for job in queue["jobs"])
+
+    failed = sum(job["status"] == "failed" for job in queue["jobs"])
+    pending = sum(job["status"] == "pending" for job in queue["jobs"])
+    print(f"[scheduler] Done: {sum(job['status'] == 'done' for job in queue['jobs'])} done, {failed} failed, {pending} pending")
+    return failed
+
+
+def _record(job, status, trained, detail):
+    """Fold a finished attempt's report into its job."""
+    job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    if status == "failed":
+        job["status"], job["error"] = "failed", detail
+        print(f"[scheduler] {_describe(job)} failed: {detail}")
+        return
+    job["trained"] += max(trained, 0)
+    job["result"] = detail
+    if status == "cancelled" and job["trained"] < job["config"]["timesteps"]:
+        job["status"], job["resume"] = "pending", True
+        print(f"[scheduler] {_describe(job)} stopped at {job['trained']:,} steps -- resumes on the next run")
+    else:
+        job["status"], job["error"] = "done", None
+        score = detail.get("best_score")
+        print(f"[scheduler] {_describe(job)} done" + (f" (best score {score:.2f})" if score is not None else ""))
+
+
+def _print_status(queue_path):
+    queue = _read_queue(queue_path)
+    if not queue["jobs"]:
+        print(f"No jobs in {queue_path}")
+    for job in queue["jobs"]:
+        line = f"{job['status']:8} {_describe(job)}"
+        if job["trained"]:
+            line += f" -- {job['trained']:,} trained"
+        if job["status"] == "failed":
+            line += f" -- {job['error']}"
+        elif job["status"] == "done" and job["result"] and job["result"].get("best_score") is not None:
+            line += f" -- best score {job['result']['best_score']:.2f}"
+        print(line)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(prog="python -m rl.scheduler", description="Queue of headless training runs.")
+    parser.add_argument("--queue", default=QUEUE_PATH, help=f"Queue file (default: {QUEUE_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Queue a training run")
+    add.add_argument("algo", nargs="?", choices=("DQN", "PPO"))
+    add.add_argument("obs", nargs="?", choices=("FLAT", "GRID"))
+    add.add_argument("grid", nargs="?", help="WIDTHxHEIGHT, e.g. 30x20")
+    add.add_argument("fov", nargs="?", type=int, help="FOV radius")
+    add.add_argument("--file", help="JSON list of train_model() keyword dicts to queue instead")
+    add.add_argument("--timesteps", type=int, default=3_000_000)
+    add.add_argument("--continue", dest="resume_from", choices=("best", "last"),
+                     help="Continue the existing model from its best/last checkpoint instead of starting a new one")
+    add.add_argument("--cores", type=int, help="Cores this job takes from the budget")
+    add.add_argument("--num-envs", type=int, help="Parallel environments (default: from --cores)")
+    add.add_argument("--vec-env", choices=("subproc", "vector", "shared"), default="subproc")
+    add.add_argument("--obs-encoding", choices=("standard", "compact", "packed"), default="standard")
+    add.add_argument("--tuned", action="store_true", help="Use the tuned DQN hyperparameters")
+    add.add_argument("--async-eval", action="store_true")
+    add.add_argument("--trajectory-replay", action="store_true")
+    add.add_argument("--apex-actors", type=int, default=0, help="DQN actor-learner mode with this many actors")
+    add.add_argument("--plateau", type=float, metavar="SCORE_PER_M",
+                     help="Stop early once the eval reward trend is below this gain per million steps")
+    add.add_argument("--placement", choices=("off", "pin", "measure"), default="off",
+                     help="train_model()'s cpu_placement (learner/worker core pinning and contention report)")
+
+    run = commands.add_parser("run", help="Run the pending jobs")
+    run.add_argument("--cores", type=int, help="Core budget (default: all cores)")
+
+    commands.add_parser("status", help="List the queue")
+    commands.add_parser("retry", help="Mark failed jobs pending again")
+    return parser, parser.parse_args(argv)
+
+
+def main(argv=None):
+    parser, args = _parse_args(argv)
+    if args.command == "add":
+        if args.file:
+            with open(args.file) as file:
+                configs = json.load(file)
+        else:
+            if None in (args.algo, args.obs, args.grid, args.fov):
+                parser.error("add needs ALGO OBS WIDTHxHEIGHT FOV (or --file)")
+            grid = re.match(r"(\d+)x(\d+)$", args.grid)
+            if not grid:
+                parser.error(f"grid must look like 30x20, not {args.grid!r}")
+            config = {
+                "model_name": args.algo, "use_cnn": args.obs == "GRID",
+                "grid_width": int(grid.group(1)), "grid_height": int(grid.group(2)), "snake_fov_radius": args.fov,
+                "timesteps": args.timesteps, "new": args.resume_from is None, "best": args.resume_from != "last",
+                "vec_env": args.vec_env, "obs_encoding": args.obs_encoding, "use_tuned_params": args.tuned,
+                "async_eval": args.async_eval, "trajectory_replay": args.trajectory_replay,
+                "cpu_placement": args.placement, "apex_actors": args.apex_actors,
+                "plateau_min_improvement": args.plateau,
+            }
+            if args.cores is not None:
+                config["cores"] = args.cores
+            if args.num_envs is not None:
+                config["num_envs"] = args.num_envs
+            configs = [config]
+        ids = add_jobs(configs, args.queue)
+        print(f"Queued job(s) {', '.join(f'#{job_id}' for job_id in ids)} in {args.queue}")
+    elif args.command == "run":
+        return 1 if run_queue(args.queue, args.cores) else 0
+    elif args.command == "status":
+        _print_status(args.queue)
+    elif args.command == "retry":
+        with _locked(args.queue):
+            queue = _read_queue(args.queue)
+            for job in queue["jobs"]:
+                if job["status"] == "failed":
+                    job["status"], job["error"] = "pending", None
+            _write_queue(args.queue, queue)
+        _print_status(args.queue)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
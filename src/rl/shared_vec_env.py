@@ -0,0 +1,166 @@
+"""
+rl/shared_vec_env.py - SubprocVecEnv variant that moves step data through shared memory.
+
+SubprocVecEnv pickles every worker's observation, reward, done flag and info
+dict through a pipe on every step. SharedMemoryVecEnv keeps one env per
+worker process the same way, but preallocates shared arrays for actions,
+observations, rewards, done flags and the handful of info fields the
+training code reads (snake_length, death_cause, Monitor's episode stats):
+each step, the parent writes the actions, sends every worker a 2-byte
+"step into buffer b" token, and each worker writes its results into its own
+row and answers with a 1-byte ack. Nothing else crosses the pipe.
+
+Observations are double-buffered: step t fills buffer t % 2 and returns
+NumPy views of it, so no observation array is allocated per step, while the
+previous step's observation (which SB3 still holds as `_last_obs` until it
+has stored the transition) stays intact.
+
+Rare calls -- reset(), get_attr/set_attr, env_method("render") for
+_FrameCallback -- go over the same pipe as ordinary pickled commands, like
+SubprocVecEnv. The worker side lives in the torch-free rl/workers.py.
+
+Classes:
+    SharedMemoryVecEnv - VecEnv over shared-memory worker processes.
+"""
+
+import numpy as np
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from game.vector_engine import DEATH_CAUSES
+from rl.subproc_vec_env import _PipeWorkers
+from rl.workers import CloudpickleWrapper, SharedBuffers, STEP_TOKEN, obs_layout, buffer_specs, shared_memory_worker
+
+class SharedMemoryVecEnv(_PipeWorkers, VecEnv):
+    """
+    Drop-in replacement for SubprocVecEnv (one env per worker process) that
+    exchanges step data through shared memory instead of pickled messages.
+
+    Expects the workers' envs to be Monitor-wrapped SnakeGameEnvironments
+    (make_snake_env()): per-step infos are rebuilt in the parent from the
+    shared fields, so only snake_length, death_cause, "TimeLimit.truncated",
+    "terminal_observation" and Monitor's "episode" dict are reported.
+
+    Args:
+        env_fns:      One callable per worker, each returning an env.
+        start_method: multiprocessing start method, as for SubprocVecEnv
+                      (defaults to "forkserver" where available, else "spawn").
+    """
+
+    def __init__(self, env_fns, start_method=None):
+        self.waiting = False
+        self.closed = False
+        num_envs = len(env_fns)
+        ctx = self._context(start_method)
+
+        # The shared arrays have to exist before the workers start, so read
+        # the spaces off a throwaway env here instead of asking worker 0.
+        probe = env_fns[0]()
+        observation_space, action_space = probe.observation_space, probe.action_space
+        probe.close()
+
+        self._buffers = SharedBuffers(ctx, buffer_specs(num_envs, observation_space))
+        self._views = self._buffers.views()
+        self._obs_keys = [key for key, _, _ in obs_layout(observation_space)]
+        self._buf = 0
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(num_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(zip(self.work_remotes, self.remotes, env_fns)):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), self._buffers, index)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=shared_memory_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        super().__init__(num_envs, observation_space, action_space)
+
+    def _obs(self, name, buf=None):
+        """Views of the `name` observation arrays (one double buffer for "obs")."""
+        arrays = {key: self._views[(name, key)] for key in self._obs_keys}
+        if buf is not None:
+            arrays = {key: array[buf] for key, array in arrays.items()}
+        return arrays if self._obs_keys != [None] else arrays[None]
+
+    def reset(self):
+        self._buf = 0
+        for i, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._buf, self._seeds[i], self._options[i])))
+        self.reset_infos = [remote.recv() for remote in self.remotes]
+        self._reset_seeds()
+        self._reset_options()
+        return self._obs("obs", self._buf)
+
+    def step_async(self, actions):
+        self._views["actions"][:] = np.asarray(actions).reshape(self.num_envs)
+        self._buf ^= 1
+        token = bytes((STEP_TOKEN, self._buf))
+        for remote in self.remotes:
+            remote.send_bytes(token)
+        self.waiting = True
+
+    def step_wait(self):
+        for remote in self.remotes:
+            remote.recv_bytes()
+        self.waiting = False
+
+        views = self._views
+        terminated, truncated = views["terminated"], views["truncated"]
+        dones = terminated | truncated
+        time_limit = truncated & ~terminated
+        infos = [
+            {"snake_length": int(length), "death_cause": DEATH_CAUSES[cause], "TimeLimit.truncated": bool(cut)}
+            for length, cause, cut in zip(views["snake_length"], views["death_cause"], time_limit)
+        ]
+        if dones.any():
+            terminal_obs = self._obs("terminal_obs")
+            for i in np.flatnonzero(dones):
+                info = infos[i]
+                if isinstance(terminal_obs, dict):
+                    info["terminal_observation"] = {key: value[i].copy() for key, value in terminal_obs.items()}
+                else:
+                    info["terminal_observation"] = terminal_obs[i].copy()
+                if views["episode_l"][i] == 0:
+                    continue
+                info["episode"] = {
+                    "r": float(views["episode_r"][i]),
+                    "l": int(views["episode_l"][i]),
+                    "t": float(views["episode_t"][i]),
+                }
+        return self._obs("obs", self._buf), views["rewards"].copy(), dones, infos
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv_bytes()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    def get_images(self):
+        if self.render_mode != "rgb_array":
+            return [None for _ in self.remotes]
+        return self.env_method("render")
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
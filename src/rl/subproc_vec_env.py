@@ -0,0 +1,98 @@
+"""
+rl/subproc_vec_env.py - SubprocVecEnv whose worker processes never import torch.
+
+HeadlessSubprocVecEnv is SB3's SubprocVecEnv with one change: its worker
+processes run rl.workers.pipe_worker (same pipe protocol as SB3's worker)
+instead of stable_baselines3.common.vec_env.subproc_vec_env._worker. With
+forkserver/spawn, a worker imports the module its target lives in, so SB3's
+worker made every process import stable_baselines3 -- and with it torch --
+before stepping a single game. Together with the headless
+game/environment.py, workers now only load NumPy and gymnasium
+(see benchmarks/worker_startup.py for the measured difference).
+
+rl/shared_vec_env.py's SharedMemoryVecEnv talks to its workers over the
+same kind of pipes; what the two have in common is _PipeWorkers here.
+
+Classes:
+    HeadlessSubprocVecEnv - SubprocVecEnv with lean worker processes.
+"""
+
+import multiprocessing as mp
+
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env import SubprocVecEnv
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from game.monitor import EpisodeMonitor
+from rl.workers import CloudpickleWrapper, pipe_worker
+
+
+class _PipeWorkers:
+    """
+    Shared by the VecEnvs whose workers run rl/workers.py behind one pipe
+    each (self.remotes): the start method, and the pipe commands that don't
+    depend on how step data travels.
+    """
+
+    @staticmethod
+    def _context(start_method):
+        """multiprocessing context for the workers: `start_method`, or by
+        default "forkserver" where available, else "spawn" (like SubprocVecEnv)."""
+        if start_method is None:
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        return mp.get_context(start_method)
+
+    def _get_target_remotes(self, indices):
+        return [self.remotes[i] for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        # Workers use the torch-free EpisodeMonitor; asking them about SB3's
+        # Monitor would make each one import SB3 just to unpickle the class.
+        if wrapper_class is Monitor:
+            wrapper_class = EpisodeMonitor
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def step_timers(self):
+        """[(seconds spent stepping, steps)] per worker since it started (see
+        rl.workers) -- call between steps, not while a step is in flight."""
+        for remote in self.remotes:
+            remote.send(("step_timers", None))
+        return [remote.recv() for remote in self.remotes]
+
+
+class HeadlessSubprocVecEnv(_PipeWorkers, SubprocVecEnv):
+    """
+    Drop-in replacement for SubprocVecEnv (same arguments and behavior).
+
+    Args:
+        env_fns:      One callable per worker, each returning an env.
+        start_method: multiprocessing start method (defaults to "forkserver"
+                      where available, else "spawn", like SubprocVecEnv).
+    """
+
+    def __init__(self, env_fns, start_method=None):
+        # SubprocVecEnv.__init__ hardcodes its own worker function, so this
+        # repeats its setup with pipe_worker instead.
+        self.waiting = False
+        self.closed = False
+        n_envs = len(env_fns)
+        ctx = self._context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for work_remote, remote, env_fn in zip(self.work_remotes, self.remotes, env_fns):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn))
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=pipe_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        observation_space, action_space = self.remotes[0].recv()
+
+        VecEnv.__init__(self, len(env_fns), observation_space, action_space)
@@ -0,0 +1,218 @@
+"""
+rl/telemetry.py - Where a training run's wall time goes, phase by phase.
+
+SB3 only logs time/fps, one number for everything. PerfTelemetry splits the
+learner's wall time into phases and logs each phase's share of it as a
+tensorboard scalar under perf/, over the time since the previous log dump
+(to within `interval` seconds -- SB3 only writes the last value recorded
+before each dump, so a short sampling window could miss e.g. a whole PPO
+update):
+    perf/env_step:   the env workers' own stepping (the mean over workers of
+                     their time inside env.step(), from the step timers in
+                     rl/workers.py -- for a "vector" env, the engine's step),
+    perf/env_ipc:    the rest of the learner's wait for an env step: pipes,
+                     (un)pickling, and waiting for the slowest worker,
+    perf/inference:  the policy's forward passes choosing actions during
+                     collection (evaluation's count as eval),
+    perf/train:      gradient updates -- everything between the end of one
+                     rollout and the start of the next (for PPO that includes
+                     SB3's log dump),
+    perf/eval:       EvalCallback's evaluations (AsyncEvalCallback's hand-offs),
+    perf/checkpoint: PeriodicCheckpoint and BestModelSaver saves,
+    perf/other:      the remainder (replay buffer adds, other callbacks, ...).
+The shares add up to 1. Alongside: perf/env_sps (game steps per second,
+all envs together) and perf/worker_sps/<i> (per env worker, so one slow or
+starved worker stands out).
+
+Phases are timed exclusively: one entered inside another (a best-model save
+inside an evaluation) pauses the outer one. The timing hooks are set on the
+instances -- the env's step_async/step_wait, the policy's predict (DQN) or
+forward (PPO), the given callbacks' _on_step -- at training start and removed
+at training end; none of them is saved with the model.
+
+Classes:
+    PerfTelemetry - Callback logging the per-phase wall-time breakdown.
+"""
+
+import functools
+import time
+
+import numpy as np
+from stable_baselines3.common.callbacks import BaseCallback
+from stable_baselines3.common.on_policy_algorithm import OnPolicyAlgorithm
+
+# In stacking order (ui/plot_window.py draws them bottom to top)
+PHASES = ("env_step", "env_ipc", "inference", "train", "eval", "checkpoint", "other")
+
+
+class _PhaseClock:
+    """Exclusive wall-time totals per phase: entering a phase pauses the one
+    it was entered from until it's exited again."""
+
+    def __init__(self):
+        self.totals = {}
+        self._stack = []
+        self._since = 0.0
+
+    @property
+    def current(self):
+        return self._stack[-1] if self._stack else None
+
+    def _charge(self, now):
+        if self._stack:
+            phase = self._stack[-1]
+            self.totals[phase] = self.totals.get(phase, 0.0) + now - self._since
+        self._since = now
+
+    def enter(self, phase):
+        self._charge(time.perf_counter())
+        self._stack.append(phase)
+
+    def exit(self):
+        self._charge(time.perf_counter())
+        self._stack.pop()
+
+    def read(self):
+        """The totals, including the running phase's time so far."""
+        self._charge(time.perf_counter())
+        return dict(self.totals)
+
+
+def _timed(clock, phase, func, top_level_only=False):
+    """`func`, timed as `phase` -- with top_level_only, only when no other
+    phase is running (the policy's predict() inside an evaluation is eval)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if top_level_only and clock.current is not None:
+            return func(*args, **kwargs)
+        clock.enter(phase)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            clock.exit()
+    return wrapper
+
+
+class PerfTelemetry(BaseCallback):
+    """
+    Args:
+        eval_callbacks:       Callbacks whose _on_step counts as eval.
+        checkpoint_callbacks: Callbacks whose _on_step counts as checkpoint
+                              (may be nested in an eval callback, e.g. a
+                              callback_on_new_best).
+        interval:             Seconds between perf/ records (each one
+                              replacing the last until SB3's next log dump).
+
+    After training, `summary` holds the breakdown over the whole run (see
+    breakdown()).
+    """
+
+    def __init__(self, eval_callbacks=(), checkpoint_callbacks=(), interval=10.0, verbose=0):
+        super().__init__(verbose)
+        self.eval_callbacks = list(eval_callbacks)
+        self.checkpoint_callbacks = list(checkpoint_callbacks)
+        self.interval = interval
+        self.summary = None
+        self._clock = _PhaseClock()
+        self._hooks = []               # (object, attribute, original, was an instance attribute)
+        self._step_timers = None
+        self._start = None
+        self._window = None            # Snapshot the breakdown being recorded starts from
+        self._last = None              # Snapshot of the last record
+
+    def _hook(self, obj, name, phase, top_level_only=False):
+        original = getattr(obj, name)
+        self._hooks.append((obj, name, original, name in vars(obj)))
+        setattr(obj, name, _timed(self._clock, phase, original, top_level_only))
+
+    def _unhook(self):
+        for obj, name, original, own in reversed(self._hooks):
+            if own:
+                setattr(obj, name, original)
+            else:
+                delattr(obj, name)
+        self._hooks = []
+
+    def _snapshot(self):
+        workers = self._step_timers() if self._step_timers is not None else []
+        return time.perf_counter(), self._clock.read(), workers, self.num_timesteps
+
+    def _on_training_start(self) -> None:
+        env = self.training_env
+        self._hook(env, "step_async", "env")
+        self._hook(env, "step_wait", "env")
+        # What picks the actions while collecting: DQN goes through
+        # policy.predict() (unless exploring), PPO calls the policy itself
+        on_policy = isinstance(self.model, OnPolicyAlgorithm)
+        self._hook(self.model.policy, "forward" if on_policy else "predict", "inference", top_level_only=True)
+        for callback in self.eval_callbacks:
+            self._hook(callback, "_on_step", "eval")
+        for callback in self.checkpoint_callbacks:
+            self._hook(callback, "_on_step", "checkpoint")
+        # SB3's VecEnv wrappers forward .unwrapped to the innermost env
+        self._step_timers = getattr(env.unwrapped, "step_timers", None)
+        self._start = self._window = self._last = self._snapshot()
+
+    def _on_rollout_end(self) -> None:
+        # learn() trains between one collect_rollouts() and the next
+        self._clock.enter("train")
+
+    def _on_rollout_start(self) -> None:
+        if self._clock.current == "train":
+            self._clock.exit()
+
+    def _on_step(self) -> bool:
+        if time.perf_counter() - self._last[0] >= self.interval:
+            if "perf/other" not in self.logger.name_to_value:
+                # The last record has been dumped -- start a new window there
+                self._window = self._last
+            now = self._snapshot()
+            self._record(self.breakdown(self._window, now))
+            self._last = now
+        return True
+
+    def _on_training_end(self) -> None:
+        if self._clock.current == "train":
+            self._clock.exit()
+        self.summary = self.breakdown(self._start, self._snapshot())
+        self._unhook()
+
+    @staticmethod
+    def breakdown(before, after) -> dict:
+        """
+        Between two snapshots: "wall_time_s", "phases" ({phase: share of the
+        wall time}, see PHASES), "env_sps" and "worker_sps" (per worker; empty
+        for an env without step timers).
+        """
+        started, totals_before, workers_before, timesteps_before = before
+        ended, totals_after, workers_after, timesteps_after = after
+        wall = max(ended - started, 1e-9)
+        spent = {phase: totals_after.get(phase, 0.0) - totals_before.get(phase, 0.0)
+                 for phase in ("env", "inference", "train", "eval", "checkpoint")}
+        workers = [(busy - busy_before, steps - steps_before)
+                   for (busy, steps), (busy_before, steps_before) in zip(workers_after, workers_before)]
+        # The workers step in parallel while the learner waits, so their mean
+        # busy time is the stepping part of that wait
+        env_step = min(float(np.mean([busy for busy, _ in workers])), spent["env"]) if workers else 0.0
+        seconds = {"env_step": env_step, "env_ipc": spent["env"] - env_step}
+        seconds.update((phase, spent[phase]) for phase in ("inference", "train", "eval", "checkpoint"))
+        seconds["other"] = max(wall - sum(seconds.values()), 0.0)
+        return {
+            "wall_time_s": round(wall, 3),
+            "phases": {phase: round(seconds[phase] / wall, 4) for phase in PHASES},
+            "env_sps": round((timesteps_after - timesteps_before) / wall, 1),
+            "worker_sps": [round(steps / wall, 1) for _, steps in workers],
+        }
+
+    def _record(self, breakdown):
+        for phase, share in breakdown["phases"].items():
+            self.logger.record(f"perf/{phase}", share)
+        self.logger.record("perf/env_sps", breakdown["env_sps"])
+        for index, sps in enumerate(breakdown["worker_sps"]):
+            self.logger.record(f"perf/worker_sps/{index}", sps)
+
+    @staticmethod
+    def format_summary(summary) -> str:
+        """One line, for the training log."""
+        phases = ", ".join(f"{phase} {share:.0%}" for phase, share in summary["phases"].items())
+        return f"Time breakdown over {summary['wall_time_s']:.1f}s: {phases} ({summary['env_sps']:,.0f} env steps/s)"
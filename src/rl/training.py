@@ -15,21 +15,33 @@ import numpy as np
 from stable_baselines3 import PPO, DQN
 from stable_baselines3.common.callbacks import EvalCallback, StopTrainingOnRewardThreshold, BaseCallback, CallbackList
 from stable_baselines3.common.evaluation import evaluate_policy
-from stable_baselines3.common.vec_env import SubprocVecEnv
-from stable_baselines3.common.monitor import Monitor
-from gymnasium.wrappers import TimeLimit
+from stable_baselines3.common.save_util import load_from_pkl
 
-from game.environment import SnakeGameEnvironment, make_snake_env
+from game.environment import make_snake_env
 from rl.paths import (
-    GRID_SIZE, PPO_PATH, DQN_PATH, TB_RUN_NAME, tensorboard_log_dir, replay_buffer_path,
+    GRID_SIZE, PPO_PATH, DQN_PATH, TB_RUN_NAME, tensorboard_log_dir, replay_buffer_path, replay_buffer_dir,
+    _backup_replay_buffer, _restore_replay_buffer_backup, _discard_replay_buffer_backup,
     _find_checkpoint, _finalize_checkpoint, _record_continue_marker,
     _snapshot_run_dir, _discard_run_artifacts, _existing_max_step,
     _backup_run_dir, _restore_run_dir_backup, _discard_run_dir_backup,
     _seed_run_dir_from_best, _rebuild_tb_best, tb_best_dir,
     _read_best_score, _write_best_score,
 )
-from rl.callbacks import DeathLogger, PeriodicCheckpoint
-from rl.feature_extractors import SnakeCombinedExtractor
+from rl.callbacks import DeathLogger, PeriodicCheckpoint, BestModelSaver, PlateauStopping
+from rl.checkpoint_writer import CheckpointWriter
+from rl.placement import CorePlacement
+from rl.telemetry import PerfTelemetry
+from rl.apex import ApexDQN
+from rl.vec_env import SnakeVecEnv
+from rl.evaluation import make_eval_vec_env, evaluate_scores
+from rl.async_eval import AsyncEvalCallback
+from rl.finalization import FinalizationPipeline
+from rl.numpy_policy import export_policy, npz_path
+from rl.quantization import quantize_model
+from rl.replay_buffer import attach_memmap_replay_buffer
+from rl.shared_vec_env import SharedMemoryVecEnv
+from rl.subproc_vec_env import HeadlessSubprocVecEnv
+from rl.feature_extractors import SnakeCombinedExtractor, CompactFlatExtractor
 from rl.hyperparameter_tuning import load_best_params
 
 
@@ -104,48 +116,48 @@ class _RebasedSchedule:
         return self.schedule_fn(local)
 
 
-def evaluate_model_performance(model, grid_size, grid_width, grid_height, snake_fov_radius, obs_mode="flat", n_episodes=10, model_label=""):
+def evaluate_model_performance(model, grid_size, grid_width, grid_height, snake_fov_radius, obs_mode="flat", n_episodes=10, model_label="", verbose=True, quantized=False):
     """
     Run n_episodes deterministic and n_episodes stochastic episodes (no rendering,
     no reward shaping) and return the mean "clean" score (apples eaten) for each,
-    the same score shown by test_model().
+    the same score shown by test_model(). The observation encoding is taken
+    from the model itself (see game.observations.observation_encoding()).
+
+    Each set of episodes plays concurrently, one batched forward pass per tick
+    (rl.evaluation.evaluate_scores()). Episodes are capped at 10000 steps, and
+    deterministic ones also end at the first repeated state -- a deterministic
+    policy there is in an endless loop (see detect_cycles in
+    SnakeGameEnvironment) -- so an undertrained/looping policy can't hang this
+    function, it just produces a low score.
+
+    verbose=False prints nothing (for callers running several evaluations
+    at once, see rl/finalization.py).
+
+    `model` only needs predict() and observation_space: a loaded SB3 model,
+    or an rl.numpy_policy.NumpyPolicy. This module imports torch, though --
+    to score a NumpyPolicy without it, call rl.evaluation.evaluate_scores()
+    directly (which this wraps).
+
+    quantized=True scores an int8 copy of the (SB3) model's policy instead
+    (rl.quantization.quantize_model()) -- check rl.quantization's agreement
+    report for that model before trusting the scores.
     """
-    if model_label:
-        print(f"Evaluating {model_label}...")
-
-    # training=False disables the environment's own anti-loop timeout, so wrap
-    # with a hard step limit -- otherwise an undertrained/looping policy (quite
-    # possible here, especially in the stochastic episodes) can hang this
-    # function indefinitely instead of just producing a low score.
-    env = TimeLimit(
-        SnakeGameEnvironment(grid_size, grid_width, grid_height, snake_fov_radius, render_mode=None, training=False, obs_mode=obs_mode),
-        max_episode_steps=10000,
-    )
-    results = {}
-    for label, deterministic in [("deterministic", True), ("stochastic", False)]:
-        scores = []
-        for _ in range(n_episodes):
-            obs, info = env.reset()
-            done = False
-            score = 0.0
-            while not done:
-                action, _ = model.predict(obs, deterministic=deterministic)
-                obs, reward, terminated, truncated, info = env.step(action)
-                done = terminated or truncated
-                score += float(reward)
-            scores.append(score)
-        results[label] = {"mean_score": sum(scores) / len(scores), "episodes": n_episodes, "scores": scores}
-        print(f"  {label}: mean score = {results[label]['mean_score']:.2f} ({n_episodes} episodes)")
-    env.close()
-    return results
-
-
-def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius=3, timesteps=3_000_000, num_envs=4, new=True, params=None, best=True, use_tuned_params=False, use_cnn=False, cancel_event=None, discard_event=None, on_log_dir=None, on_frame=None):
+    if model_label and verbose:
+        print(f"Evaluating {model_label}{' (int8)' if quantized else ''}...")
+    if quantized:
+        model = quantize_model(model)
+
+    return evaluate_scores(model, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, n_episodes=n_episodes,
+                           verbose=verbose)
+
+
+def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radius=3, timesteps=3_000_000, num_envs=4, new=True, params=None, best=True, use_tuned_params=False, use_cnn=False, cancel_event=None, discard_event=None, on_log_dir=None, on_frame=None, vec_env="subproc", obs_encoding="standard", detect_cycles=False, async_eval=False, on_progress=None, trajectory_replay=False, async_checkpoints=True, cpu_placement="off", learner_cores=None, apex_actors=0, plateau_min_improvement=None, perf_telemetry=True):
     """
     Train a DQN or PPO agent on the Snake environment.
 
-    Creates parallel training environments via SubprocVecEnv and a separate
-    evaluation environment. Periodically evaluates the agent, saves the best
+    Creates parallel training environments (SubprocVecEnv, or the batched
+    in-process SnakeVecEnv -- see `vec_env`) and a separate evaluation
+    environment. Periodically evaluates the agent, saves the best
     model, and optionally stops training early if a reward threshold is reached.
 
     Args:
@@ -154,7 +166,8 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
         grid_height:      Grid height in cells.
         snake_fov_radius: Agent's field-of-view radius.
         timesteps:        Total training timesteps.
-        num_envs:         Number of parallel environments (subprocesses).
+        num_envs:         Number of parallel environments (subprocesses, or games in
+                          the batched engine with vec_env="vector").
         new:              If True, create a fresh model. If False, load from disk.
         params:           Optional dict of hyperparameters (DQN only). Uses defaults if None.
         best:             If loading (new=False), load the "best_model" (True) or "last_model" (False)
@@ -184,29 +197,136 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
                           so a UI can show a live view of training. render_mode is only
                           switched on for train_env when this is provided -- zero extra
                           overhead otherwise.
+        vec_env:          "subproc" - one SubprocVecEnv worker process per environment
+                          (rl.subproc_vec_env.HeadlessSubprocVecEnv: no torch/pygame in workers).
+                          "vector"  - all num_envs games stepped together in this process
+                          by game.vector_engine.VectorSnakeEngine (rl.vec_env.SnakeVecEnv):
+                          same rules, rewards and observations, no per-env process/IPC
+                          cost, so num_envs can go into the hundreds.
+                          "shared"  - like "subproc", but observations/rewards/dones travel
+                          through shared memory (rl.shared_vec_env.SharedMemoryVecEnv)
+                          instead of being pickled through each worker's pipe.
+        obs_encoding:     "standard" (default), "compact" or "packed" -- how observations are
+                          stored/shipped (see game/observations.py); the policy expands
+                          compact/packed back to the standard one-hot input. A continued run
+                          must use the same encoding its checkpoint was trained with.
+        detect_cycles:    Opt-in: also end training episodes the moment the game repeats
+                          a state since the last apple (death cause "cycle", see
+                          SnakeGameEnvironment), with the -0.5 timeout penalty. Off by
+                          default: the training envs act stochastically (epsilon-greedy
+                          DQN, sampled PPO actions), so a repeat there doesn't mean an
+                          endless loop -- on with uniformly random play on 30x20, 44% of
+                          episodes end as "cycle" and the mean length drops from 68 to
+                          44 steps, which changes what training optimizes. The
+                          (deterministic) evaluation env always detects cycles, since a
+                          repeat there provably is an endless loop that would otherwise
+                          run to its 10000 step cap.
+        async_eval:       If True, the periodic evaluations run in a separate evaluator
+                          process (rl.async_eval.AsyncEvalCallback) while training goes on,
+                          instead of pausing the learner and its workers for every one.
+                          Results are folded into best-model selection, best_score.json and
+                          tensorboard at the timestep the evaluated weights are from.
+        on_progress:      Optional callable(dict), invoked from the training thread for every
+                          step of the post-training finalization (replay buffer flush, tb_best
+                          rebuild, last/best evaluations -- run concurrently, see
+                          rl/finalization.py), so a UI can show it instead of "training".
+                          The wall time from the end of training to written results is
+                          printed and stored in evaluation.json ("finalization").
+        trajectory_replay: DQN only, needs vec_env="vector". Store compact game states
+                          instead of observations in the replay buffer and rebuild the
+                          observations when sampling (rl.replay_buffer.TrajectoryReplayBuffer):
+                          ~25 bytes per transition at any FOV radius, so a much larger
+                          params["buffer_size"] fits in RAM. A continuation switching
+                          this on or off starts with an empty buffer.
+        async_checkpoints: If True (default), the periodic last_model.zip and the new-best
+                          best_model.zip saves during training are written by a background
+                          thread (rl.checkpoint_writer.CheckpointWriter: state copied in the
+                          training loop, zipped and atomically renamed off it) instead of
+                          blocking the learner and every env for each model.save().
+        cpu_placement:    "off" (default), "pin" or "measure" (see rl/placement.py):
+                          "pin" puts the training thread (and torch's thread pool, sized
+                          to match) and the env worker processes on disjoint cores, so
+                          updates and env stepping stop preempting each other; "measure"
+                          pins nothing. Both report the learner's and the workers'
+                          involuntary context switches and run-queue wait for the run --
+                          printed, and stored in evaluation.json under "placement".
+        learner_cores:    With cpu_placement="pin", how many cores the learner gets
+                          (default: the ones num_envs workers leave, at least 1).
+        apex_actors:      DQN only. If > 0, the num_envs games are played by this many
+                          actor processes (num_envs / apex_actors games each, in a
+                          SnakeVecEnv; vec_env is ignored) that keep playing with their
+                          own epsilon and a periodically refreshed copy of the Q-network
+                          while this process trains on what they send (rl.apex.ApexDQN).
+                          Checkpoints, evaluation and tensorboard output are the same as
+                          a plain DQN run's; there are no live frames in this mode.
+        plateau_min_improvement: If set, stop training early once the evaluation reward's
+                          recent trend promises less than this much score gain per million
+                          more timesteps (rl.callbacks.PlateauStopping). The model is saved
+                          and evaluated as usual; evaluation.json's "early_stop" records
+                          why and how many timesteps (and, projected, seconds) it saved.
+        perf_telemetry:   If True (default), log where the wall time goes -- env stepping
+                          in the workers, env IPC, policy inference, gradient updates,
+                          evaluation, checkpoint saves -- plus steps/sec per env worker, as
+                          tensorboard scalars under perf/ (rl.telemetry.PerfTelemetry;
+                          ui/plot_window.py can stack them). The whole run's breakdown is
+                          printed and stored in evaluation.json under "perf".
     """
+    assert vec_env in ("subproc", "vector", "shared")
+    assert cpu_placement in ("off", "pin", "measure")
+    if apex_actors:
+        if model_name != "DQN":
+            raise ValueError("apex_actors is a DQN training mode")
+        if trajectory_replay:
+            raise ValueError("trajectory_replay needs the learner's own SnakeVecEnv, which apex_actors doesn't step")
+        if num_envs % apex_actors:
+            raise ValueError(f"num_envs ({num_envs}) must be a multiple of apex_actors ({apex_actors})")
+        on_frame = None                # Nothing steps the learner's env to render from
+    # Games per env step as DQN/PPO count it: every game for a vec env, one
+    # actor's games for apex_actors
+    envs_per_step = num_envs // apex_actors if apex_actors else num_envs
+    if trajectory_replay and vec_env != "vector":
+        raise ValueError("trajectory_replay needs vec_env=\"vector\" (the buffer reads game states from SnakeVecEnv)")
     obs_mode = "grid" if use_cnn else "flat"
     policy = "MultiInputPolicy" if use_cnn else "MlpPolicy"
     policy_kwargs = {"features_extractor_class": SnakeCombinedExtractor} if use_cnn else None
+    if not use_cnn and obs_encoding != "standard":
+        policy_kwargs = {"features_extractor_class": CompactFlatExtractor,
+                         "features_extractor_kwargs": {"snake_fov_radius": snake_fov_radius}}
 
     # Create parallel training environments (one per subprocess). render_mode
     # is only turned on when on_frame is requested -- render() is only ever
     # actually called on worker 0 (see _FrameCallback below), so enabling it
     # uniformly across all workers costs nothing on the ones it's never
-    # called on.
+    # called on. Frames come from the NumPy rasterizer (game/raster.py), so
+    # worker 0 neither imports pygame nor spends much time per frame.
     train_env_render_mode = "rgb_array" if on_frame is not None else None
-    train_env = SubprocVecEnv([
-        make_snake_env(GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, render_mode=train_env_render_mode)
-        for _ in range(num_envs)
-    ])
-
-    # Create a single evaluation environment with a step limit to prevent infinite episodes.
-    # training=False disables reward shaping/penalties, so EvalCallback's mean_reward
-    # reflects the clean score (apples eaten) instead of being mixed with training-only
-    # shaping terms.
-    raw_eval_env = SnakeGameEnvironment(GRID_SIZE, grid_width, grid_height, snake_fov_radius, training=False, obs_mode=obs_mode)
-    raw_eval_env = TimeLimit(raw_eval_env, max_episode_steps=10000)
-    eval_env = Monitor(raw_eval_env, filename=None)
+    if apex_actors:
+        # Only gives the model its spaces and n_envs (one actor's games) --
+        # the actors play their own copies (see rl/apex.py)
+        train_env = SnakeVecEnv(envs_per_step, GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, obs_encoding=obs_encoding, detect_cycles=detect_cycles)
+        apex_kwargs = {"n_actors": apex_actors, "actor_env_kwargs": dict(
+            grid_size=GRID_SIZE, grid_width=grid_width, grid_height=grid_height, snake_fov_radius=snake_fov_radius,
+            obs_mode=obs_mode, obs_encoding=obs_encoding, detect_cycles=detect_cycles)}
+    elif vec_env == "vector":
+        train_env = SnakeVecEnv(num_envs, GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, render_mode=train_env_render_mode, obs_encoding=obs_encoding, rgb_renderer="numpy", detect_cycles=detect_cycles)
+    else:
+        vec_env_class = SharedMemoryVecEnv if vec_env == "shared" else HeadlessSubprocVecEnv
+        train_env = vec_env_class([
+            make_snake_env(GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, render_mode=train_env_render_mode,
+                           obs_encoding=obs_encoding, rgb_renderer="numpy", detect_cycles=detect_cycles)
+            for _ in range(num_envs)
+        ])
+
+    # Evaluation environment: one game per evaluation episode in a single
+    # SnakeVecEnv, so EvalCallback's evaluate_policy() plays all of them at
+    # once with one batched forward pass per tick instead of one episode at a
+    # time (see rl/evaluation.py). A step limit prevents infinite episodes.
+    # training=False disables reward shaping/penalties, so EvalCallback's
+    # mean_reward reflects the clean score (apples eaten) instead of being
+    # mixed with training-only shaping terms.
+    n_eval_episodes = 10
+    eval_env = make_eval_vec_env(n_eval_episodes, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode,
+                                 obs_encoding=obs_encoding)
 
     # Set below (to the loaded checkpoint's cumulative timestep count) when
     # continuing an existing model -- but the actual continue_markers.json
@@ -220,16 +340,24 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
         path = os.path.join(DQN_PATH, "GRID" if use_cnn else "FLAT", f"GRID_{grid_width}_{grid_height}", f"FOV_RADIUS_{snake_fov_radius}")
         if not new:
             # Resume training from a saved model (policy/feature-extractor are restored from the checkpoint)
-            model = DQN.load(_find_checkpoint(path, "best_model" if best else "last_model"), train_env, device='cpu', verbose=1, tensorboard_log=tensorboard_log_dir(path))
-            # Restore the replay buffer saved at the end of the previous run
-            # (see the final-save block below) so this continuation genuinely
-            # resumes training -- same buffer contents, same exploration
-            # schedule state -- instead of restarting with an empty buffer,
-            # matching "train 3M then 3M more" to "train 6M in one go".
-            buffer_path = replay_buffer_path(path)
-            if os.path.exists(buffer_path):
-                model.load_replay_buffer(buffer_path)
+            if apex_actors:
+                model = ApexDQN.load(_find_checkpoint(path, "best_model" if best else "last_model"), train_env, device='cpu', verbose=1, tensorboard_log=tensorboard_log_dir(path), **apex_kwargs)
             else:
+                model = DQN.load(_find_checkpoint(path, "best_model" if best else "last_model"), train_env, device='cpu', verbose=1, tensorboard_log=tensorboard_log_dir(path))
+            # Reopen the replay buffer as of its last flush (the end of the
+            # previous run, or its last PeriodicCheckpoint if it crashed) so
+            # this continuation genuinely resumes training -- same buffer
+            # contents, same exploration schedule state -- instead of
+            # restarting with an empty buffer, matching "train 3M then 3M
+            # more" to "train 6M in one go". Mapping the files is near-instant
+            # (see rl/replay_buffer.py), unlike unpickling a whole buffer.
+            replay_buffer = attach_memmap_replay_buffer(model, replay_buffer_dir(path), trajectory_replay)
+            legacy_buffer_path = replay_buffer_path(path)
+            if replay_buffer.size() == 0 and os.path.exists(legacy_buffer_path):
+                # A buffer pickled by an older version -- converted once
+                if replay_buffer.adopt(load_from_pkl(legacy_buffer_path)):
+                    os.remove(legacy_buffer_path)
+            if replay_buffer.size() == 0:
                 # No saved buffer (e.g. a model continued for the first time
                 # since before this feature existed) -- fall back to the old
                 # behavior: give exploration a fresh cycle over just this
@@ -265,14 +393,15 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
                         # buffer, so without this, more parallel envs collect
                         # data faster without training on proportionally more of
                         # it (a shrinking "replay ratio"), risking under-training
-                        # at high num_envs.
-                        "gradient_steps": max(1, round(4 * num_envs / 4)),
+                        # at high num_envs. (With apex_actors, a step is one
+                        # actor's games -- same ratio per transition.)
+                        "gradient_steps": max(1, round(4 * envs_per_step / 4)),
                         "target_update_interval": 2000,  # Steps between target network hard updates
                         "exploration_fraction": 0.2,     # Fraction of training for epsilon decay
                         "exploration_final_eps": 0.05,   # Final exploration rate
                     }
 
-            model = DQN(
+            model = (ApexDQN if apex_actors else DQN)(
                 policy, train_env,
                 policy_kwargs = policy_kwargs,
                 learning_rate = params["learning_rate"],
@@ -286,8 +415,13 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
                 target_update_interval = params["target_update_interval"],
                 exploration_fraction = params["exploration_fraction"],
                 exploration_final_eps = params["exploration_final_eps"],
-                device='cpu', verbose=1, tensorboard_log=tensorboard_log_dir(path)
+                device='cpu', verbose=1, tensorboard_log=tensorboard_log_dir(path),
+                **(apex_kwargs if apex_actors else {})
             )
+            # A fresh buffer -- any existing model's one is moved aside until
+            # this run is known not to be discarded (see the discard handling)
+            _backup_replay_buffer(path)
+            attach_memmap_replay_buffer(model, replay_buffer_dir(path), trajectory_replay)
     else:
         # PPO branch
         path = os.path.join(PPO_PATH, "GRID" if use_cnn else "FLAT", f"GRID_{grid_width}_{grid_height}", f"FOV_RADIUS_{snake_fov_radius}")
@@ -337,22 +471,54 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
             self.value = None
 
         def _on_step(self) -> bool:
-            self.value = self.num_timesteps
+            # With AsyncEvalCallback the new best is only known some steps
+            # after the weights it scored were snapshotted -- record the
+            # snapshot's timestep, which is what best_model.zip holds
+            evaluated_timestep = getattr(self.parent, "evaluated_timestep", None)
+            self.value = evaluated_timestep if evaluated_timestep is not None else self.num_timesteps
             return True
 
     record_best_timestep = _RecordBestTimestep()
 
+    # Ends a run whose eval reward has flattened out, after EvalCallback's
+    # evaluations (the reward threshold above only ends runs that got very good)
+    plateau_stopping = PlateauStopping(plateau_min_improvement) if plateau_min_improvement is not None else None
+
+    # Background writer for the checkpoints saved during .learn() -- drained
+    # (close()) as soon as it returns, before the final saves below
+    checkpoint_writer = CheckpointWriter() if async_checkpoints else None
+    # Without the writer, EvalCallback saves best_model.zip itself
+    on_new_best = [stop_callback, record_best_timestep]
+    if checkpoint_writer is not None and not async_eval:
+        on_new_best.insert(0, BestModelSaver(checkpoint_writer, path))
+
     # Evaluate periodically, save best model, and optionally stop early
-    eval_freq = max((timesteps // 25) // num_envs, 1)    # ~25 evaluations per training run
-    eval_callback = EvalCallback(
-        eval_env,
-        callback_on_new_best=CallbackList([stop_callback, record_best_timestep]),
-        best_model_save_path=path,
-        eval_freq=eval_freq,
-        n_eval_episodes=10,                                  # Episodes per evaluation
-        verbose=1,
-        deterministic=True
-    )
+    eval_freq = max((timesteps // 25) // envs_per_step, 1)  # ~25 evaluations per training run
+    if async_eval:
+        eval_callback = AsyncEvalCallback(
+            eval_env,
+            eval_env_kwargs=dict(n_episodes=n_eval_episodes, grid_width=grid_width, grid_height=grid_height,
+                                 snake_fov_radius=snake_fov_radius, obs_mode=obs_mode, obs_encoding=obs_encoding),
+            callback_on_new_best=CallbackList(on_new_best),
+            best_model_save_path=path,
+            eval_freq=eval_freq,
+            n_eval_episodes=n_eval_episodes,
+            verbose=1,
+            deterministic=True,
+            checkpoint_writer=checkpoint_writer,
+            callback_after_eval=plateau_stopping,
+        )
+    else:
+        eval_callback = EvalCallback(
+            eval_env,
+            callback_on_new_best=CallbackList(on_new_best),
+            best_model_save_path=None if checkpoint_writer is not None else path,
+            callback_after_eval=plateau_stopping,
+            eval_freq=eval_freq,
+            n_eval_episodes=n_eval_episodes,                     # Episodes per evaluation
+            verbose=1,
+            deterministic=True
+        )
     if not new:
         # EvalCallback.__init__ always starts best_mean_reward at -inf, with
         # no memory of a model's actual historical best across continuations
@@ -375,7 +541,7 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
     # crash mid-run loses at most eval_freq calls of progress instead of the
     # whole run. Reuses the same "~25 checkpoints per run" cadence instead of
     # inventing a new constant.
-    periodic_checkpoint = PeriodicCheckpoint(save_freq=eval_freq, save_path=path)
+    periodic_checkpoint = PeriodicCheckpoint(save_freq=eval_freq, save_path=path, checkpoint_writer=checkpoint_writer)
 
     callbacks = [eval_callback, death_logger, periodic_checkpoint]
     if cancel_event is not None:
@@ -423,6 +589,14 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
                 return True
         callbacks.append(_FrameCallback(on_frame))
 
+    # Last, so its interval check sees every other callback's time already
+    # charged to its phase
+    perf_telemetry_callback = None
+    if perf_telemetry:
+        saver_callbacks = [callback for callback in on_new_best if isinstance(callback, BestModelSaver)]
+        perf_telemetry_callback = PerfTelemetry([eval_callback], [periodic_checkpoint] + saver_callbacks)
+        callbacks.append(perf_telemetry_callback)
+
     # Snapshot the tensorboard run dir's contents before .learn() starts
     # writing to it, so a discarded (and NOT reseeded, see needs_reseed below)
     # run can be told apart from whatever was legitimately there already
@@ -463,6 +637,12 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
         if resume_point > 0:
             _seed_run_dir_from_best(path)
 
+    # Pinned/measured right around .learn() (see rl/placement.py); the
+    # "vector" env has no worker processes, so the learner gets every core
+    placement = None
+    if cpu_placement != "off":
+        placement = CorePlacement(0 if vec_env == "vector" or apex_actors else num_envs, learner_cores, pin=cpu_placement == "pin")
+
     # train_env/eval_env are real OS subprocesses (SubprocVecEnv) -- guarantee
     # they're always closed exactly once, whether training finishes normally,
     # is cancelled (discarded or not), or raises.
@@ -474,7 +654,21 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
         # deliberately reuses the same run folder (doesn't bump the run number)
         # when reset_num_timesteps=False, so a "Continue Existing" run's reward
         # curve keeps appending to the original run's, not starting a new one.
+        if placement is not None:
+            placement.apply(train_env)
+            placement.start()
+        # For the early-stop report: where this run started and meant to end
+        start_timesteps = model.num_timesteps
+        learn_started = time.perf_counter()
         model.learn(total_timesteps=timesteps, callback=callbacks, reset_num_timesteps=False, tb_log_name=TB_RUN_NAME)
+        learn_finished = time.perf_counter()
+        if placement is not None:
+            # While the env workers still exist to be read
+            placement_report = placement.stop()
+        if checkpoint_writer is not None:
+            # Every save queued during training lands (complete, renamed into
+            # place) before anything below looks at or overwrites the files
+            checkpoint_writer.close()
 
         if discard_event is not None and discard_event.is_set():
             print("\nTraining cancelled -- discarding this run (nothing saved).")
@@ -496,6 +690,15 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
                 _restore_run_dir_backup(path)
             else:
                 _discard_run_artifacts(path, pre_existing_tb_files)
+            # And the replay buffer: a new model's goes away (restoring the
+            # previous model's, if any), a continuation's position goes back
+            # to where this run found it (see MemmapReplayBuffer.revert())
+            if model_name == "DQN":
+                if new:
+                    model.replay_buffer.close()
+                    _restore_replay_buffer_backup(path)
+                else:
+                    model.replay_buffer.revert()
             return
 
         # This run wasn't discarded (finished normally, or was cancelled but
@@ -509,6 +712,8 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
             # The run succeeded (or was cancelled-and-kept) -- the pre-run
             # backup is no longer needed.
             _discard_run_dir_backup(path)
+        if model_name == "DQN":
+            _discard_replay_buffer_backup(path)
 
         # EvalCallback only evaluates every eval_freq calls, so the final stretch of
         # training (up to eval_freq-1 calls) may never have been checked -- evaluate
@@ -559,16 +764,6 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
         # Always save the final model (in addition to the best model saved by EvalCallback)
         model.save(os.path.join(path, "last_model"))
 
-        if model_name == "DQN":
-            # Snapshot the replay buffer so the next "Continue Existing" run
-            # can resume from it instead of starting empty (see the load
-            # branch above) -- only at this natural end point, not from
-            # PeriodicCheckpoint's crash-safety saves, since buffer files are
-            # large (~1.5-2GB); a mid-run crash just falls back to the
-            # graceful empty-buffer path on the next continuation, same as
-            # before this feature existed.
-            model.save_replay_buffer(replay_buffer_path(path))
-
         # Whether a genuinely new best_model.zip exists to finalize -- False
         # is now a real, expected outcome for a continuation that never beat
         # this model's true historical best (see the seeding above), in
@@ -581,35 +776,108 @@ def train_model(model_name="DQN", grid_width=30, grid_height=20, snake_fov_radiu
 
         if best_model_updated:
             _write_best_score(path, best_model_score)
-            # Keep tb_best in sync with the checkpoint it describes -- a
-            # truncated-at-best_model_timestep snapshot of this run's own
-            # (now current) "last" history, so the NEXT "Continue from Best"
-            # (if any) can seed its live plot from it (see
-            # _seed_run_dir_from_best).
-            _rebuild_tb_best(path, best_model_timestep)
     finally:
         train_env.close()
         eval_env.close()
-
+        if async_eval:
+            eval_callback.close()      # Already closed unless .learn() raised
+        if checkpoint_writer is not None:
+            checkpoint_writer.close()  # Likewise
+        if placement is not None:
+            # The training thread goes back to all of its cores (the UI runs
+            # many trainings in one process)
+            placement.restore()
+
+    # The rest only needs the checkpoints saved above, and its parts don't
+    # depend on each other -- run them concurrently (see rl/finalization.py)
+    print("\n=== Finalizing (parallel) ===")
+    pipeline = FinalizationPipeline(on_progress=on_progress, started=learn_finished)
+    if model_name == "DQN":
+        # Flush the rest of the replay buffer (whatever was added since the
+        # last PeriodicCheckpoint) so the next "Continue Existing" run
+        # resumes from exactly this point (see the load branch above).
+        pipeline.submit("replay buffer", model.replay_buffer.flush, total_timesteps_trained)
+    if best_model_updated:
+        # Keep tb_best in sync with the checkpoint it describes -- a
+        # truncated-at-best_model_timestep snapshot of this run's own
+        # (now current) "last" history, so the NEXT "Continue from Best"
+        # (if any) can seed its live plot from it (see
+        # _seed_run_dir_from_best).
+        pipeline.submit("tb_best", _rebuild_tb_best, path, best_model_timestep)
     # Evaluate both checkpoints in this folder (deterministic + stochastic, no
     # rendering, clean score) and save the results so performance can be read
     # at a glance without manually testing the model.
-    print("\n=== Starting post-training evaluation ===")
-    evaluation = {
-        "timesteps": total_timesteps_trained,
-        "last_model": evaluate_model_performance(model, GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, model_label="last model"),
-    }
-
+    eval_args = (GRID_SIZE, grid_width, grid_height, snake_fov_radius)
+    pipeline.submit("evaluate last", evaluate_model_performance, model, *eval_args, obs_mode=obs_mode, verbose=False)
+    # Torch-free copies of both checkpoints' policies, for playback and
+    # evaluation without loading the SB3 model (see rl/numpy_policy.py)
+    pipeline.submit("export last", export_policy, model, npz_path(_find_checkpoint(path, "last_model")))
     if glob.glob(os.path.join(path, "best_model_*.zip")):
         ModelClass = DQN if model_name == "DQN" else PPO
-        best = ModelClass.load(_find_checkpoint(path, "best_model"), device="cpu")
-        evaluation["best_model"] = evaluate_model_performance(best, GRID_SIZE, grid_width, grid_height, snake_fov_radius, obs_mode=obs_mode, model_label="best model")
+        def _evaluate_best():
+            best_path = _find_checkpoint(path, "best_model")
+            best = ModelClass.load(best_path, device="cpu")
+            # Also (re-)exports an unchanged best checkpoint -- it may predate
+            # the exports
+            export_policy(best, npz_path(best_path))
+            return evaluate_model_performance(best, *eval_args, obs_mode=obs_mode, verbose=False)
+        pipeline.submit("evaluate best", _evaluate_best)
+    results = pipeline.run()
+
+    evaluation = {"timesteps": total_timesteps_trained}
+    for key, task, label in (("last_model", "evaluate last", "last model"), ("best_model", "evaluate best", "best model")):
+        if task in results:
+            evaluation[key] = results[task]
+            print(f"Evaluation of the {label}:")
+            for mode in ("deterministic", "stochastic"):
+                print(f"  {mode}: mean score = {results[task][mode]['mean_score']:.2f} ({results[task][mode]['episodes']} episodes)")
+    # "learn finished" -> results written (the json write below is ~instant)
+    evaluation["finalization"] = {
+        "wall_time_s": round(pipeline.elapsed(), 3),
+        "tasks_s": {name: round(seconds, 3) for name, seconds in pipeline.task_times.items()},
+    }
+
+    if total_timesteps_trained < start_timesteps + timesteps:
+        # Stopped before its budget: say why, and what that saved
+        if plateau_stopping is not None and plateau_stopping.stopped_at is not None:
+            reason = "plateau"
+        elif eval_callback.best_mean_reward >= reward_threshold:
+            reason = "reward_threshold"
+        elif cancel_event is not None and cancel_event.is_set():
+            reason = "cancelled"
+        else:
+            reason = "other"
+        trained = total_timesteps_trained - start_timesteps
+        saved_timesteps = start_timesteps + timesteps - total_timesteps_trained
+        seconds_per_step = (learn_finished - learn_started) / trained if trained > 0 else 0.0
+        evaluation["early_stop"] = {
+            "reason": reason,
+            "planned_timesteps": start_timesteps + timesteps,
+            "saved_timesteps": saved_timesteps,
+            "saved_fraction": round(saved_timesteps / timesteps, 4),
+            "projected_saved_s": round(saved_timesteps * seconds_per_step, 1),   # At this run's own speed
+        }
+        if reason == "plateau":
+            evaluation["early_stop"].update(slope_per_million=round(plateau_stopping.slope_per_million, 4),
+                                            min_improvement=plateau_min_improvement, window=plateau_stopping.window)
+        print(f"Stopped early ({reason}) at {total_timesteps_trained:,} of {start_timesteps + timesteps:,} timesteps: "
+              f"{saved_timesteps:,} timesteps (~{evaluation['early_stop']['projected_saved_s']:.0f}s) saved")
+
+    if perf_telemetry_callback is not None and perf_telemetry_callback.summary is not None:
+        print(PerfTelemetry.format_summary(perf_telemetry_callback.summary))
+        evaluation["perf"] = perf_telemetry_callback.summary
+
+    if placement is not None:
+        print(CorePlacement.format_report(placement_report))
+        evaluation["placement"] = placement_report
 
     evaluation_path = os.path.join(path, "evaluation.json")
     print(f"\nEvaluation complete. Writing results to {evaluation_path}")
     os.makedirs(path, exist_ok=True)
     with open(evaluation_path, "w") as file:
         json.dump(evaluation, file, indent=4)
+    print(f"Finalization took {evaluation['finalization']['wall_time_s']:.1f}s from the end of training to written results "
+          f"(tasks: {', '.join(f'{name} {seconds:.1f}s' for name, seconds in pipeline.task_times.items())})")
 
     # The exact tensorboard log directory for this run, so the UI can plot it
     # once training finishes (see ui/plot_window.py).
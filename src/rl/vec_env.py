@@ -0,0 +1,213 @@
+"""
+rl/vec_env.py - SB3 VecEnv over the batched NumPy engine.
+
+SnakeVecEnv runs all `num_envs` games inside the training process as one
+game.vector_engine.VectorSnakeEngine, instead of one SubprocVecEnv worker
+process (plus pickling round trips) per game. A step of N games is a few
+array operations, so num_envs can go into the hundreds on a single core.
+
+It behaves like SubprocVecEnv over Monitor-wrapped SnakeGameEnvironment
+instances: finished games are reset automatically (the final observation
+goes into info["terminal_observation"]), and infos carry snake_length,
+death_cause, "TimeLimit.truncated" and Monitor's "episode" dict, so
+DeathLogger, EvalCallback etc. work unchanged.
+
+With record_states set (rl.replay_buffer.TrajectoryReplayBuffer does), every
+step also leaves the compact game state of each game before and after it in
+prev_states/next_states -- what that buffer stores instead of observations.
+
+Classes:
+    SnakeVecEnv - VecEnv backed by VectorSnakeEngine.
+"""
+
+import time
+
+import gymnasium as gym
+import numpy as np
+from stable_baselines3.common.monitor import Monitor
+from stable_baselines3.common.vec_env.base_vec_env import VecEnv
+
+from game.vector_engine import VectorSnakeEngine, DEATH_CAUSES
+
+
+class SnakeVecEnv(VecEnv):
+    """
+    Args:
+        num_envs:          Number of games.
+        grid_size:         Pixel size of each cell (rendering only).
+        grid_width/height: Grid dimensions in cells.
+        snake_fov_radius:  FOV radius around the head.
+        render_mode:       None or "rgb_array" (see env_method("render")).
+        training:          Reward shaping on/off, as in SnakeGameEnvironment.
+        obs_mode:          "flat" or "grid", as in SnakeGameEnvironment.
+        obs_encoding:      "standard", "compact" or "packed", as in SnakeGameEnvironment.
+        rgb_renderer:      "pygame" or "numpy", as in SnakeGameEnvironment.
+        max_episode_steps: Optional per-episode step cap, like wrapping every
+                           env in gymnasium's TimeLimit.
+        seed:              Seed for apple placement.
+        detect_cycles:     End games that repeat a state, as in SnakeGameEnvironment
+                           (see game/vector_engine.py).
+    """
+
+    def __init__(self, num_envs, grid_size, grid_width, grid_height, snake_fov_radius=1, render_mode=None, training=True, obs_mode="flat", max_episode_steps=None, seed=None, obs_encoding="standard", rgb_renderer="pygame", detect_cycles=False):
+        self.engine = VectorSnakeEngine(num_envs, grid_width, grid_height, snake_fov_radius, obs_mode, training, seed, obs_encoding, detect_cycles)
+        self.grid_size = grid_size
+        self.render_mode = render_mode
+        self.rgb_renderer = rgb_renderer
+        self._rasterizer = None
+        self.max_episode_steps = max_episode_steps
+        super().__init__(num_envs, self.engine.observation_space, gym.spaces.Discrete(4))
+
+        self._actions = None
+        # Monitor bookkeeping (Monitor's "t" is seconds since the wrapper was
+        # created, not since the episode started)
+        self._t_start = time.time()
+        self._episode_returns = np.zeros(num_envs, dtype=np.float64)
+        self._episode_lengths = np.zeros(num_envs, dtype=np.int64)
+
+        # (4, num_envs) int64 rows: head cell, apple cell, occupied cells,
+        # steps into the episode -- before the last step, and after it
+        # (finished games as they ended, before the reset)
+        self.record_states = False
+        self.prev_states = None
+        self.next_states = None
+
+        # See step_timers()
+        self._step_busy = 0.0
+        self._step_count = 0
+
+    def reset(self):
+        seeds = [s for s in self._seeds if s is not None]
+        if seeds:
+            self.engine.seed(seeds[0])
+        self._reset_seeds()
+        self._reset_options()
+
+        self.engine.reset()
+        self._episode_returns[:] = 0
+        self._episode_lengths[:] = 0
+        return self.engine.observe()
+
+    def step_async(self, actions):
+        self._actions = actions
+
+    def step_wait(self):
+        started = time.perf_counter()
+        engine = self.engine
+        if self.record_states:
+            self.prev_states = self._states()
+        rewards, terminated, truncated, death_cause = engine.step(self._actions)
+        self._episode_returns += rewards
+        self._episode_lengths += 1
+        if self.max_episode_steps is not None:
+            truncated |= self._episode_lengths >= self.max_episode_steps
+        dones = terminated | truncated
+        obs = engine.observe()
+
+        infos = [
+            {"snake_length": int(length), "death_cause": DEATH_CAUSES[cause]}
+            for length, cause in zip(engine.length, death_cause)
+        ]
+
+        if self.record_states:
+            self.next_states = self._states()
+
+        done_idx = np.flatnonzero(dones)
+        if len(done_idx):
+            now = time.time()
+            for i in done_idx:
+                info = infos[i]
+                info["TimeLimit.truncated"] = bool(truncated[i] and not terminated[i])
+                info["terminal_observation"] = self._slice_obs(obs, i)
+                info["episode"] = {
+                    "r": round(float(self._episode_returns[i]), 6),
+                    "l": int(self._episode_lengths[i]),
+                    "t": round(now - self._t_start, 6),
+                }
+            engine.reset(done_idx)
+            self._episode_returns[done_idx] = 0
+            self._episode_lengths[done_idx] = 0
+            self._assign_obs(obs, done_idx, engine.observe(done_idx))
+
+        self._step_busy += time.perf_counter() - started
+        self._step_count += self.num_envs
+        return obs, rewards, dones, infos
+
+    def step_timers(self):
+        """[(seconds spent stepping, game steps)] since creation, as the
+        process-based vec envs report per worker -- here one entry for the
+        whole engine, which steps every game in this process."""
+        return [(self._step_busy, self._step_count)]
+
+    def close(self):
+        pass
+
+    def _states(self):
+        engine = self.engine
+        return np.stack([engine.heads(), engine.apple, engine.body_counts(), self._episode_lengths])
+
+    # --- Observation helpers -------------------------------------------------
+
+    @staticmethod
+    def _slice_obs(obs, i):
+        if isinstance(obs, dict):
+            return {key: value[i].copy() for key, value in obs.items()}
+        return obs[i].copy()
+
+    @staticmethod
+    def _assign_obs(obs, idx, new):
+        if isinstance(obs, dict):
+            for key in obs:
+                obs[key][idx] = new[key]
+        else:
+            obs[idx] = new
+
+    # --- Rendering -----------------------------------------------------------
+
+    def render_frame(self, i):
+        """(H, W, 3) uint8 RGB frame of game `i`: with the "numpy" renderer a copy
+        of game.raster.GridRasterizer's frame, otherwise drawn by the regular
+        pygame renderer (SnakeGame.draw()) from a SnakeCore rebuilt off the
+        engine's arrays. pygame is imported only there, so headless training
+        never loads it."""
+        engine = self.engine
+        if self.rgb_renderer == "numpy":
+            if self._rasterizer is None:
+                from game.raster import GridRasterizer
+                self._rasterizer = GridRasterizer(engine.grid_width, engine.grid_height, self.grid_size)
+            return self._rasterizer.render(engine.body_xy(i), engine.cell_xy(engine.apple[i])).copy()
+
+        import pygame
+        from game.snake_core import SnakeCore
+        from game.snake_game import SnakeGame, COLOR_BACKGROUND
+
+        core = SnakeCore.from_state(
+            engine.grid_width, engine.grid_height, engine.body_xy(i),
+            engine.cell_xy(engine.apple[i]), int(engine.score[i]),
+        )
+        game = SnakeGame(self.grid_size, engine.grid_width, engine.grid_height, core=core)
+        canvas = pygame.Surface((self.grid_size * engine.grid_width, self.grid_size * engine.grid_height))
+        canvas.fill(COLOR_BACKGROUND)
+        game.draw(canvas)
+        return np.transpose(np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2))
+
+    # --- VecEnv plumbing -----------------------------------------------------
+
+    def get_attr(self, attr_name, indices=None):
+        target = self if hasattr(self, attr_name) else self.engine
+        return [getattr(target, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name, value, indices=None):
+        setattr(self.engine, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        if method_name != "render":
+            raise AttributeError(f"SnakeVecEnv does not support env_method({method_name!r})")
+        if self.render_mode != "rgb_array":
+            return [None for _ in self._get_indices(indices)]
+        return [self.render_frame(i) for i in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        # Episode stats are reported exactly like Monitor's, so code checking
+        # for it (e.g. evaluate_policy()) can treat these games as wrapped.
+        return [wrapper_class is Monitor] * len(self._get_indices(indices))
@@ -0,0 +1,239 @@
+"""
+rl/workers.py - Lean worker-process code for the process-based vector envs.
+
+Everything that runs inside a training worker process lives here, and this
+module imports only NumPy, gymnasium, cloudpickle and the headless game
+modules -- no stable_baselines3, hence no torch, and no pygame (see
+game/environment.py). A forkserver/spawn worker only imports the module its
+target function comes from plus whatever unpickling the env factory needs,
+so with SB3's own SubprocVecEnv worker every process paid for a full torch
+import just to step a grid game.
+
+Functions:
+    pipe_worker():          Drop-in for SB3's SubprocVecEnv worker (same pipe protocol).
+    shared_memory_worker(): Worker for rl.shared_vec_env.SharedMemoryVecEnv.
+
+Both workers also keep a step timer -- seconds spent inside env.step() (and
+the automatic reset after a finished game) and the number of steps -- which
+the "step_timers" command returns, for rl.telemetry.PerfTelemetry.
+"""
+
+import pickle
+import time
+
+import cloudpickle
+import gymnasium as gym
+import numpy as np
+from gymnasium import spaces
+
+from game.vector_engine import DEATH_CAUSES
+
+
+class CloudpickleWrapper:
+    """Serializes its contents with cloudpickle (env factories are usually
+    closures, which plain pickle can't handle) -- same as SB3's class of the
+    same name, which can't be used here without importing SB3."""
+
+    def __init__(self, var):
+        self.var = var
+
+    def __getstate__(self):
+        return cloudpickle.dumps(self.var)
+
+    def __setstate__(self, var):
+        self.var = cloudpickle.loads(var)
+
+
+def is_wrapped(env, wrapper_class) -> bool:
+    """Whether `env` has a `wrapper_class` wrapper anywhere in its chain."""
+    while isinstance(env, gym.Wrapper):
+        if isinstance(env, wrapper_class):
+            return True
+        env = env.env
+    return False
+
+
+def _handle_command(env, remote, cmd, data) -> bool:
+    """The rarely used commands both workers share. Returns False on "close"."""
+    if cmd == "close":
+        env.close()
+        remote.close()
+        return False
+    if cmd == "env_method":
+        method = env.get_wrapper_attr(data[0])
+        remote.send(method(*data[1], **data[2]))
+    elif cmd == "get_attr":
+        remote.send(env.get_wrapper_attr(data))
+    elif cmd == "has_attr":
+        try:
+            env.get_wrapper_attr(data)
+            remote.send(True)
+        except AttributeError:
+            remote.send(False)
+    elif cmd == "set_attr":
+        remote.send(setattr(env, data[0], data[1]))
+    elif cmd == "is_wrapped":
+        remote.send(is_wrapped(env, data))
+    else:
+        raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    return True
+
+
+def pipe_worker(remote, parent_remote, env_fn_wrapper):
+    """Same protocol as stable_baselines3.common.vec_env.subproc_vec_env._worker,
+    so SubprocVecEnv's parent side can drive it unchanged (see
+    rl.subproc_vec_env.HeadlessSubprocVecEnv)."""
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    reset_info = {}
+    busy, steps = 0.0, 0
+    while True:
+        try:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                started = time.perf_counter()
+                observation, reward, terminated, truncated, info = env.step(data)
+                # convert to SB3 VecEnv api
+                done = terminated or truncated
+                info["TimeLimit.truncated"] = truncated and not terminated
+                if done:
+                    # save final observation where user can get it, then reset
+                    info["terminal_observation"] = observation
+                    observation, reset_info = env.reset()
+                busy += time.perf_counter() - started
+                steps += 1
+                remote.send((observation, reward, done, info, reset_info))
+            elif cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                remote.send((observation, reset_info))
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "get_spaces":
+                remote.send((env.observation_space, env.action_space))
+            elif cmd == "step_timers":
+                remote.send((busy, steps))
+            elif not _handle_command(env, remote, cmd, data):
+                break
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            break
+
+
+# SharedMemoryVecEnv's per-step pipe traffic: parent -> worker is
+# bytes((STEP_TOKEN, buffer_index)), worker -> parent is ACK_TOKEN. Pickled
+# commands always start with the pickle protocol byte (0x80), never "s".
+STEP_TOKEN = ord("s")
+ACK_TOKEN = b"k"
+
+
+def obs_layout(observation_space):
+    """[(key, shape, dtype)] for every observation array; key is None for a
+    non-Dict space."""
+    if isinstance(observation_space, spaces.Dict):
+        return [(key, space.shape, space.dtype) for key, space in observation_space.spaces.items()]
+    return [(None, observation_space.shape, observation_space.dtype)]
+
+
+class SharedBuffers:
+    """
+    Named NumPy arrays backed by multiprocessing RawArrays. Picklable when
+    passed as a Process argument (the RawArrays are inherited, not copied), so
+    parent and workers see the same memory via views().
+    """
+
+    def __init__(self, ctx, specs):
+        self.specs = specs     # {name: (shape, dtype)}
+        self.raw = {
+            name: ctx.RawArray("b", max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize))
+            for name, (shape, dtype) in specs.items()
+        }
+
+    def views(self):
+        return {
+            name: np.frombuffer(self.raw[name], dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+            for name, (shape, dtype) in self.specs.items()
+        }
+
+
+def buffer_specs(num_envs, observation_space):
+    specs = {
+        "actions": ((num_envs,), np.int64),
+        "rewards": ((num_envs,), np.float32),
+        "terminated": ((num_envs,), np.bool_),
+        "truncated": ((num_envs,), np.bool_),
+        "snake_length": ((num_envs,), np.int64),
+        "death_cause": ((num_envs,), np.int8),     # Index into DEATH_CAUSES
+        "episode_r": ((num_envs,), np.float64),     # Monitor's info["episode"], valid when done
+        "episode_l": ((num_envs,), np.int64),
+        "episode_t": ((num_envs,), np.float64),
+    }
+    for key, shape, dtype in obs_layout(observation_space):
+        specs[("obs", key)] = ((2, num_envs, *shape), dtype)
+        specs[("terminal_obs", key)] = ((num_envs, *shape), dtype)
+    return specs
+
+
+def _write_obs(views, name, buf, index, observation):
+    """Copy one env's observation into row `index` of the `name` arrays
+    ("obs": of double buffer `buf`; "terminal_obs": buf is None)."""
+    items = observation.items() if isinstance(observation, dict) else [(None, observation)]
+    for key, value in items:
+        target = views[(name, key)]
+        if buf is not None:
+            target = target[buf]
+        target[index] = value
+
+
+def shared_memory_worker(remote, parent_remote, env_fn_wrapper, buffers, index):
+    """Steps one env on a 2-byte token, exchanging everything else through
+    `buffers` (see rl.shared_vec_env for the layout and protocol)."""
+    parent_remote.close()
+    env = env_fn_wrapper.var()
+    views = buffers.views()
+    actions = views["actions"]
+    busy, steps = 0.0, 0
+
+    while True:
+        try:
+            msg = remote.recv_bytes()
+            if msg[0] == STEP_TOKEN:
+                started = time.perf_counter()
+                buf = msg[1]
+                observation, reward, terminated, truncated, info = env.step(actions[index])
+                views["rewards"][index] = reward
+                views["terminated"][index] = terminated
+                views["truncated"][index] = truncated
+                views["snake_length"][index] = info.get("snake_length", 0)
+                views["death_cause"][index] = DEATH_CAUSES.index(info.get("death_cause"))
+                if terminated or truncated:
+                    # episode_l == 0 marks "no Monitor stats" (a real episode
+                    # always has at least one step)
+                    episode = info.get("episode", {"r": 0.0, "l": 0, "t": 0.0})
+                    views["episode_r"][index] = episode["r"]
+                    views["episode_l"][index] = episode["l"]
+                    views["episode_t"][index] = episode["t"]
+                    _write_obs(views, "terminal_obs", None, index, observation)
+                    observation, _ = env.reset()
+                _write_obs(views, "obs", buf, index, observation)
+                busy += time.perf_counter() - started
+                steps += 1
+                remote.send_bytes(ACK_TOKEN)
+                continue
+
+            cmd, data = pickle.loads(msg)
+            if cmd == "reset":
+                buf, seed, options = data
+                maybe_options = {"options": options} if options else {}
+                observation, reset_info = env.reset(seed=seed, **maybe_options)
+                _write_obs(views, "obs", buf, index, observation)
+                remote.send(reset_info)
+            elif cmd == "step_timers":
+                remote.send((busy, steps))
+            elif not _handle_command(env, remote, cmd, data):
+                break
+        except EOFError:
+            break
+        except KeyboardInterrupt:
+            break
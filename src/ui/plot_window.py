@@ -2,6 +2,8 @@
 ui/plot_window.py - Embeddable, live-refreshable training-progress graph, read
 straight from the tensorboard event file train_model() is writing to -- can be
 polled repeatedly while training is still running, not just after it finishes.
+Optionally adds a third, stacked panel: the share of wall time per training
+phase, from the perf/ scalars rl.telemetry.PerfTelemetry logs.
 """
 
 import customtkinter as ctk
@@ -9,7 +11,8 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from tensorboard.backend.event_processing.event_accumulator import EventAccumulator
 
-from ui.theme import PANEL, TEXT, TEXT_MUTED, BORDER, RADIUS
+from rl.telemetry import PHASES
+from ui.theme import PANEL, TEXT, TEXT_MUTED, BORDER, RADIUS, BLUE, AMBER, GREEN, RED
 
 # (tag, subplot label) -- all subplots are built up front so their (shared)
 # x-axis is visible from the start, even for tags with no data yet (e.g. DQN
@@ -20,6 +23,13 @@ _PLOTTED_TAGS = [
     ("train/loss", "Loss"),
 ]
 
+# One per rl.telemetry.PHASES entry, bottom to top -- the env's two parts in
+# neighbouring blues so they read as one block, "other" in a muted grey
+_PERF_COLORS = {
+    "env_step": BLUE, "env_ipc": "#5ac8fa", "inference": "#bf8cff", "train": AMBER,
+    "eval": GREEN, "checkpoint": RED, "other": TEXT_MUTED,
+}
+
 _DPI = 100
 
 # Default is 10,000 points per tag, after which older points get randomly
@@ -34,12 +44,14 @@ class LiveTrainingPlot(ctk.CTkFrame):
     only builds its subplots once (the first call with any data at all),
     otherwise just updates the existing lines' data."""
 
-    def __init__(self, parent, app, height=672):
+    def __init__(self, parent, app, height=672, show_perf=False):
         super().__init__(parent, fg_color=PANEL, corner_radius=RADIUS, height=height)
         self.app = app
+        self.show_perf = show_perf
         self._axes = {}
         self._lines = {}
         self._marker_artists = []
+        self._perf_artists = []
 
         self._fig = Figure(figsize=(6.4, height / _DPI), dpi=_DPI)
         self._fig.patch.set_facecolor(PANEL)
@@ -62,9 +74,23 @@ class LiveTrainingPlot(ctk.CTkFrame):
         self._axes = {}
         self._lines = {}
         self._marker_artists = []
+        self._perf_artists = []
         self._mpl_canvas.draw_idle()
         self._placeholder.place(relx=0.5, rely=0.5, anchor="center")
 
+    def set_show_perf(self, show_perf):
+        """Add or remove the time-breakdown panel. The subplots are rebuilt
+        on the next update() call (the caller's next poll, or its own call
+        right after this one)."""
+        if show_perf == self.show_perf:
+            return
+        self.show_perf = show_perf
+        self._fig.clear()
+        self._axes = {}
+        self._lines = {}
+        self._marker_artists = []
+        self._perf_artists = []
+
     def update(self, log_dir, marker_steps=None):
         """Re-read `log_dir`'s tensorboard event file and redraw. No-op if
         `log_dir` is None (not known yet) or nothing plottable has been
@@ -92,25 +118,29 @@ class LiveTrainingPlot(ctk.CTkFrame):
             self._axes = {}
             self._lines = {}
             shared_ax = None
-            for i, (tag, label) in enumerate(_PLOTTED_TAGS):
+            panels = _PLOTTED_TAGS + ([("perf", "Time share")] if self.show_perf else [])
+            for i, (tag, label) in enumerate(panels):
                 # sharex so the reward and loss subplots always cover the
                 # same timestep range -- otherwise each autoscales to its own
                 # data (loss starts logging late, at learning_starts steps)
                 # and the same continue marker lands at different x-pixels
                 # on each subplot.
-                ax = self._fig.add_subplot(len(_PLOTTED_TAGS), 1, i + 1, sharex=shared_ax)
+                ax = self._fig.add_subplot(len(panels), 1, i + 1, sharex=shared_ax)
                 shared_ax = shared_ax or ax
                 ax.set_ylabel(label, color=TEXT)
                 ax.set_facecolor(PANEL)
                 ax.tick_params(colors=TEXT_MUTED, labelsize=8)
                 for spine in ax.spines.values():
                     spine.set_color(BORDER)
-                if i == len(_PLOTTED_TAGS) - 1:
+                if i == len(panels) - 1:
                     ax.set_xlabel("Timesteps", color=TEXT)
                 else:
                     ax.tick_params(labelbottom=False)
-                line, = ax.plot([], [], color="#4d96ff")
                 self._axes[tag] = ax
+                if tag == "perf":
+                    ax.set_ylim(0, 1)
+                    continue            # Stacked areas, drawn in _update_perf()
+                line, = ax.plot([], [], color="#4d96ff")
                 self._lines[tag] = line
             self._fig.tight_layout()
 
@@ -128,6 +158,8 @@ class LiveTrainingPlot(ctk.CTkFrame):
             self._lines[tag].set_data([e.step for e in events], [e.value for e in events])
             self._axes[tag].relim()
             self._axes[tag].autoscale_view()
+        if self.show_perf:
+            self._update_perf(ea, available)
 
         # Redrawn from scratch each call (cheap -- marker_steps is a handful of
         # ints at most) rather than diffed, since axvline artists don't support
@@ -146,3 +178,26 @@ class LiveTrainingPlot(ctk.CTkFrame):
             top_axis.legend(fontsize=7, loc="upper left", facecolor=PANEL, labelcolor=TEXT_MUTED, framealpha=0.5)
 
         self._mpl_canvas.draw_idle()
+
+    def _update_perf(self, ea, available):
+        """Redraw the stacked time-share panel from the perf/<phase> scalars
+        (all recorded together, so they share their steps). Redrawn from
+        scratch each call -- stackplot's areas can't be updated in place."""
+        for artist in self._perf_artists:
+            artist.remove()
+        self._perf_artists = []
+        tags = [f"perf/{phase}" for phase in PHASES]
+        if not all(tag in available for tag in tags):
+            return  # Not logged (yet, or at all: perf_telemetry=False) -- leave the axis empty
+        series = [{e.step: e.value for e in ea.Scalars(tag)} for tag in tags]
+        steps = sorted(set.intersection(*(set(values) for values in series)))
+        if not steps:
+            return
+        ax = self._axes["perf"]
+        self._perf_artists = ax.stackplot(
+            steps, *[[values[step] for step in steps] for values in series],
+            labels=PHASES, colors=[_PERF_COLORS[phase] for phase in PHASES], alpha=0.85,
+        )
+        legend = ax.legend(fontsize=6, loc="upper left", ncol=4, facecolor=PANEL, labelcolor=TEXT_MUTED, framealpha=0.5)
+        self._perf_artists.append(legend)
+        ax.set_ylim(0, 1)
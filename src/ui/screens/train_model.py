@@ -45,6 +45,7 @@ class TrainModelScreen(SubScreen):
         self._current_model_path = None
         self._current_resume_step = None
         self._current_frame = None
+        self._finalize_progress = None
 
         # The whole form -- mode toggle, algo/obs/grid/fov (or the continue-
         # model list), timesteps/parallel-envs/tuned-checkbox, start button,
@@ -94,6 +95,15 @@ class TrainModelScreen(SubScreen):
             command=self._update_game_view_visibility,
         )
         self.render_checkbox.pack(anchor="w", pady=(4, 4))
+
+        self.perf_var = tk.BooleanVar(value=False)
+        self.perf_checkbox = ctk.CTkCheckBox(
+            shared, text="Show time breakdown in the graph (env, inference, updates, eval...)", variable=self.perf_var,
+            font=app.font_small, text_color=TEXT, checkbox_width=18, checkbox_height=18,
+            fg_color=BLUE, hover_color=_mix(BLUE, "#000000", 0.2), border_color=BORDER,
+            command=self._update_perf_panel,
+        )
+        self.perf_checkbox.pack(anchor="w", pady=(4, 4))
         shared.pack(fill="y", pady=(16, 0))
 
         self.start_btn = _make_outline_button(self.outer_scroll, "Start Training", BLUE, self._start, app.font_body, width=220, height=44)
@@ -353,6 +363,13 @@ class TrainModelScreen(SubScreen):
         else:
             self.game_view.pack_forget()
 
+    def _update_perf_panel(self):
+        """Adds/removes the plot's stacked time-breakdown panel (the perf/
+        scalars train_model() logs) and redraws right away -- while idle
+        too, so a finished run's graph can be looked at either way."""
+        self.plot_widget.set_show_perf(self.perf_var.get())
+        self.plot_widget.update(getattr(self, "_last_result", None) or self._current_log_dir, self._read_markers())
+
     def _update_start_enabled(self):
         if self._is_training or not hasattr(self, "start_btn"):
             return
@@ -434,6 +451,8 @@ class TrainModelScreen(SubScreen):
         self._current_frame = None
         if self.render_var.get():
             kwargs["on_frame"] = self._on_frame_received
+        self._finalize_progress = None
+        kwargs["on_progress"] = self._on_finalize_progress
 
         self._is_training = True
         self.start_btn.configure(text="Cancel Training", command=self._request_cancel)
@@ -442,6 +461,7 @@ class TrainModelScreen(SubScreen):
         self._start_background(train_model, kwargs, self.start_btn, on_finish=self._on_training_finished)
         self._poll_plot()
         self._poll_frame()
+        self._poll_finalize()
 
     def _on_log_dir_known(self, log_dir):
         """Called from the training thread (train_model()'s on_log_dir
@@ -478,6 +498,28 @@ class TrainModelScreen(SubScreen):
         self.game_view.update(self._current_frame)
         self.after(120, self._poll_frame)
 
+    def _on_finalize_progress(self, event):
+        """Called from the training thread (train_model()'s on_progress
+        callback) for every step of the post-training finalization (see
+        rl/finalization.py) -- plain attribute assignment only, like
+        _on_frame_received; _poll_finalize() shows it."""
+        self._finalize_progress = event
+
+    def _poll_finalize(self):
+        """Once training is over and train_model() is saving/evaluating,
+        show how far along that is on the (disabled) button -- otherwise it
+        keeps saying "Cancel Training" for a run that is only writing its
+        results."""
+        if not self._is_training:
+            return
+        event = self._finalize_progress
+        if event is not None:
+            self.start_btn.configure(
+                text=f"Finalizing ({event['completed']}/{event['total']})...", state="disabled",
+                text_color=AMBER, text_color_disabled=AMBER,
+            )
+        self.after(250, self._poll_finalize)
+
     def _read_markers(self):
         """Continuation-start markers for the model currently training (see
         rl.paths._record_continue_marker), or [] for a fresh "New Model" run